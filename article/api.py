@@ -1,10 +1,15 @@
-from django.shortcuts import get_object_or_404
+from datetime import datetime
+
+from asgiref.sync import sync_to_async
+from django.http import Http404, HttpResponse
 from ninja_extra.controllers import ControllerBase, api_controller, route
 
-from article.models import Article
+from article.catalogue import catalogue_snapshots
 from article.schemas import AvailableArticleSchema
+from buckutt.profiling import query_budget, set_selling_point
 from buckutt.types import PrimaryKey
 from selling_points.models import SellingPoint
+from users.memberships import user_groups
 from users.models import User
 
 
@@ -15,7 +20,13 @@ class ArticleController(ControllerBase):
     """
 
     @route.get("/available-articles", response=list[AvailableArticleSchema])
-    def fetch_available(self, selling_point_id: PrimaryKey, user_id: PrimaryKey):
+    @query_budget(5)
+    async def fetch_available(
+        self,
+        selling_point_id: PrimaryKey,
+        user_id: PrimaryKey,
+        at: datetime | None = None,
+    ):
         """
         Retourne tous les produits disponibles pour un utilisateur
         dans un point de vente, à l'instant présent, en annotant le prix
@@ -23,21 +34,34 @@ class ArticleController(ControllerBase):
 
         Le prix du produit pour un utilisateur sera toujours le plus petit
         parmi les prix de tous les groupes auxquels l'utilisateur appartient.
+        Le catalogue est servi à partir d'un instantané déjà sérialisé,
+        commun à tous les clients ayant les mêmes groupes
+        ([CatalogueSnapshots][article.catalogue.CatalogueSnapshots]).
+        La route est asynchrone : servie par ASGI, elle n'occupe pas de thread
+        pendant les requêtes.
 
         Retourne une liste d'objets de type
         [AvailableArticleSchema][article.schemas.AvailableArticleSchema].
 
+        Si un instant `at` est donné, retourne le catalogue tel qu'il sera
+        (ou était) à cet instant, par exemple pour préparer une happy hour.
+
         Args:
             selling_point_id: l'id du point de vente
             user_id: l'id de l'utilisateur dont on veut les produits disponibles
+            at: l'instant auquel consulter le catalogue (maintenant par défaut)
         """
-        selling_point = get_object_or_404(SellingPoint, pk=selling_point_id)
-        customer = get_object_or_404(User, pk=user_id)
-        return (
-            Article.objects.available_now()
-            .for_user(customer)
-            .in_point(selling_point)
-            .annotate_price_for(customer)
-            .annotate_foundation_for(customer)
-            .distinct()
-        )
+        if not await User.objects.filter(pk=user_id).aexists():
+            raise Http404
+        group_ids = await user_groups.aget(user_id)
+        data = await catalogue_snapshots.aget(selling_point_id, group_ids, at=at)
+        if data is None:
+            if not await SellingPoint.objects.filter(pk=selling_point_id).aexists():
+                raise Http404
+            # le calcul d'un instantané, rare, reste synchrone
+            data = await sync_to_async(catalogue_snapshots.build)(
+                selling_point_id, group_ids, at=at
+            )
+        # le point de vente existe : un instantané n'est calculé que dans ce cas
+        set_selling_point(selling_point_id)
+        return HttpResponse(data, content_type="application/json")
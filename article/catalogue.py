@@ -0,0 +1,207 @@
+"""
+Catalogue des articles disponibles dans un point de vente.
+
+Le catalogue présenté à un client ne dépend que du point de vente,
+de l'ensemble des groupes du client et des périodes en cours.
+Il est donc calculé une fois par couple (point de vente, groupes),
+puis conservé sous forme d'un instantané déjà sérialisé en JSON,
+servi tel quel aux terminaux.
+
+Les instantanés sont versionnés de la même manière que la matrice des prix
+([PriceMatrix][article.pricing.PriceMatrix]) : toute modification
+d'un prix, d'une période, d'un article (ou l'épuisement de son stock)
+ou de l'assortiment d'un point de vente invalide les instantanés de tous les processus.
+Ils expirent en outre à la prochaine borne de période,
+c'est-à-dire exactement quand un prix entre en vigueur ou expire,
+et au plus tard après `CATALOGUE_SNAPSHOT_TTL` secondes, ce qui borne
+leur ancienneté si une invalidation n'a pas atteint ce processus.
+"""
+import threading
+import time
+from collections.abc import Iterable
+from datetime import datetime
+from typing import NamedTuple
+
+import orjson
+from django.conf import settings
+from django.utils.timezone import now
+
+from article.models import Article
+from article.pricing import period_timeline, resolve_prices
+from article.schemas import AvailableArticleSchema
+from article.timeline import contains
+from buckutt.metrics import cache_requests
+from buckutt.types import PrimaryKey
+from buckutt.versions import aget_version, bump_version, get_version
+
+CATALOGUE_VERSION_KEY = "article:catalogue:version"
+
+
+def invalidate_catalogue() -> None:
+    """
+    Invalide les instantanés du catalogue de tous les processus.
+    """
+    bump_version(CATALOGUE_VERSION_KEY)
+
+
+def available_articles(
+    point_id: PrimaryKey, group_ids: Iterable[int], at: datetime | None = None
+) -> list[Article]:
+    """
+    Retourne les articles en stock vendus dans un point de vente
+    ayant un prix applicable aux groupes donnés.
+
+    Chaque article est annoté avec son prix (`price`)
+    et l'id de sa fondation (`foundation`).
+
+    Args:
+        point_id: l'id du point de vente
+        group_ids: les ids des groupes du client
+        at: l'instant auquel résoudre les prix (maintenant par défaut)
+    """
+    prices = resolve_prices(group_ids, at=at)
+    articles = [
+        article
+        for article in Article.objects.available().in_stock().in_point(point_id)
+        if article.pk in prices
+    ]
+    for article in articles:
+        article.price = prices[article.pk].amount
+        article.foundation = prices[article.pk].foundation
+    return articles
+
+
+class _Snapshot(NamedTuple):
+    data: bytes
+    interval: tuple[datetime | None, datetime | None]
+    expires_at: float
+
+
+class CatalogueSnapshots:
+    """
+    Instantanés sérialisés du catalogue, par point de vente et ensemble de groupes.
+
+    Un instantané est valide tant que la version du catalogue n'a pas changé
+    et que la prochaine borne de période
+    ([PeriodTimeline][article.timeline.PeriodTimeline]) n'est pas atteinte,
+    dans la limite de sa durée de vie (`CATALOGUE_SNAPSHOT_TTL`).
+
+    Examples:
+        ```python
+        from article.catalogue import catalogue_snapshots
+
+        group_ids = user_groups.get(user.pk)
+        data = catalogue_snapshots.get(point.pk, group_ids)
+        if data is None:
+            data = catalogue_snapshots.build(point.pk, group_ids)
+        ```
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version: str | None = None
+        self._snapshots: dict[tuple[int, frozenset[int]], _Snapshot] = {}
+
+    def _check_version(self) -> str:
+        return self._set_version(get_version(CATALOGUE_VERSION_KEY))
+
+    def _set_version(self, version: str) -> str:
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._snapshots = {}
+                    self._version = version
+        return version
+
+    def get(
+        self,
+        point_id: PrimaryKey,
+        group_ids: frozenset[int],
+        at: datetime | None = None,
+    ) -> bytes | None:
+        """
+        Retourne l'instantané du catalogue s'il existe et est valide
+        à l'instant donné.
+
+        Args:
+            point_id: l'id du point de vente
+            group_ids: les ids des groupes du client
+            at: l'instant considéré (maintenant par défaut)
+        """
+        self._check_version()
+        return self._lookup(point_id, group_ids, at)
+
+    async def aget(
+        self,
+        point_id: PrimaryKey,
+        group_ids: frozenset[int],
+        at: datetime | None = None,
+    ) -> bytes | None:
+        """
+        Version asynchrone de [get][article.catalogue.CatalogueSnapshots.get].
+        """
+        self._set_version(await aget_version(CATALOGUE_VERSION_KEY))
+        return self._lookup(point_id, group_ids, at)
+
+    def _lookup(
+        self, point_id: PrimaryKey, group_ids: frozenset[int], at: datetime | None
+    ) -> bytes | None:
+        snapshot = self._snapshots.get((point_id, group_ids))
+        if (
+            snapshot is None
+            or snapshot.expires_at <= time.monotonic()
+            or not contains(snapshot.interval, at or now())
+        ):
+            cache_requests.inc(cache="catalogue", result="miss")
+            return None
+        cache_requests.inc(cache="catalogue", result="hit")
+        return snapshot.data
+
+    def build(
+        self,
+        point_id: PrimaryKey,
+        group_ids: frozenset[int],
+        at: datetime | None = None,
+    ) -> bytes:
+        """
+        Calcule et retourne l'instantané du catalogue à l'instant donné.
+
+        Le résultat est une liste
+        d'[AvailableArticleSchema][article.schemas.AvailableArticleSchema]
+        sérialisée en JSON.
+        Seuls les instantanés de l'instant présent sont enregistrés,
+        ceux demandés pour un autre instant sont simplement retournés.
+
+        Args:
+            point_id: l'id du point de vente
+            group_ids: les ids des groupes du client
+            at: l'instant considéré (maintenant par défaut)
+        """
+        version = self._check_version()
+        expires_at = time.monotonic() + settings.CATALOGUE_SNAPSHOT_TTL
+        is_current = at is None
+        at = at or now()
+        interval = period_timeline().interval(at)
+        articles = available_articles(point_id, group_ids, at=at)
+        data = orjson.dumps(
+            [AvailableArticleSchema.from_orm(a).dict() for a in articles]
+        )
+        with self._lock:
+            # une invalidation pendant le calcul rend l'instantané obsolète
+            if is_current and version == self._version:
+                self._snapshots[point_id, group_ids] = _Snapshot(
+                    data, interval, expires_at
+                )
+        return data
+
+    def clear(self) -> None:
+        """
+        Vide les instantanés de ce processus.
+        """
+        with self._lock:
+            self._version = None
+            self._snapshots = {}
+
+
+catalogue_snapshots = CatalogueSnapshots()
+"""Instantanés du catalogue partagés par tous les threads du processus."""
@@ -1,8 +1,12 @@
+from collections.abc import Iterable
+from datetime import datetime
+
 from django.contrib.auth.models import Group
 from django.db import models
-from django.db.models import OuterRef, Subquery
+from django.db.models import Q
 from django.utils.timezone import now
 
+from users.memberships import user_groups
 from users.models import User
 
 
@@ -43,13 +47,25 @@ class ArticleQuerySet(models.QuerySet):
         Un article est considéré comme disponible maintenant si
         sa colonne is_removed est à False et qu'il possède au moins un prix
         applicable à l'heure actuelle.
+        Une période sans date de fin est considérée comme toujours en cours
+        une fois commencée.
         """
         t = now()
         # noinspection PyTypeChecker
         return self.available().filter(
-            prices__period__start__lte=t, prices__period__end__gte=t
+            Q(prices__period__end__gte=t) | Q(prices__period__end__isnull=True),
+            prices__period__start__lte=t,
         )
 
+    def in_stock(self) -> "ArticleQuerySet":
+        """
+        Filtre le queryset pour ne garder que les articles en stock.
+
+        Un article dont le stock vaut -1 est disponible en quantité illimitée.
+        """
+        # noinspection PyTypeChecker
+        return self.exclude(stock=0)
+
     def for_user(self, user: User) -> "ArticleQuerySet":
         """
         Filtre le queryset pour ne garder que les articles
@@ -59,7 +75,7 @@ class ArticleQuerySet(models.QuerySet):
             user: l'utilisateur pour lequel les articles doivent être filtrés
         """
         # noinspection PyTypeChecker
-        return self.filter(prices__group__in=user.groups.all())
+        return self.filter(prices__group__any=user_groups.get(user.pk))
 
     def in_point(self, point) -> "ArticleQuerySet":
         """
@@ -73,41 +89,6 @@ class ArticleQuerySet(models.QuerySet):
         # noinspection PyTypeChecker
         return self.filter(selling_points=point)
 
-    def annotate_price_for(self, user: User) -> "ArticleQuerySet":
-        """
-        Annote le queryset avec le prix s'appliquant à l'utilisateur donné.
-
-        Le prix d'un article pour un utilisateur est le prix le plus bas
-        parmi ceux applicables à ce dernier.
-
-        Args:
-            user: l'utilisateur pour lequel le prix doit être annoté
-        """
-        prices = Price.objects.filter(
-            article=OuterRef("pk"), group__in=user.groups.all()
-        )
-        min_price = prices.order_by("amount").values("amount")[:1]
-        # noinspection PyTypeChecker
-        return self.annotate(price=Subquery(min_price))
-
-    def annotate_foundation_for(self, user: User) -> "ArticleQuerySet":
-        """
-        Annote le queryset avec la fondation s'appliquant à l'utilisateur donné.
-
-        La fondation d'un article pour un utilisateur est la fondation
-        associée au prix le plus bas parmi ceux applicables à l'utilisateur.
-
-        Args:
-            user: l'utilisateur pour lequel la fondation doit être annotée
-
-        """
-        prices = Price.objects.filter(
-            article=OuterRef("pk"), group__in=user.groups.all()
-        )
-        min_foundation = prices.order_by("amount").values("foundation_id")[:1]
-        # noinspection PyTypeChecker
-        return self.annotate(foundation=Subquery(min_foundation))
-
 
 class Article(models.Model):
     """
@@ -116,7 +97,7 @@ class Article(models.Model):
     Attributes:
         name (CharField): nom de l'article
         category (ForeignKey): catégorie de l'article
-        stock (IntegerField): stock de l'article
+        stock (IntegerField): stock de l'article (-1 s'il est illimité)
         is_removed (BooleanField): indique si l'article est supprimé
     """
 
@@ -174,6 +155,53 @@ class Period(models.Model):
         return self.name
 
 
+class PriceQuerySet(models.QuerySet):
+    """
+    QuerySet personnalisé pour les prix.
+    """
+
+    def active(self, at: datetime | None = None) -> "PriceQuerySet":
+        """
+        Filtre le queryset pour ne garder que les prix non supprimés
+        dont la période est en cours à l'instant donné.
+
+        Args:
+            at: l'instant auquel les prix doivent être applicables
+                (maintenant par défaut)
+        """
+        at = at or now()
+        # noinspection PyTypeChecker
+        return self.filter(
+            Q(period__end__gte=at) | Q(period__end__isnull=True),
+            period__start__lte=at,
+            is_removed=False,
+        )
+
+    def cheapest_for(
+        self, group_ids: Iterable[int], at: datetime | None = None
+    ) -> "PriceQuerySet":
+        """
+        Ne garde que le prix le plus bas de chaque article
+        parmi ceux applicables aux groupes donnés à l'instant donné.
+
+        Le prix retenu est sélectionné en une seule passe
+        par un `SELECT DISTINCT ON (article_id)`, si bien que son montant,
+        sa fondation et son id sont obtenus ensemble.
+
+        Args:
+            group_ids: les ids des groupes de l'utilisateur
+            at: l'instant auquel les prix doivent être applicables
+                (maintenant par défaut)
+        """
+        # noinspection PyTypeChecker
+        return (
+            self.active(at)
+            .filter(group_id__any=group_ids, article__is_removed=False)
+            .order_by("article_id", "amount", "pk")
+            .distinct("article_id")
+        )
+
+
 class Price(models.Model):
     """
     Représente un prix d'un article pour une fondation et une période données.
@@ -204,6 +232,8 @@ class Price(models.Model):
 
     is_removed = models.BooleanField(default=False)
 
+    objects = PriceQuerySet.as_manager()
+
     class Meta:
         constraints = [
             models.UniqueConstraint(
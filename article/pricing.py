@@ -0,0 +1,272 @@
+"""
+Résolution en mémoire des prix des articles.
+
+Le prix d'un article pour un utilisateur est le prix le plus bas
+parmi ceux applicables aux groupes de ce dernier sur une période en cours.
+Plutôt que de recalculer ce prix en SQL à chaque requête,
+l'ensemble des prix est chargé en une seule requête dans une
+[PriceMatrix][article.pricing.PriceMatrix], indexée par article,
+puis la résolution se fait par simple parcours de dictionnaire.
+
+La matrice est versionnée : chaque modification d'un prix, d'une période
+ou d'un article change son jeton de version, stocké dans le cache partagé
+par tous les processus (voir `buckutt.versions`) : le processus ayant effectué
+la modification recharge sa matrice lors de sa prochaine résolution,
+les autres au plus tard `VERSION_CHECK_INTERVAL` secondes après.
+
+Lorsque la matrice est désactivée (paramètre `PRICE_MATRIX_ENABLED`),
+les prix sont résolus par une requête SQL unique
+([cheapest_for][article.models.PriceQuerySet.cheapest_for]).
+"""
+import threading
+from collections.abc import Iterable
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal
+from typing import NamedTuple
+
+from django.conf import settings
+from django.utils.timezone import now
+
+from article.models import Period, Price
+from article.timeline import PeriodTimeline, contains
+from buckutt.metrics import cache_requests
+from buckutt.types import PrimaryKey
+from buckutt.versions import bump_version, get_version
+
+PRICES_VERSION_KEY = "article:prices:version"
+
+
+@dataclass(frozen=True, slots=True)
+class ResolvedPrice:
+    """
+    Prix retenu pour un article et un ensemble de groupes.
+
+    Attributes:
+        id (PrimaryKey): id du [Price][article.models.Price] retenu
+        amount (Decimal): montant du prix
+        foundation (PrimaryKey): id de la fondation associée au prix
+    """
+
+    id: PrimaryKey
+    amount: Decimal
+    foundation: PrimaryKey
+
+
+class _PriceEntry(NamedTuple):
+    amount: Decimal
+    group_id: int
+    start: datetime
+    end: datetime | None
+    id: int
+    foundation_id: int
+
+    def is_active(self, at: datetime) -> bool:
+        return self.start <= at and (self.end is None or at <= self.end)
+
+
+class _Resolution(NamedTuple):
+    interval: tuple[datetime | None, datetime | None]
+    prices: dict[PrimaryKey, ResolvedPrice]
+
+
+class _State(NamedTuple):
+    version: str | None
+    entries: dict[int, list[_PriceEntry]]
+    timeline: PeriodTimeline
+    resolutions: dict[frozenset[int], _Resolution]
+
+
+_EMPTY_STATE = _State(None, {}, PeriodTimeline([]), {})
+
+
+def invalidate_prices() -> None:
+    """
+    Invalide la matrice des prix de tous les processus.
+
+    La matrice de chaque processus sera rechargée lors de sa prochaine utilisation.
+    """
+    bump_version(PRICES_VERSION_KEY)
+
+
+class PriceMatrix:
+    """
+    Matrice des prix indexée par article, groupe et période.
+
+    Pour chaque article, les prix sont conservés triés par montant croissant,
+    si bien que le prix applicable à un ensemble de groupes
+    est le premier dont le groupe appartient à l'ensemble
+    et dont la période est en cours.
+
+    Les prix résolus pour un ensemble de groupes sont conservés
+    jusqu'à la prochaine borne de période
+    ([PeriodTimeline][article.timeline.PeriodTimeline]) :
+    entre deux bornes, une résolution ne coûte qu'une lecture de dictionnaire.
+
+    Seuls les prix non supprimés d'articles non supprimés sont chargés.
+
+    Examples:
+        ```python
+        from article.pricing import price_matrix
+
+        group_ids = user_groups.get(user.pk)
+        prices = price_matrix.resolve(group_ids, article_ids=[1, 2, 3])
+        prices[1].amount  # prix de l'article 1 pour l'utilisateur
+        ```
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = _EMPTY_STATE
+
+    @staticmethod
+    def _load(version: str) -> _State:
+        rows = (
+            Price.objects.filter(is_removed=False, article__is_removed=False)
+            .order_by("article_id", "amount", "pk")
+            .values_list(
+                "article_id",
+                "amount",
+                "group_id",
+                "period__start",
+                "period__end",
+                "pk",
+                "foundation_id",
+            )
+        )
+        entries: dict[int, list[_PriceEntry]] = {}
+        for article_id, *entry in rows:
+            entries.setdefault(article_id, []).append(_PriceEntry(*entry))
+        timeline = PeriodTimeline(
+            (e.start, e.end) for article in entries.values() for e in article
+        )
+        return _State(version, entries, timeline, {})
+
+    def _current(self) -> _State:
+        version = get_version(PRICES_VERSION_KEY)
+        if version == self._state.version:
+            return self._state
+        with self._lock:
+            # la version est lue avant le chargement : une invalidation
+            # concurrente provoquera un nouveau chargement au prochain appel
+            if version != self._state.version:
+                self._state = self._load(version)
+            return self._state
+
+    @property
+    def timeline(self) -> PeriodTimeline:
+        """
+        Frise des périodes des prix chargés dans la matrice.
+        """
+        return self._current().timeline
+
+    @staticmethod
+    def _resolve_all(
+        entries: dict[int, list[_PriceEntry]], group_ids: frozenset[int], at: datetime
+    ) -> dict[PrimaryKey, ResolvedPrice]:
+        res = {}
+        for article_id, article_entries in entries.items():
+            for entry in article_entries:
+                if entry.group_id in group_ids and entry.is_active(at):
+                    res[article_id] = ResolvedPrice(
+                        id=entry.id, amount=entry.amount, foundation=entry.foundation_id
+                    )
+                    break
+        return res
+
+    def resolve(
+        self,
+        group_ids: Iterable[int],
+        article_ids: Iterable[PrimaryKey] | None = None,
+        at: datetime | None = None,
+    ) -> dict[PrimaryKey, ResolvedPrice]:
+        """
+        Résout le prix le plus bas de chaque article pour un ensemble de groupes.
+
+        Les articles n'ayant aucun prix applicable à ces groupes
+        à l'instant donné sont absents du résultat.
+
+        Args:
+            group_ids: les ids des groupes de l'utilisateur
+            article_ids: les ids des articles à résoudre (tous les articles par défaut)
+            at: l'instant auquel résoudre les prix (maintenant par défaut)
+
+        Returns:
+            Un dictionnaire associant l'id de chaque article à son prix.
+        """
+        state = self._current()
+        group_ids = frozenset(group_ids)
+        at = at or now()
+        resolution = state.resolutions.get(group_ids)
+        if resolution is None or not contains(resolution.interval, at):
+            cache_requests.inc(cache="prices", result="miss")
+            resolution = _Resolution(
+                state.timeline.interval(at),
+                self._resolve_all(state.entries, group_ids, at),
+            )
+            state.resolutions[group_ids] = resolution
+        else:
+            cache_requests.inc(cache="prices", result="hit")
+        prices = resolution.prices
+        if article_ids is None:
+            return dict(prices)
+        return {pk: prices[pk] for pk in article_ids if pk in prices}
+
+    def clear(self) -> None:
+        """
+        Vide la matrice de ce processus.
+
+        Contrairement à [invalidate_prices][article.pricing.invalidate_prices],
+        les autres processus ne sont pas affectés.
+        """
+        with self._lock:
+            self._state = _EMPTY_STATE
+
+
+price_matrix = PriceMatrix()
+"""Matrice des prix partagée par tous les threads du processus."""
+
+
+def period_timeline() -> PeriodTimeline:
+    """
+    Retourne la frise des périodes ayant une influence sur les prix.
+
+    Lorsque la matrice des prix est activée, la frise est celle de la matrice ;
+    sinon, elle est chargée depuis la base de données à chaque appel.
+    """
+    if settings.PRICE_MATRIX_ENABLED:
+        return price_matrix.timeline
+    return PeriodTimeline(Period.objects.values_list("start", "end"))
+
+
+def resolve_prices(
+    group_ids: Iterable[int],
+    article_ids: Iterable[PrimaryKey] | None = None,
+    at: datetime | None = None,
+) -> dict[PrimaryKey, ResolvedPrice]:
+    """
+    Résout le prix le plus bas de chaque article pour un ensemble de groupes.
+
+    Les prix sont lus dans la matrice des prix du processus
+    si le paramètre `PRICE_MATRIX_ENABLED` est activé,
+    et par une requête SQL unique sinon.
+
+    Args:
+        group_ids: les ids des groupes de l'utilisateur
+        article_ids: les ids des articles à résoudre (tous les articles par défaut)
+        at: l'instant auquel résoudre les prix (maintenant par défaut)
+
+    Returns:
+        Un dictionnaire associant l'id de chaque article à son prix.
+    """
+    if settings.PRICE_MATRIX_ENABLED:
+        return price_matrix.resolve(group_ids, article_ids=article_ids, at=at)
+    prices = Price.objects.cheapest_for(group_ids, at=at)
+    if article_ids is not None:
+        prices = prices.filter(article_id__any=article_ids)
+    return {
+        article_id: ResolvedPrice(id=pk, amount=amount, foundation=foundation_id)
+        for article_id, pk, amount, foundation_id in prices.values_list(
+            "article_id", "pk", "amount", "foundation_id"
+        )
+    }
@@ -0,0 +1,41 @@
+"""
+Signaux de l'application `article`.
+
+Toute modification d'un prix, d'une période ou d'un article
+invalide la matrice des prix ([PriceMatrix][article.pricing.PriceMatrix])
+et les instantanés du catalogue
+([CatalogueSnapshots][article.catalogue.CatalogueSnapshots]).
+Ces derniers sont aussi invalidés lorsque l'assortiment
+d'un point de vente change.
+"""
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from article.catalogue import invalidate_catalogue
+from article.models import Article, Period, Price
+from article.pricing import invalidate_prices
+from selling_points.models import SellingPoint
+
+
+@receiver(post_save, sender=Article)
+@receiver(post_delete, sender=Article)
+@receiver(post_save, sender=Period)
+@receiver(post_delete, sender=Period)
+@receiver(post_save, sender=Price)
+@receiver(post_delete, sender=Price)
+def on_price_change(**kwargs):
+    # L'invalidation immédiate rend la modification visible dans la transaction
+    # en cours ; celle faite après le commit empêche un autre processus
+    # d'avoir rechargé la matrice avant que la modification soit visible.
+    invalidate_prices()
+    invalidate_catalogue()
+    transaction.on_commit(invalidate_prices)
+    transaction.on_commit(invalidate_catalogue)
+
+
+@receiver(m2m_changed, sender=SellingPoint.articles.through)
+@receiver(post_delete, sender=SellingPoint)
+def on_assortment_change(**kwargs):
+    invalidate_catalogue()
+    transaction.on_commit(invalidate_catalogue)
@@ -0,0 +1,92 @@
+"""
+Gestion du stock des articles.
+
+Le stock d'un article ([Article.stock][article.models.Article]) vaut -1
+si l'article est disponible en quantité illimitée ; sinon, il est décrémenté
+à chaque vente, dans la même transaction que celle-ci.
+
+Seules les lignes des articles à stock limité sont modifiées,
+et donc verrouillées : les ventes d'articles illimités ne sont jamais
+mises en attente par d'autres ventes.
+
+Une vente n'invalide les instantanés du catalogue
+([CatalogueSnapshots][article.catalogue.CatalogueSnapshots])
+que si elle épuise le stock d'un article, qui disparaît alors du catalogue :
+le stock affiché par un instantané est celui de son calcul,
+et les ventes restent limitées par le stock réel.
+"""
+from collections.abc import Iterable, Mapping
+
+from django.db import connection, transaction
+
+from article.models import Article
+from buckutt.types import PrimaryKey
+
+
+def decrement_stock(quantities: Mapping[PrimaryKey, int]) -> set[PrimaryKey]:
+    """
+    Décrémente le stock des articles des quantités données,
+    en une seule requête conditionnelle.
+
+    Le stock d'un article n'est décrémenté que s'il est suffisant.
+    Cette fonction doit être appelée dans une transaction,
+    annulée si des articles sont en rupture de stock.
+
+    Args:
+        quantities: les quantités vendues, indexées par id d'article
+
+    Returns:
+        Les ids des articles dont le stock est insuffisant.
+    """
+    if not quantities:
+        return set()
+    table = Article._meta.db_table
+    # les articles sont triés par id pour que deux ventes concurrentes
+    # verrouillent leurs lignes dans le même ordre
+    ids = sorted(quantities)
+    with connection.cursor() as cursor:
+        # les quantités sont passées en tableaux : le texte de la requête
+        # ne dépend pas du nombre d'articles (voir buckutt.lookups)
+        cursor.execute(
+            "WITH v(id, quantity) AS "
+            "(SELECT * FROM unnest(%s::bigint[], %s::integer[])), "
+            "updated AS ("
+            f'  UPDATE "{table}" AS a SET "stock" = a."stock" - v.quantity '
+            '  FROM v WHERE a."id" = v.id AND a."stock" >= v.quantity '
+            '  RETURNING a."id", a."stock"'
+            ") "
+            "SELECT v.id, u.id IS NOT NULL, u.stock "
+            f'FROM v JOIN "{table}" AS a ON a."id" = v.id '
+            "LEFT JOIN updated AS u ON u.id = v.id "
+            'WHERE a."stock" <> -1',
+            [ids, [quantities[pk] for pk in ids]],
+        )
+        rows = cursor.fetchall()
+    if any(is_updated and stock == 0 for _, is_updated, stock in rows):
+        # import local : le catalogue dépend des schémas,
+        # qui ne peuvent être importés avant le chargement des modèles
+        from article.catalogue import invalidate_catalogue
+
+        # un article épuisé n'est plus disponible
+        invalidate_catalogue()
+        transaction.on_commit(invalidate_catalogue)
+    return {pk for pk, is_updated, _ in rows if not is_updated}
+
+
+def lock_stock(article_ids: Iterable[PrimaryKey]) -> dict[PrimaryKey, int]:
+    """
+    Verrouille les articles à stock limité parmi ceux donnés
+    (`SELECT ... FOR UPDATE`) et retourne leur stock.
+
+    Les articles à stock illimité ne sont ni verrouillés ni retournés.
+
+    Args:
+        article_ids: les ids des articles
+    """
+    return dict(
+        Article.objects.select_for_update()
+        .filter(pk__any=article_ids)
+        .exclude(stock=-1)
+        .order_by("pk")
+        .values_list("pk", "stock")
+    )
@@ -0,0 +1,140 @@
+from datetime import timedelta
+
+import orjson
+from django.contrib.auth.models import Group
+from django.test import TestCase, override_settings
+from django.utils.timezone import now
+
+from article.catalogue import catalogue_snapshots
+from article.models import Article, Category, Foundation, Period, Price
+from article.pricing import price_matrix
+from article.timeline import RESOLUTION
+from selling_points.models import SellingPoint
+from users.memberships import user_groups
+from users.models import User
+
+
+class CatalogueSnapshotsTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.group = Group.objects.first()
+        cls.customer = User.objects.create(username="client", pin="0000")
+        cls.customer.groups.add(cls.group)
+        cls.article = Article.objects.create(
+            name="Bière", category=Category.objects.first()
+        )
+        cls.point = SellingPoint.objects.create(name="Bar")
+        cls.point.articles.add(cls.article)
+        cls.price = Price.objects.create(
+            article=cls.article,
+            group=cls.group,
+            foundation=Foundation.objects.first(),
+            period=Period.objects.create(
+                name="Période test",
+                start=now() - timedelta(hours=1),
+                end=now() + timedelta(hours=1),
+            ),
+            amount=2,
+        )
+
+    def setUp(self):
+        price_matrix.clear()
+        catalogue_snapshots.clear()
+        user_groups.clear()
+
+    def fetch(self) -> list[dict]:
+        res = self.client.get(
+            "/api/article/available-articles",
+            {"selling_point_id": self.point.pk, "user_id": self.customer.pk},
+        )
+        self.assertEqual(res.status_code, 200)
+        return orjson.loads(res.content)
+
+    def test_snapshot_reused(self):
+        """
+        Test que le catalogue est servi depuis l'instantané
+        une fois celui-ci calculé.
+        """
+        self.assertEqual(
+            self.fetch(),
+            [
+                {
+                    "id": self.article.pk,
+                    "name": "Bière",
+                    "category": self.article.category_id,
+                    "stock": -1,
+                    "price": 2.0,
+                    "foundation": self.price.foundation_id,
+                }
+            ],
+        )
+        group_ids = frozenset([self.group.pk])
+        self.assertIsNotNone(catalogue_snapshots.get(self.point.pk, group_ids))
+        with self.assertNumQueries(1):  # utilisateur, groupes en cache
+            self.fetch()
+
+    def test_expired_after_ttl(self):
+        """
+        Test qu'un instantané n'est plus servi
+        au-delà de sa durée de vie maximale.
+        """
+        group_ids = frozenset([self.group.pk])
+        with override_settings(CATALOGUE_SNAPSHOT_TTL=0):
+            catalogue_snapshots.build(self.point.pk, group_ids)
+        self.assertIsNone(catalogue_snapshots.get(self.point.pk, group_ids))
+        catalogue_snapshots.build(self.point.pk, group_ids)
+        self.assertIsNotNone(catalogue_snapshots.get(self.point.pk, group_ids))
+
+    def test_invalidated_on_change(self):
+        """
+        Test que l'instantané est recalculé quand un prix
+        ou l'assortiment du point de vente change.
+        """
+        self.fetch()
+        self.price.amount = 3
+        self.price.save()
+        self.assertEqual(self.fetch()[0]["price"], 3.0)
+        self.point.articles.remove(self.article)
+        self.assertEqual(self.fetch(), [])
+
+    async def test_async_client(self):
+        """
+        Test que le catalogue est servi par ASGI, instantané calculé ou non,
+        et qu'un utilisateur inconnu donne une 404.
+        """
+        params = {"selling_point_id": self.point.pk, "user_id": self.customer.pk}
+        for _ in range(2):
+            res = await self.async_client.get("/api/article/available-articles", params)
+            self.assertEqual(orjson.loads(res.content)[0]["id"], self.article.pk)
+        res = await self.async_client.get(
+            "/api/article/available-articles", {**params, "user_id": 9999}
+        )
+        self.assertEqual(res.status_code, 404)
+
+    def test_unknown_point(self):
+        res = self.client.get(
+            "/api/article/available-articles",
+            {"selling_point_id": 9999, "user_id": self.customer.pk},
+        )
+        self.assertEqual(res.status_code, 404)
+
+    def test_catalogue_at(self):
+        """
+        Test que le catalogue peut être consulté à un instant donné
+        et que l'instantané courant expire à la fin de la période.
+        """
+        self.fetch()
+        group_ids = frozenset([self.group.pk])
+        end = self.price.period.end
+        self.assertIsNone(
+            catalogue_snapshots.get(self.point.pk, group_ids, at=end + RESOLUTION)
+        )
+        res = self.client.get(
+            "/api/article/available-articles",
+            {
+                "selling_point_id": self.point.pk,
+                "user_id": self.customer.pk,
+                "at": (end + RESOLUTION).isoformat(),
+            },
+        )
+        self.assertEqual(orjson.loads(res.content), [])
@@ -0,0 +1,139 @@
+from datetime import timedelta
+
+from django.contrib.auth.models import Group
+from django.test import TestCase, override_settings
+from django.utils.timezone import now
+
+from article.models import Article, Category, Foundation, Period, Price
+from article.pricing import price_matrix, resolve_prices
+
+
+class PriceMatrixTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name="Test")
+        cls.article = Article.objects.create(name="Bière", category=cls.category)
+        cls.foundation = Foundation.objects.first()
+        cls.other_foundation = Foundation.objects.create(
+            name="Autre", website="https://example.com", mail="autre@example.com"
+        )
+        cls.group_a, cls.group_b = Group.objects.all()[:2]
+        cls.period = Period.objects.create(
+            name="Période test",
+            start=now() - timedelta(hours=1),
+            end=now() + timedelta(hours=1),
+        )
+        cls.expensive = Price.objects.create(
+            article=cls.article,
+            group=cls.group_a,
+            foundation=cls.foundation,
+            period=cls.period,
+            amount=2,
+        )
+        cls.cheap = Price.objects.create(
+            article=cls.article,
+            group=cls.group_b,
+            foundation=cls.other_foundation,
+            period=cls.period,
+            amount=1,
+        )
+
+    def setUp(self):
+        price_matrix.clear()
+
+    def test_cheapest_price_for_groups(self):
+        """
+        Test que le prix résolu est le plus bas parmi ceux des groupes donnés,
+        avec la fondation correspondante.
+        """
+        prices = price_matrix.resolve([self.group_a.pk, self.group_b.pk])
+        self.assertEqual(prices[self.article.pk].id, self.cheap.pk)
+        self.assertEqual(prices[self.article.pk].amount, 1)
+        self.assertEqual(prices[self.article.pk].foundation, self.other_foundation.pk)
+        prices = price_matrix.resolve([self.group_a.pk])
+        self.assertEqual(prices[self.article.pk].id, self.expensive.pk)
+
+    def test_inactive_period(self):
+        """
+        Test qu'aucun prix n'est résolu en dehors de sa période.
+        """
+        prices = price_matrix.resolve(
+            [self.group_a.pk], at=self.period.end + timedelta(seconds=1)
+        )
+        self.assertNotIn(self.article.pk, prices)
+
+    def test_invalidated_on_change(self):
+        """
+        Test que la modification d'un prix est prise en compte
+        par la matrice déjà chargée.
+        """
+        price_matrix.resolve([self.group_a.pk])
+        self.cheap.amount = 3
+        self.cheap.save()
+        prices = price_matrix.resolve([self.group_a.pk, self.group_b.pk])
+        self.assertEqual(prices[self.article.pk].id, self.expensive.pk)
+        self.article.is_removed = True
+        self.article.save()
+        self.assertEqual(price_matrix.resolve([self.group_a.pk]), {})
+
+    def test_happy_hour_boundary(self):
+        """
+        Test que le prix d'une happy hour s'applique exactement
+        de son début à sa fin, sans invalidation de la matrice.
+        """
+        start = now() + timedelta(minutes=10)
+        happy_hour = Period.objects.create(
+            name="Happy hour", start=start, end=start + timedelta(minutes=10)
+        )
+        happy_price = Price.objects.create(
+            article=self.article,
+            group=self.group_a,
+            foundation=self.foundation,
+            period=happy_hour,
+            amount="0.5",
+        )
+        group_ids = [self.group_a.pk]
+        before = start - timedelta(microseconds=1)
+        after = happy_hour.end + timedelta(microseconds=1)
+        self.assertEqual(price_matrix.timeline.next_boundary(before), start)
+        for at, expected in [
+            (before, self.expensive),
+            (start, happy_price),
+            (happy_hour.end, happy_price),
+            (after, self.expensive),
+        ]:
+            with self.assertNumQueries(0):
+                prices = price_matrix.resolve(group_ids, at=at)
+            self.assertEqual(prices[self.article.pk].id, expected.pk)
+
+    @override_settings(PRICE_MATRIX_ENABLED=False)
+    def test_sql_resolver_matches_matrix(self):
+        """
+        Test que la résolution par SQL (DISTINCT ON) donne
+        le même résultat que la matrice des prix.
+        """
+        group_ids = [self.group_a.pk, self.group_b.pk]
+        self.assertEqual(
+            resolve_prices(group_ids, article_ids=[self.article.pk]),
+            price_matrix.resolve(group_ids, article_ids=[self.article.pk]),
+        )
+        self.assertEqual(
+            resolve_prices(group_ids, at=self.period.end + timedelta(seconds=1)), {}
+        )
+
+    def test_sql_text_independent_of_ids(self):
+        """
+        Test que le texte de la requête de résolution des prix
+        ne dépend pas du nombre de groupes ni d'articles.
+        """
+        at = now()
+
+        def sql(group_ids: list[int], article_ids: list[int]) -> str:
+            prices = Price.objects.cheapest_for(group_ids, at=at)
+            return prices.filter(article_id__any=article_ids).query.sql_with_params()[0]
+
+        self.assertEqual(sql([self.group_a.pk], []), sql([1, 2, 3], [1, 2]))
+        prices = Price.objects.cheapest_for([self.group_a.pk, self.group_b.pk])
+        self.assertEqual(
+            list(prices.filter(article_id__any=[self.article.pk])), [self.cheap]
+        )
@@ -0,0 +1,41 @@
+from datetime import timedelta
+
+from django.test import SimpleTestCase
+from django.utils.timezone import now
+
+from article.timeline import RESOLUTION, PeriodTimeline
+
+
+class PeriodTimelineTestCase(SimpleTestCase):
+    def setUp(self):
+        self.t = now()
+        self.timeline = PeriodTimeline(
+            [
+                (self.t, self.t + timedelta(hours=2)),
+                (self.t + timedelta(hours=1), None),
+            ]
+        )
+
+    def test_next_boundary(self):
+        """
+        Test que la prochaine borne est le prochain début de période
+        ou l'instant suivant la prochaine fin de période.
+        """
+        self.assertEqual(
+            self.timeline.next_boundary(self.t - timedelta(days=1)), self.t
+        )
+        self.assertEqual(
+            self.timeline.next_boundary(self.t), self.t + timedelta(hours=1)
+        )
+        self.assertEqual(
+            self.timeline.next_boundary(self.t + timedelta(hours=1)),
+            self.t + timedelta(hours=2) + RESOLUTION,
+        )
+        self.assertIsNone(self.timeline.next_boundary(self.t + timedelta(days=1)))
+
+    def test_interval(self):
+        self.assertEqual(
+            self.timeline.interval(self.t + timedelta(minutes=30)),
+            (self.t, self.t + timedelta(hours=1)),
+        )
+        self.assertEqual(self.timeline.interval(self.t - RESOLUTION), (None, self.t))
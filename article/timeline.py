@@ -0,0 +1,84 @@
+"""
+Frise chronologique des périodes de prix.
+
+L'ensemble des prix applicables ne change qu'au début ou à la fin
+d'une période. Entre deux de ces instants (les bornes),
+les prix résolus et le catalogue restent identiques :
+ils peuvent donc être conservés en cache jusqu'à la prochaine borne,
+sans durée de vie arbitraire, et sont recalculés exactement
+au moment où un prix entre en vigueur ou expire.
+"""
+import bisect
+from collections.abc import Iterable
+from datetime import datetime, timedelta
+
+RESOLUTION = timedelta(microseconds=1)
+"""Plus petit écart entre deux instants distincts."""
+
+
+class PeriodTimeline:
+    """
+    Index des bornes des périodes.
+
+    Une période est en cours de son début à sa fin incluse :
+    l'ensemble des périodes en cours change donc à chaque début de période
+    et juste après chaque fin de période.
+
+    Examples:
+        ```python
+        from article.pricing import period_timeline
+
+        timeline = period_timeline()
+        timeline.next_boundary(now())  # prochain changement de prix
+        valid_from, valid_until = timeline.interval(now())
+        ```
+    """
+
+    def __init__(self, ranges: Iterable[tuple[datetime, datetime | None]]):
+        """
+        Args:
+            ranges: les couples (début, fin) des périodes,
+                la fin pouvant être `None` pour une période sans fin
+        """
+        boundaries = set()
+        for start, end in ranges:
+            boundaries.add(start)
+            if end is not None:
+                boundaries.add(end + RESOLUTION)
+        self.boundaries: list[datetime] = sorted(boundaries)
+
+    def interval(self, at: datetime) -> tuple[datetime | None, datetime | None]:
+        """
+        Retourne l'intervalle `[début, fin[` contenant l'instant donné
+        pendant lequel l'ensemble des périodes en cours ne change pas.
+
+        Une borne vaut `None` si l'intervalle n'est pas borné de ce côté.
+
+        Args:
+            at: l'instant considéré
+        """
+        i = bisect.bisect_right(self.boundaries, at)
+        valid_from = self.boundaries[i - 1] if i > 0 else None
+        valid_until = self.boundaries[i] if i < len(self.boundaries) else None
+        return valid_from, valid_until
+
+    def next_boundary(self, after: datetime) -> datetime | None:
+        """
+        Retourne le premier instant strictement postérieur à celui donné
+        auquel l'ensemble des périodes en cours change,
+        ou `None` s'il n'y en a plus.
+
+        Args:
+            after: l'instant considéré
+        """
+        return self.interval(after)[1]
+
+
+def contains(interval: tuple[datetime | None, datetime | None], at: datetime) -> bool:
+    """
+    Indique si l'instant donné appartient à l'intervalle `[début, fin[` donné.
+    """
+    valid_from, valid_until = interval
+    return (valid_from is None or valid_from <= at) and (
+        valid_until is None or at < valid_until
+    )
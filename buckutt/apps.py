@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class BuckuttConfig(AppConfig):
+    name = "buckutt"
+
+    def ready(self):
+        from buckutt import lookups, profiling  # noqa: F401
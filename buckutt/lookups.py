@@ -0,0 +1,46 @@
+"""
+Lookups dont le texte SQL ne dépend pas des valeurs.
+
+`filter(pk__in=ids)` produit `"id" IN (%s, %s, ...)` : le texte de la requête
+change avec le nombre d'ids, si bien que PostgreSQL doit l'analyser
+et la planifier à chaque exécution.
+Le lookup `any` ([Any][buckutt.lookups.Any]) passe toutes les valeurs
+dans un seul paramètre tableau : `"id" = ANY(%s::bigint[])`.
+Le texte de la requête est alors le même quel que soit le nombre de valeurs,
+et la requête peut être préparée une fois par connexion
+(voir `DB_SERVER_SIDE_BINDING` dans `buckutt.settings`).
+
+Contrairement à `__in`, une liste vide ne court-circuite pas la requête :
+elle est exécutée et ne retourne aucune ligne.
+
+Examples:
+    ```python
+    Article.objects.filter(pk__any=[1, 2, 3])
+    Price.objects.filter(group_id__any=user_groups.get(user.pk))
+    ```
+"""
+from django.db.models import Field, ForeignObject, Lookup
+
+
+class Any(Lookup):
+    """
+    `champ__any=valeurs` : la valeur du champ est l'une des valeurs données.
+    """
+
+    lookup_name = "any"
+    prepare_rhs = False
+
+    def get_prep_lookup(self) -> list:
+        field = self.lhs.output_field
+        return [field.get_prep_value(value) for value in self.rhs]
+
+    def as_sql(self, compiler, connection) -> tuple[str, list]:
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        db_type = self.lhs.output_field.cast_db_type(connection)
+        return f"{lhs} = ANY({rhs}::{db_type}[])", [*lhs_params, *rhs_params]
+
+
+Field.register_lookup(Any)
+# les lookups des clefs étrangères ne sont pas hérités de Field
+ForeignObject.register_lookup(Any)
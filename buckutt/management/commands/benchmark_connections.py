@@ -0,0 +1,75 @@
+import statistics
+import time
+from io import BytesIO
+from wsgiref.util import setup_testing_defaults
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+from django.test import override_settings
+
+
+def _status(status: str, headers: list, exc_info=None) -> None:
+    if not status.startswith("200"):
+        raise CommandError(f"Réponse {status}")
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesure la latence d'une route servie par le gestionnaire WSGI "
+        "avec une connexion à la base de données par requête, "
+        "puis avec des connexions persistantes (CONN_MAX_AGE), "
+        "avec et sans vérification avant réutilisation (CONN_HEALTH_CHECKS). "
+        "Les requêtes sont envoyées dans le processus, une à une."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=1000)
+        parser.add_argument("--path", default="/api/treasury/global-credit")
+        parser.add_argument(
+            "--max-age",
+            type=int,
+            default=60,
+            help="CONN_MAX_AGE des connexions persistantes",
+        )
+
+    def handle(self, *args, **options):
+        modes = {
+            "une connexion par requête": (0, False),
+            "persistantes": (options["max_age"], False),
+            "persistantes, vérifiées": (options["max_age"], True),
+        }
+        handler = WSGIHandler()
+        self.stdout.write(f"{'':<28} {'moyenne':>10} {'médiane':>10} {'p95':>10}  (ms)")
+        # les requêtes sont envoyées à 127.0.0.1 (voir wsgiref.util)
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "127.0.0.1"]):
+            for name, (max_age, health_checks) in modes.items():
+                connection.close()
+                connection.settings_dict["CONN_MAX_AGE"] = max_age
+                connection.settings_dict["CONN_HEALTH_CHECKS"] = health_checks
+                self.request(handler, options["path"])
+                durations = [
+                    self.request(handler, options["path"])
+                    for _ in range(options["requests"])
+                ]
+                self.stdout.write(
+                    f"{name:<28} {statistics.mean(durations):>10.2f} "
+                    f"{statistics.median(durations):>10.2f} "
+                    f"{statistics.quantiles(durations, n=20)[-1]:>10.2f}"
+                )
+        connection.close()
+
+    def request(self, handler: WSGIHandler, path: str) -> float:
+        """
+        Envoie une requête GET et retourne sa durée en millisecondes,
+        fermeture de la réponse (et donc de la connexion) comprise.
+        """
+        path, _, query = path.partition("?")
+        environ = {"PATH_INFO": path, "QUERY_STRING": query, "wsgi.input": BytesIO()}
+        setup_testing_defaults(environ)
+        start = time.perf_counter()
+        response = handler(environ, _status)
+        b"".join(response)
+        response.close()
+        return (time.perf_counter() - start) * 1000
@@ -0,0 +1,100 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+from django.db import connections
+from django.test import AsyncClient, Client, override_settings
+
+from selling_points.models import SellingPoint
+from users.models import User
+
+
+def _shares(total: int, workers: int) -> list[int]:
+    return [total // workers + (i < total % workers) for i in range(workers)]
+
+
+def _check(path: str, status: int) -> None:
+    if status != 200:  # noqa: PLR2004
+        raise CommandError(f"{path} : réponse {status}")
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare le débit des routes de lecture servies par le gestionnaire WSGI "
+        "(un thread par requête simultanée, comme gunicorn --threads) "
+        "et par le gestionnaire ASGI (une seule boucle d'évènements), "
+        "à nombre de requêtes simultanées égal. "
+        "Les requêtes sont envoyées dans le processus, sans serveur ni réseau : "
+        "seul le traitement des requêtes par Django est mesuré. "
+        "Utilise les données de la base (voir reset_db)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=2000)
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=8,
+            help="threads WSGI et requêtes ASGI simultanées",
+        )
+
+    def endpoints(self) -> dict[str, str]:
+        point = SellingPoint.objects.filter(is_removed=False).first()
+        user = User.objects.filter(groups__isnull=False).first()
+        if point is None or user is None:
+            raise CommandError("Aucun point de vente ou utilisateur (voir reset_db)")
+        return {
+            "catalogue": "/api/article/available-articles"
+            f"?selling_point_id={point.pk}&user_id={user.pk}",
+            "achats": "/api/purchase",
+            "résumé des achats": "/api/purchase/summary",
+            "rechargements": "/api/reload",
+            "résumé des rechargements": "/api/reload/summary",
+            "crédit total": "/api/treasury/global-credit",
+        }
+
+    def handle(self, *args, **options):
+        total, workers = options["requests"], options["concurrency"]
+        endpoints = self.endpoints()
+        self.stdout.write(f"{'':<26} {'WSGI (req/s)':>14} {'ASGI (req/s)':>14}")
+        # les clients de test envoient leurs requêtes à « testserver »
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"]):
+            for name, path in endpoints.items():
+                wsgi = self.run_wsgi(path, total, workers)
+                asgi = asyncio.run(self.run_asgi(path, total, workers))
+                self.stdout.write(
+                    f"{name:<26} {total / wsgi:>14.0f} {total / asgi:>14.0f}"
+                )
+
+    def run_wsgi(self, path: str, total: int, workers: int) -> float:
+        def worker(count: int) -> None:
+            client = Client()
+            try:
+                for _ in range(count):
+                    _check(path, client.get(path).status_code)
+            finally:
+                connections.close_all()
+
+        # premier appel : connexions, instantanés et caches
+        worker(1)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(workers) as pool:
+            list(pool.map(worker, _shares(total, workers)))
+        return time.perf_counter() - start
+
+    async def run_asgi(self, path: str, total: int, workers: int) -> float:
+        client = AsyncClient()
+
+        async def worker(count: int) -> None:
+            for _ in range(count):
+                _check(path, (await client.get(path)).status_code)
+
+        await worker(1)
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(count) for count in _shares(total, workers)))
+        elapsed = time.perf_counter() - start
+        await sync_to_async(connections.close_all)()
+        return elapsed
@@ -1,11 +1,16 @@
-from django.contrib.contenttypes.models import ContentType
 from django.core.management import BaseCommand, call_command
 
+from transaction.ledger import open_ledger
+
 
 class Command(BaseCommand):
     help = "Supprime la db et la repeuple avec les données de test"
 
     def handle(self, *args, **options):
+        call_command("createcachetable")
         call_command("flush", "--noinput")
-        ContentType.objects.all().delete()
         call_command("loaddata", "fixtures.json")
+        # le vidage de la db supprime aussi le compteur du crédit total
+        # et le registre des soldes, ouvert par une migration
+        call_command("reconcile_credit_counter", "--fix")
+        open_ledger()
@@ -0,0 +1,260 @@
+"""
+Métriques du processus au format texte de Prometheus.
+
+Les métriques sont conçues pour rester actives en production :
+une observation ne prend aucun verrou.
+Chaque série (une métrique et une combinaison de labels) conserve
+une copie de ses valeurs par thread, que seul ce thread modifie ;
+les copies ne sont additionnées qu'à la lecture, par la route `/metrics`
+([metrics_view][buckutt.metrics.metrics_view]).
+Un verrou n'est pris qu'à la création d'une série ou de la copie d'un thread.
+
+Les histogrammes ont des bornes fixées à leur création :
+une observation incrémente un seul compteur, trouvé par dichotomie.
+
+Les métriques sont propres à chaque processus : avec plusieurs workers,
+chacun doit être interrogé (ou les séries agrégées par Prometheus).
+
+Examples:
+    ```python
+    from buckutt.metrics import Counter
+
+    refunds = Counter("buckutt_refunds_total", "Remboursements", ["point"])
+    refunds.inc(point="3")
+    ```
+"""
+import threading
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from collections.abc import Iterator, Sequence
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpRequest, HttpResponse
+from django.utils.crypto import constant_time_compare
+
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+"""Bornes des histogrammes de durées, en secondes."""
+
+Sample = tuple[str, dict[str, str], float]
+
+
+class _PerThread:
+    """
+    Valeurs d'une série, avec une copie par thread.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._lock = threading.Lock()
+        # indexées par identifiant de thread : un identifiant n'est réutilisé
+        # qu'une fois son thread terminé, qui ne modifie donc plus ses valeurs
+        self._shards: dict[int, list[float]] = {}
+
+    def local(self) -> list[float]:
+        """
+        Retourne les valeurs du thread courant.
+        """
+        ident = threading.get_ident()
+        values = self._shards.get(ident)
+        if values is None:
+            with self._lock:
+                values = self._shards.setdefault(ident, [0] * self.size)
+        return values
+
+    def total(self) -> list[float]:
+        """
+        Retourne la somme des valeurs de tous les threads.
+        """
+        with self._lock:
+            shards = list(self._shards.values())
+        return [sum(column) for column in zip(*shards, strict=True)] or [0] * self.size
+
+
+class Metric(ABC):
+    """
+    Métrique, éventuellement déclinée en séries selon ses labels.
+
+    Attributes:
+        name (str): nom de la métrique
+        help (str): description de la métrique
+        labels (Sequence[str]): noms des labels de la métrique
+    """
+
+    type = ""
+    _size = 1
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._series: dict[tuple[str, ...], _PerThread] = {}
+        REGISTRY.append(self)
+
+    def _local(self, labels: dict[str, object]) -> list[float]:
+        key = tuple(str(labels[name]) for name in self.labels)
+        series = self._series.get(key)
+        if series is None:
+            with self._lock:
+                series = self._series.setdefault(key, _PerThread(self._size))
+        return series.local()
+
+    def _totals(self) -> Iterator[tuple[dict[str, str], list[float]]]:
+        for key, series in list(self._series.items()):
+            yield dict(zip(self.labels, key, strict=True)), series.total()
+
+    @abstractmethod
+    def samples(self) -> Iterator[Sample]:
+        """
+        Retourne les échantillons de toutes les séries de la métrique.
+        """
+
+
+class Counter(Metric):
+    """
+    Compteur, qui ne peut qu'augmenter.
+    """
+
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        """
+        Incrémente la série correspondant aux labels donnés.
+        """
+        self._local(labels)[0] += amount
+
+    def samples(self) -> Iterator[Sample]:
+        for labels, (value,) in self._totals():
+            yield self.name, labels, value
+
+
+class Histogram(Metric):
+    """
+    Histogramme à bornes fixes.
+
+    Attributes:
+        buckets (tuple[float, ...]): bornes supérieures des intervalles
+    """
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DURATION_BUCKETS,
+    ):
+        self.buckets = tuple(sorted(buckets))
+        # un compteur par intervalle, un au-delà de la dernière borne, la somme
+        self._size = len(self.buckets) + 2
+        super().__init__(name, help, labels)
+
+    def observe(self, value: float, **labels) -> None:
+        """
+        Ajoute une observation à la série correspondant aux labels donnés.
+        """
+        values = self._local(labels)
+        values[bisect_left(self.buckets, value)] += 1
+        values[-1] += value
+
+    def samples(self) -> Iterator[Sample]:
+        for labels, values in self._totals():
+            count = 0
+            for bound, n in zip((*self.buckets, "+Inf"), values, strict=False):
+                count += n
+                yield f"{self.name}_bucket", {**labels, "le": str(bound)}, count
+            yield f"{self.name}_sum", labels, values[-1]
+            yield f"{self.name}_count", labels, count
+
+
+REGISTRY: list[Metric] = []
+"""Métriques exposées par la route `/metrics`."""
+
+http_request_duration = Histogram(
+    "buckutt_http_request_duration_seconds",
+    "Durée des requêtes HTTP",
+    ["method", "route", "point"],
+)
+http_responses = Counter(
+    "buckutt_http_responses_total",
+    "Réponses HTTP par code de retour",
+    ["method", "route", "status"],
+)
+http_db_queries = Counter(
+    "buckutt_http_db_queries_total",
+    "Requêtes SQL exécutées pendant les requêtes HTTP",
+    ["method", "route"],
+)
+http_db_duration = Counter(
+    "buckutt_http_db_duration_seconds_total",
+    "Durée des requêtes SQL exécutées pendant les requêtes HTTP",
+    ["method", "route"],
+)
+http_render_duration = Counter(
+    "buckutt_http_render_duration_seconds_total",
+    "Durée de la sérialisation des réponses HTTP",
+    ["method", "route"],
+)
+db_connections = Counter(
+    "buckutt_db_connections_opened_total",
+    "Connexions ouvertes à la base de données (persistantes ou non)",
+    ["alias"],
+)
+cache_requests = Counter(
+    "buckutt_cache_requests_total",
+    "Consultations des caches en mémoire",
+    ["cache", "result"],
+)
+cart_size = Histogram(
+    "buckutt_cart_size",
+    "Nombre d'articles des paniers enregistrés",
+    ["point"],
+    buckets=(1, 2, 3, 5, 10, 20, 50),
+)
+sales_amount = Counter(
+    "buckutt_sales_amount_euros_total",
+    "Montant total des paniers enregistrés",
+    ["point"],
+)
+
+
+@receiver(connection_created)
+def _count_connection(sender, connection, **kwargs):
+    db_connections.inc(alias=connection.alias)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+
+def render() -> str:
+    """
+    Retourne toutes les métriques au format texte de Prometheus.
+    """
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+        for name, labels, value in metric.samples():
+            pairs = ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+            series = f"{name}{{{pairs}}}" if pairs else name
+            lines.append(f"{series} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def metrics_view(request: HttpRequest) -> HttpResponse:
+    """
+    Expose les métriques du processus.
+
+    Si `METRICS_TOKEN` est défini, la requête doit porter l'en-tête
+    `Authorization: Bearer <METRICS_TOKEN>`.
+    """
+    token = settings.METRICS_TOKEN
+    if token and not constant_time_compare(
+        request.headers.get("Authorization", ""), f"Bearer {token}"
+    ):
+        return HttpResponse(status=401)
+    return HttpResponse(render(), content_type="text/plain; version=0.0.4")
@@ -0,0 +1,242 @@
+"""
+Pagination par curseur et export en flux des listes volumineuses.
+
+Les listes d'achats et de rechargements peuvent compter des millions de lignes.
+Plutôt que de les charger entièrement en mémoire, elles sont :
+
+- soit découpées en pages par curseur (_keyset pagination_) :
+  chaque page est sélectionnée par la position (date, id)
+  de la dernière ligne de la page précédente, ce qui permet à PostgreSQL
+  de reprendre directement à cette position au lieu de parcourir
+  toutes les lignes précédentes comme le ferait un `OFFSET` ;
+- soit envoyées en flux, ligne par ligne, en parcourant la requête
+  avec un curseur côté serveur.
+
+Examples:
+    ```python
+    from buckutt.pagination import CursorParams, keyset_page
+
+    @route.get("", response=PurchasePageSchema)
+    def fetch(self, page: CursorParams = Query(...)):
+        return keyset_page(Purchase.objects.all(), page)
+    ```
+"""
+import base64
+import binascii
+from collections.abc import AsyncIterator, Iterable, Iterator, Sequence
+from datetime import datetime
+from itertools import islice
+from typing import Literal
+
+import orjson
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Q, QuerySet
+from django.http import HttpRequest, StreamingHttpResponse
+from ninja import Schema
+from pydantic import Field, validator
+
+STREAM_CHUNK_SIZE = 2000
+"""Nombre de lignes lues à chaque aller-retour du curseur côté serveur."""
+
+
+def encode_cursor(date: datetime, pk: int) -> str:
+    """
+    Encode la position (date, id) d'une ligne en un curseur opaque.
+    """
+    return base64.urlsafe_b64encode(orjson.dumps([date, pk])).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    """
+    Décode un curseur créé par [encode_cursor][buckutt.pagination.encode_cursor].
+
+    Raises:
+        ValueError: si le curseur est invalide
+    """
+    try:
+        date, pk = orjson.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(date), int(pk)
+    except (binascii.Error, orjson.JSONDecodeError, TypeError, ValueError) as e:
+        raise ValueError("Curseur invalide") from e
+
+
+class CursorParams(Schema):
+    """
+    Paramètres de pagination par curseur.
+
+    Attributes:
+        cursor (str | None): curseur retourné avec la page précédente
+            (aucun pour la première page)
+        limit (int): nombre maximal de lignes par page (entre 1 et 1000)
+    """
+
+    cursor: str | None = None
+    limit: int = Field(100, ge=1, le=1000)
+
+    @validator("cursor")
+    def check_cursor(cls, cursor: str | None) -> str | None:
+        if cursor is not None:
+            decode_cursor(cursor)
+        return cursor
+
+
+def keyset_page(queryset: QuerySet, params: CursorParams) -> dict:
+    """
+    Retourne une page du queryset, triée par date puis par id.
+
+    Args:
+        queryset: les lignes à paginer (avec des colonnes `date` et `id`)
+        params: les paramètres de pagination
+
+    Returns:
+        Un dictionnaire contenant les lignes de la page (`items`)
+        et le curseur de la page suivante (`next_cursor`),
+        `None` s'il s'agit de la dernière.
+    """
+    return _page(list(_page_queryset(queryset, params)), params)
+
+
+async def akeyset_page(queryset: QuerySet, params: CursorParams) -> dict:
+    """
+    Version asynchrone de [keyset_page][buckutt.pagination.keyset_page].
+    """
+    return _page([row async for row in _page_queryset(queryset, params)], params)
+
+
+def _page_queryset(queryset: QuerySet, params: CursorParams) -> QuerySet:
+    if params.cursor is not None:
+        date, pk = decode_cursor(params.cursor)
+        queryset = queryset.filter(Q(date__gt=date) | Q(date=date, pk__gt=pk))
+    # une ligne de plus pour savoir s'il existe une page suivante
+    return queryset.order_by("date", "pk")[: params.limit + 1]
+
+
+def _page(items: list, params: CursorParams) -> dict:
+    next_cursor = None
+    if len(items) > params.limit:
+        items = items[: params.limit]
+        next_cursor = encode_cursor(items[-1].date, items[-1].pk)
+    return {"items": items, "next_cursor": next_cursor}
+
+
+StreamFormat = Literal["ndjson", "json"]
+
+
+def _batches(rows: Iterable, size: int) -> Iterator[list]:
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+async def _abatches(rows: Iterator, size: int) -> AsyncIterator[list]:
+    # QuerySet.aiterator() de Django 4.2 exécute la requête d'un values_list()
+    # dans la boucle d'événements : chaque paquet est plutôt lu
+    # dans le thread synchrone, qui détient la connexion et le curseur
+    next_batch = sync_to_async(lambda: list(islice(rows, size)))
+    while batch := await next_batch():
+        yield batch
+
+
+def _encode(
+    batch: list[Sequence], fields: Sequence[str], fmt: StreamFormat, first: bool
+) -> bytes:
+    def dumps(row: Sequence) -> bytes:
+        # les montants (Decimal) sont sérialisés comme dans les schémas, en float
+        return orjson.dumps(dict(zip(fields, row, strict=True)), default=float)
+
+    if fmt == "ndjson":
+        return b"".join(dumps(row) + b"\n" for row in batch)
+    return (b"" if first else b",") + b",".join(dumps(row) for row in batch)
+
+
+def _stream(
+    rows: Iterable[Sequence], fields: Sequence[str], fmt: StreamFormat
+) -> Iterator[bytes]:
+    if fmt == "json":
+        yield b"["
+    for i, batch in enumerate(_batches(rows, STREAM_CHUNK_SIZE)):
+        yield _encode(batch, fields, fmt, first=i == 0)
+    if fmt == "json":
+        yield b"]"
+
+
+async def _astream(
+    rows: Iterator[Sequence], fields: Sequence[str], fmt: StreamFormat
+) -> AsyncIterator[bytes]:
+    if fmt == "json":
+        yield b"["
+    first = True
+    async for batch in _abatches(rows, STREAM_CHUNK_SIZE):
+        yield _encode(batch, fields, fmt, first)
+        first = False
+    if fmt == "json":
+        yield b"]"
+
+
+async def _aiterate(items: Iterable) -> AsyncIterator:
+    for item in items:
+        yield item
+
+
+def stream_content(
+    request: HttpRequest, content: Iterable, content_type: str
+) -> StreamingHttpResponse:
+    """
+    Envoie en flux un contenu produit sans accès à la base de données
+    (par exemple des lignes déjà calculées).
+
+    Sous ASGI, Django lit entièrement un itérateur synchrone avant de l'envoyer :
+    le contenu est donc parcouru par un générateur asynchrone,
+    envoyé morceau par morceau quel que soit le serveur.
+
+    Args:
+        request: la requête, pour savoir si elle est servie sous ASGI
+        content: les morceaux à envoyer (`str` ou `bytes`)
+        content_type: le type de la réponse
+    """
+    if isinstance(request, ASGIRequest):
+        content = _aiterate(content)
+    return StreamingHttpResponse(content, content_type=content_type)
+
+
+def stream_rows(
+    request: HttpRequest,
+    queryset: QuerySet,
+    fields: dict[str, str],
+    fmt: StreamFormat = "ndjson",
+) -> StreamingHttpResponse:
+    """
+    Envoie les lignes du queryset en flux, triées par date puis par id.
+
+    Les lignes sont lues par paquets avec un curseur côté serveur
+    et sérialisées au fur et à mesure, sans instancier de modèles :
+    la mémoire utilisée ne dépend pas du nombre de lignes.
+
+    Sous ASGI, Django lirait entièrement un itérateur synchrone
+    avant de l'envoyer : le contenu est alors un générateur asynchrone,
+    qui lit chaque paquet dans le thread synchrone.
+
+    Args:
+        request: la requête, pour savoir si elle est servie sous ASGI
+        queryset: les lignes à envoyer (avec des colonnes `date` et `id`)
+        fields: les colonnes à envoyer, indexées par nom dans la réponse
+        fmt: `ndjson` pour un objet JSON par ligne,
+            `json` pour une liste JSON
+
+    Examples:
+        ```python
+        stream_rows(request, Reload.objects.all(), {"id": "id", "amount": "amount"})
+        ```
+    """
+    rows = (
+        queryset.order_by("date", "pk")
+        .values_list(*fields.values())
+        .iterator(chunk_size=STREAM_CHUNK_SIZE)
+    )
+    stream = _astream if isinstance(request, ASGIRequest) else _stream
+    content = stream(rows, list(fields), fmt)
+    return StreamingHttpResponse(
+        content,
+        content_type="application/x-ndjson" if fmt == "ndjson" else "application/json",
+    )
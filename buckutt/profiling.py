@@ -0,0 +1,360 @@
+"""
+Profilage des requêtes SQL de chaque route.
+
+Le middleware [query_profile_middleware][buckutt.profiling.query_profile_middleware]
+compte, pour chaque requête HTTP, les requêtes SQL exécutées,
+leur durée totale et la durée de la sérialisation JSON de la réponse
+([ORJsonRenderer][buckutt.renderer.ORJsonRenderer]), puis les agrège par route
+([EndpointStats][buckutt.profiling.EndpointStats]).
+
+Les requêtes SQL sont comptées par un _execute wrapper_ installé
+sur chaque connexion à sa création ; il enregistre les requêtes dans le profil
+de la requête HTTP en cours, porté par une variable de contexte :
+les requêtes exécutées par une vue asynchrone dans un autre thread
+(`sync_to_async`) sont ainsi comptées dans la bonne requête HTTP.
+
+Deux signaux de régression sont surveillés :
+
+- une même requête SQL (au texte identique, hors paramètres) exécutée
+  au moins `QUERY_REPEAT_THRESHOLD` fois pendant une requête HTTP,
+  signe habituel d'un N+1, est signalée dans les logs ;
+- une route peut déclarer un budget de requêtes SQL
+  ([query_budget][buckutt.profiling.query_budget]) : un dépassement
+  est signalé dans les logs ou, si `QUERY_BUDGET_STRICT` est activé
+  (c'est le cas pendant les tests), lève
+  [QueryBudgetExceeded][buckutt.profiling.QueryBudgetExceeded].
+
+Si `QUERY_PROFILE_HEADERS` est activé, la réponse porte en outre
+un en-tête `Server-Timing` avec ces mesures.
+
+Les mesures de chaque requête HTTP sont aussi exposées par la route `/metrics`
+([buckutt.metrics][buckutt.metrics]), avec la durée des requêtes HTTP
+par route et par point de vente
+([set_selling_point][buckutt.profiling.set_selling_point]).
+"""
+import logging
+import threading
+import time
+from collections import Counter
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from functools import wraps
+from inspect import iscoroutinefunction
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpRequest, HttpResponse
+from django.utils.decorators import sync_and_async_middleware
+
+from buckutt import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """
+    Une route a exécuté plus de requêtes SQL que son budget.
+    """
+
+
+@dataclass
+class RequestProfile:
+    """
+    Mesures d'une requête HTTP.
+
+    Attributes:
+        queries (Counter[str]): nombre d'exécutions de chaque requête SQL,
+            indexé par texte de la requête (sans les paramètres),
+            hors points de sauvegarde
+        sql_time (float): durée totale des requêtes SQL, en secondes
+        render_time (float): durée de la sérialisation de la réponse, en secondes
+        budget (int | None): nombre maximal de requêtes SQL déclaré par la route
+        point_id (int | None): id du point de vente de la requête, s'il est connu
+    """
+
+    queries: Counter[str] = field(default_factory=Counter)
+    sql_time: float = 0
+    render_time: float = 0
+    budget: int | None = None
+    point_id: int | None = None
+
+    @property
+    def query_count(self) -> int:
+        """
+        Nombre total de requêtes SQL.
+        """
+        return self.queries.total()
+
+
+_current: ContextVar[RequestProfile | None] = ContextVar("profile", default=None)
+
+
+def current_profile() -> RequestProfile | None:
+    """
+    Retourne le profil de la requête HTTP en cours,
+    ou `None` en dehors d'une requête HTTP.
+    """
+    return _current.get()
+
+
+# les points de sauvegarde ne dépendent que de l'imbrication des transactions
+# (les blocs atomiques des tests en ajoutent) : ils ne sont pas comptés
+_SAVEPOINT_SQL = ("SAVEPOINT", "RELEASE SAVEPOINT", "ROLLBACK TO SAVEPOINT")
+
+
+def _record_query(execute, sql, params, many, context):
+    profile = _current.get()
+    if profile is None or sql.startswith(_SAVEPOINT_SQL):
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.sql_time += time.perf_counter() - start
+        profile.queries[sql] += 1
+
+
+@receiver(connection_created)
+def _install_wrapper(sender, connection, **kwargs):
+    # l'objet connexion est réutilisé d'une connexion à l'autre
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+@dataclass
+class EndpointTotals:
+    """
+    Totaux des mesures d'une route.
+
+    Attributes:
+        requests (int): nombre de requêtes HTTP
+        queries (int): nombre total de requêtes SQL
+        max_queries (int): nombre maximal de requêtes SQL d'une requête HTTP
+        sql_time (float): durée totale des requêtes SQL, en secondes
+        render_time (float): durée totale des sérialisations, en secondes
+        duration (float): durée totale des requêtes HTTP, en secondes
+    """
+
+    requests: int = 0
+    queries: int = 0
+    max_queries: int = 0
+    sql_time: float = 0
+    render_time: float = 0
+    duration: float = 0
+
+
+class EndpointStats:
+    """
+    Mesures agrégées par route, depuis le démarrage du processus.
+
+    Une route est identifiée par sa méthode HTTP et son motif d'URL
+    (par exemple `POST /api/purchase`).
+
+    Examples:
+        ```python
+        from buckutt.profiling import endpoint_stats
+
+        totals = endpoint_stats.snapshot()["POST /api/purchase"]
+        totals.queries / totals.requests  # requêtes SQL par achat
+        ```
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals: dict[str, EndpointTotals] = {}
+
+    def add(self, endpoint: str, profile: RequestProfile, duration: float) -> None:
+        """
+        Ajoute les mesures d'une requête HTTP aux totaux de sa route.
+        """
+        count = profile.query_count
+        with self._lock:
+            totals = self._totals.setdefault(endpoint, EndpointTotals())
+            totals.requests += 1
+            totals.queries += count
+            totals.max_queries = max(totals.max_queries, count)
+            totals.sql_time += profile.sql_time
+            totals.render_time += profile.render_time
+            totals.duration += duration
+
+    def snapshot(self) -> dict[str, EndpointTotals]:
+        """
+        Retourne une copie des totaux de chaque route.
+        """
+        with self._lock:
+            return {
+                endpoint: EndpointTotals(**vars(totals))
+                for endpoint, totals in self._totals.items()
+            }
+
+    def clear(self) -> None:
+        """
+        Remet les totaux à zéro.
+        """
+        with self._lock:
+            self._totals = {}
+
+
+endpoint_stats = EndpointStats()
+"""Mesures des routes partagées par tous les threads du processus."""
+
+
+def query_budget(limit: int) -> Callable:
+    """
+    Déclare le nombre maximal de requêtes SQL d'une route,
+    authentification et sérialisation comprises.
+
+    Le budget est vérifié par le middleware à la fin de la requête HTTP.
+
+    Args:
+        limit: le nombre maximal de requêtes SQL
+
+    Examples:
+        ```python
+        @route.post("")
+        @query_budget(6)
+        def create(self, body: PurchaseRequest):
+            ...
+        ```
+    """
+
+    def set_budget() -> None:
+        profile = _current.get()
+        if profile is not None:
+            profile.budget = limit
+
+    def decorator(func: Callable) -> Callable:
+        if iscoroutinefunction(func):
+
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                set_budget()
+                return await func(*args, **kwargs)
+
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            set_budget()
+            return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def set_selling_point(point_id: int) -> None:
+    """
+    Associe la requête HTTP en cours au point de vente donné,
+    pour mesurer la durée des requêtes HTTP par point de vente.
+
+    Chaque id crée une série de métriques : la fonction ne doit être appelée
+    qu'une fois le point de vente connu pour exister,
+    et non avec un paramètre de la requête encore non vérifié.
+    """
+    profile = _current.get()
+    if profile is not None:
+        profile.point_id = point_id
+
+
+@contextmanager
+def render_timer() -> Iterator[None]:
+    """
+    Compte la durée du bloc dans la durée de sérialisation
+    de la requête HTTP en cours.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile = _current.get()
+        if profile is not None:
+            profile.render_time += time.perf_counter() - start
+
+
+def _route(request: HttpRequest) -> str:
+    match = request.resolver_match
+    return f"/{match.route}" if match is not None else "<non résolue>"
+
+
+def _check(endpoint: str, profile: RequestProfile) -> None:
+    threshold = settings.QUERY_REPEAT_THRESHOLD
+    for sql, count in profile.queries.items():
+        if count >= threshold:
+            logger.warning(
+                "%s : requête exécutée %d fois (N+1 ?) : %s", endpoint, count, sql
+            )
+    count = profile.query_count
+    if profile.budget is not None and count > profile.budget:
+        message = (
+            f"{endpoint} : {count} requêtes SQL pour un budget de {profile.budget}"
+        )
+        if settings.QUERY_BUDGET_STRICT:
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
+
+
+def _observe(
+    method: str, route: str, status: int, profile: RequestProfile, duration: float
+) -> None:
+    point = "" if profile.point_id is None else profile.point_id
+    metrics.http_request_duration.observe(
+        duration, method=method, route=route, point=point
+    )
+    metrics.http_responses.inc(method=method, route=route, status=status)
+    metrics.http_db_queries.inc(profile.query_count, method=method, route=route)
+    metrics.http_db_duration.inc(profile.sql_time, method=method, route=route)
+    metrics.http_render_duration.inc(profile.render_time, method=method, route=route)
+
+
+def _finish(
+    request: HttpRequest, response: HttpResponse, profile: RequestProfile, start: float
+) -> HttpResponse:
+    duration = time.perf_counter() - start
+    method, route = request.method, _route(request)
+    endpoint = f"{method} {route}"
+    endpoint_stats.add(endpoint, profile, duration)
+    _observe(method, route, response.status_code, profile, duration)
+    if settings.QUERY_PROFILE_HEADERS:
+        response["Server-Timing"] = (
+            f'db;dur={profile.sql_time * 1000:.2f};desc="{profile.query_count}", '
+            f"render;dur={profile.render_time * 1000:.2f}, "
+            f"total;dur={duration * 1000:.2f}"
+        )
+    _check(endpoint, profile)
+    return response
+
+
+@sync_and_async_middleware
+def query_profile_middleware(get_response: Callable) -> Callable:
+    """
+    Middleware mesurant les requêtes SQL et la sérialisation de chaque requête HTTP.
+    """
+    if iscoroutinefunction(get_response):
+
+        async def async_middleware(request: HttpRequest) -> HttpResponse:
+            profile = RequestProfile()
+            token = _current.set(profile)
+            start = time.perf_counter()
+            try:
+                response = await get_response(request)
+            finally:
+                _current.reset(token)
+            return _finish(request, response, profile, start)
+
+        return async_middleware
+
+    def middleware(request: HttpRequest) -> HttpResponse:
+        profile = RequestProfile()
+        token = _current.set(profile)
+        start = time.perf_counter()
+        try:
+            response = get_response(request)
+        finally:
+            _current.reset(token)
+        return _finish(request, response, profile, start)
+
+    return middleware
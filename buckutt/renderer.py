@@ -1,9 +1,12 @@
 import orjson
 from ninja.renderers import BaseRenderer
 
+from buckutt.profiling import render_timer
+
 
 class ORJsonRenderer(BaseRenderer):
     media_type = "application/json"
 
     def render(self, request, data, *, response_status: int):
-        return orjson.dumps(data)
+        with render_timer():
+            return orjson.dumps(data)
@@ -51,6 +51,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "buckutt.profiling.query_profile_middleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -86,14 +87,53 @@ WSGI_APPLICATION = "buckutt.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+
+def _env_flag(name: str, default: bool) -> bool:
+    return os.environ.get(name, str(default)).lower() in ("1", "true", "yes")
+
+
+# Les connexions persistantes évitent d'ouvrir une connexion à chaque requête.
+# Elles sont à activer en production (DB_CONN_MAX_AGE, en secondes) :
+# le serveur de développement crée un thread par requête, donc une connexion par requête.
+# Avec DB_SERVER_SIDE_BINDING, les paramètres sont envoyés séparément des requêtes,
+# et une requête exécutée DB_PREPARE_THRESHOLD fois sur une même connexion
+# est préparée : PostgreSQL ne l'analyse plus et peut réutiliser son plan.
+# Incompatible avec un pgbouncer en mode transaction.
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.postgresql",
         "NAME": os.environ["DB_NAME"],
         "PORT": "5432",
+        "CONN_MAX_AGE": int(os.environ.get("DB_CONN_MAX_AGE", 0)),
+        "CONN_HEALTH_CHECKS": _env_flag("DB_CONN_HEALTH_CHECKS", True),
+        "OPTIONS": {
+            "server_side_binding": _env_flag("DB_SERVER_SIDE_BINDING", False),
+            "prepare_threshold": int(os.environ.get("DB_PREPARE_THRESHOLD", 5)),
+        },
     }
 }
 
+# Cache partagé par tous les processus, où sont stockés les jetons de version
+# des caches en mémoire (voir buckutt.versions) : un cache propre à chaque processus
+# (LocMemCache) ne convient qu'avec un seul processus.
+# Par défaut, le cache est une table de la base de données
+# (à créer avec ./manage.py createcachetable) ; en production,
+# préférez Redis (CACHE_BACKEND=django.core.cache.backends.redis.RedisCache,
+# CACHE_LOCATION=redis://...) ou Memcached.
+CACHES = {
+    "default": {
+        "BACKEND": os.environ.get(
+            "CACHE_BACKEND", "django.core.cache.backends.db.DatabaseCache"
+        ),
+        "LOCATION": os.environ.get("CACHE_LOCATION", "buckutt_cache"),
+    }
+}
+
+# Durée en secondes pendant laquelle un processus réutilise les jetons de version
+# qu'il a lus, sans interroger le cache partagé : c'est le délai maximal
+# avant qu'une modification effectuée par un autre processus soit prise en compte.
+VERSION_CHECK_INTERVAL = float(os.environ.get("VERSION_CHECK_INTERVAL", 1))
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -136,3 +176,43 @@ STATIC_URL = "static/"
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 AUTH_USER_MODEL = "users.User"
+
+# Pricing
+# Si True, les prix des articles sont résolus à partir d'une matrice
+# chargée en mémoire par chaque processus (voir article.pricing),
+# plutôt que par une requête SQL à chaque vente.
+
+PRICE_MATRIX_ENABLED = True
+
+# Durée de vie maximale (en secondes) des instantanés du catalogue
+# (voir article.catalogue), au cas où une invalidation serait perdue.
+
+CATALOGUE_SNAPSHOT_TTL = 60
+
+# Cartes
+# Nombre d'utilisateurs conservés en mémoire par chaque processus
+# pour résoudre leur carte sans requête (voir users.cards).
+
+CARD_CACHE_SIZE = 10_000
+
+# Appareils
+# Durée de validité en secondes des jetons des appareils de vente
+# (voir selling_points.devices).
+
+DEVICE_TOKEN_MAX_AGE = 12 * 60 * 60
+
+# Profilage
+# Nombre d'exécutions d'une même requête SQL signalé comme un N+1 probable,
+# dépassement d'un budget de requêtes fatal (activé pendant les tests)
+# et envoi des mesures dans l'en-tête Server-Timing des réponses
+# (voir buckutt.profiling).
+
+QUERY_REPEAT_THRESHOLD = 5
+QUERY_BUDGET_STRICT = False
+QUERY_PROFILE_HEADERS = DEBUG
+
+# Métriques
+# Jeton exigé (en-tête « Authorization: Bearer <jeton> ») par la route /metrics ;
+# sans jeton, la route est ouverte (voir buckutt.metrics).
+
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
@@ -1,9 +1,31 @@
+from io import StringIO
+
+from django.conf import settings
 from django.core.management import call_command
+from django.test import override_settings
 from django.test.runner import DiscoverRunner
 
+# les tests s'exécutent dans un seul processus : un cache en mémoire suffit,
+# et ses lectures ne s'ajoutent pas aux requêtes SQL comptées par les budgets
+_LOCAL_CACHES = override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+
 
 class BuckuttTestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        _LOCAL_CACHES.enable()
+        # un dépassement de budget de requêtes fait échouer le test
+        settings.QUERY_BUDGET_STRICT = True
+
+    def teardown_test_environment(self, **kwargs):
+        _LOCAL_CACHES.disable()
+        super().teardown_test_environment(**kwargs)
+
     def setup_databases(self, **kwargs):
         res = super().setup_databases(**kwargs)
         call_command("loaddata", "fixtures.json")
+        # les fixtures modifient le crédit sans passer par le compteur
+        call_command("reconcile_credit_counter", "--fix", stdout=StringIO())
         return res
@@ -0,0 +1,162 @@
+import threading
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+
+from buckutt import metrics
+from buckutt.profiling import (
+    QueryBudgetExceeded,
+    endpoint_stats,
+    query_budget,
+    query_profile_middleware,
+)
+from buckutt.versions import bump_version, clear_versions, get_version
+from selling_points.models import SellingPoint
+from users.models import User
+
+
+def sample(metric: metrics.Metric, name: str, **labels) -> float:
+    """
+    Retourne la valeur d'un échantillon d'une métrique (0 s'il n'existe pas).
+    """
+    return next((v for n, lab, v in metric.samples() if n == name and lab == labels), 0)
+
+
+def _count_users(times: int):
+    def view(request):
+        for _ in range(times):
+            User.objects.count()
+        return HttpResponse()
+
+    return view
+
+
+class QueryProfileTestCase(TestCase):
+    def setUp(self):
+        endpoint_stats.clear()
+
+    def test_budget_exceeded(self):
+        """
+        Test qu'une route dépassant son budget de requêtes fait échouer le test.
+        """
+        request = RequestFactory().get("/")
+        query_profile_middleware(query_budget(1)(_count_users(1)))(request)
+        with self.assertRaises(QueryBudgetExceeded):
+            query_profile_middleware(query_budget(1)(_count_users(2)))(request)
+
+    def test_repeated_query_logged(self):
+        """
+        Test qu'une requête SQL répétée pendant une requête HTTP est signalée.
+        """
+        request = RequestFactory().get("/")
+        with self.assertLogs("buckutt.profiling", "WARNING") as logs:
+            query_profile_middleware(_count_users(5))(request)
+        self.assertIn("5 fois", logs.output[0])
+
+    @override_settings(QUERY_PROFILE_HEADERS=True)
+    async def test_async_route_measured(self):
+        """
+        Test que les requêtes SQL d'une route asynchrone, exécutées
+        dans un autre thread, sont comptées dans les mesures de la route.
+        """
+        res = await self.async_client.get("/api/treasury/global-credit")
+        self.assertIn("db;dur=", res["Server-Timing"])
+        self.assertIn('desc="1"', res["Server-Timing"])
+        totals = endpoint_stats.snapshot()["GET /api/treasury/global-credit"]
+        self.assertEqual((totals.requests, totals.queries), (1, 1))
+        self.assertGreater(totals.render_time, 0)
+
+
+class MetricsTestCase(TestCase):
+    def test_histogram_buckets(self):
+        """
+        Test que les intervalles d'un histogramme sont cumulés à la lecture,
+        quel que soit le thread ayant fait les observations.
+        """
+        histogram = metrics.Histogram("test_seconds", "Test", ["point"], (0.1, 1))
+        metrics.REGISTRY.remove(histogram)
+        histogram.observe(0.05, point=1)
+        thread = threading.Thread(
+            target=histogram.observe, args=(0.5,), kwargs={"point": 1}
+        )
+        thread.start()
+        thread.join()
+        histogram.observe(3, point=1)
+        buckets = [
+            (labels["le"], value)
+            for name, labels, value in histogram.samples()
+            if name == "test_seconds_bucket"
+        ]
+        self.assertEqual(buckets, [("0.1", 1), ("1", 2), ("+Inf", 3)])
+        self.assertEqual(sample(histogram, "test_seconds_sum", point="1"), 3.55)
+
+    def test_latency_per_selling_point(self):
+        """
+        Test que la durée des requêtes HTTP est mesurée par point de vente.
+        """
+        point = SellingPoint.objects.create(name="Bar")
+        user = User.objects.create(username="client", pin="0")
+        labels = {
+            "method": "GET",
+            "route": "/api/article/available-articles",
+            "point": str(point.pk),
+        }
+        name = "buckutt_http_request_duration_seconds_count"
+        before = sample(metrics.http_request_duration, name, **labels)
+        res = self.client.get(
+            "/api/article/available-articles",
+            {"selling_point_id": point.pk, "user_id": user.pk},
+        )
+        self.assertEqual(res.status_code, 200)
+        after = sample(metrics.http_request_duration, name, **labels)
+        self.assertEqual(after - before, 1)
+
+    def test_unknown_selling_point(self):
+        """
+        Test qu'un id de point de vente inexistant ne crée pas de série.
+        """
+        user = User.objects.create(username="client", pin="0")
+        res = self.client.get(
+            "/api/article/available-articles",
+            {"selling_point_id": 999_999, "user_id": user.pk},
+        )
+        self.assertEqual(res.status_code, 404)
+        points = {
+            labels["point"] for _, labels, _ in metrics.http_request_duration.samples()
+        }
+        self.assertNotIn("999999", points)
+
+    @override_settings(METRICS_TOKEN="secret")
+    def test_metrics_view(self):
+        """
+        Test que la route /metrics exige le jeton configuré
+        et retourne les métriques au format texte de Prometheus.
+        """
+        self.assertEqual(self.client.get("/metrics").status_code, 401)
+        res = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer secret")
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res["Content-Type"].startswith("text/plain"))
+        body = res.content.decode()
+        self.assertIn("# TYPE buckutt_http_request_duration_seconds histogram", body)
+        self.assertIn('buckutt_http_responses_total{method="GET"', body)
+
+
+@override_settings(VERSION_CHECK_INTERVAL=60)
+class VersionsTestCase(TestCase):
+    def setUp(self):
+        clear_versions()
+
+    def test_shared_version_read_after_interval(self):
+        """
+        Test qu'un jeton modifié par un autre processus dans le cache partagé
+        est relu une fois le délai écoulé, et qu'un jeton modifié
+        par le processus lui-même est pris en compte immédiatement.
+        """
+        version = get_version("test-version")
+        cache.set("test-version", "autre processus")
+        self.assertEqual(get_version("test-version"), version)
+        with override_settings(VERSION_CHECK_INTERVAL=0):
+            self.assertEqual(get_version("test-version"), "autre processus")
+        bump_version("test-version")
+        self.assertNotIn(get_version("test-version"), (version, "autre processus"))
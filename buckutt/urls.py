@@ -18,9 +18,14 @@ from django.contrib import admin
 from django.urls import path
 from ninja_extra import NinjaExtraAPI
 
+from buckutt.metrics import metrics_view
 from buckutt.renderer import ORJsonRenderer
 
 api = NinjaExtraAPI(version="0.0.1", renderer=ORJsonRenderer())
 api.auto_discover_controllers()
 
-urlpatterns = [path("admin/", admin.site.urls), path("api/", api.urls)]
+urlpatterns = [
+    path("admin/", admin.site.urls),
+    path("api/", api.urls),
+    path("metrics", metrics_view),
+]
@@ -0,0 +1,94 @@
+"""
+Jetons de version partagés entre les processus.
+
+Les caches en mémoire du projet (matrice des prix, catalogue...)
+sont propres à chaque processus. Pour que la modification d'une donnée
+effectuée par un processus soit prise en compte par tous les autres,
+chaque cache est associé à un jeton de version stocké dans le cache de Django :
+un processus dont le jeton local diffère du jeton partagé recharge son cache.
+
+Le cache de Django doit donc être partagé par tous les processus
+(voir `CACHE_BACKEND` dans `buckutt.settings`) : avec un cache propre
+à chaque processus (`LocMemCache`), une modification n'invaliderait
+que les caches du processus qui l'a effectuée.
+
+Pour ne pas interroger le cache partagé à chaque lecture,
+chaque processus conserve les jetons qu'il a lus pendant
+`VERSION_CHECK_INTERVAL` secondes : une modification effectuée
+par un autre processus est prise en compte au plus tard après ce délai,
+une modification effectuée par le processus lui-même l'est immédiatement.
+"""
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+_local: dict[str, tuple[str, float]] = {}
+"""Derniers jetons lus par ce processus, avec l'instant de leur lecture."""
+
+
+def _recent(key: str) -> str | None:
+    version, read_at = _local.get(key, (None, 0))
+    if time.monotonic() - read_at < settings.VERSION_CHECK_INTERVAL:
+        return version
+    return None
+
+
+def _remember(key: str, version: str) -> str:
+    _local[key] = (version, time.monotonic())
+    return version
+
+
+def get_version(key: str) -> str:
+    """
+    Retourne le jeton de version associé à la clef donnée.
+
+    Un nouveau jeton est créé si aucun n'existe encore
+    (ou s'il a été évincé du cache).
+
+    Args:
+        key: la clef du jeton dans le cache
+    """
+    if (version := _recent(key)) is not None:
+        return version
+    version = cache.get(key)
+    if version is None:
+        version = cache.get_or_set(key, uuid.uuid4().hex, timeout=None)
+    return _remember(key, version)
+
+
+async def aget_version(key: str) -> str:
+    """
+    Version asynchrone de [get_version][buckutt.versions.get_version].
+
+    Args:
+        key: la clef du jeton dans le cache
+    """
+    if (version := _recent(key)) is not None:
+        return version
+    version = await cache.aget(key)
+    if version is None:
+        version = await cache.aget_or_set(key, uuid.uuid4().hex, timeout=None)
+    return _remember(key, version)
+
+
+def bump_version(key: str) -> None:
+    """
+    Remplace le jeton de version associé à la clef donnée,
+    invalidant ainsi les caches qui en dépendent dans tous les processus.
+
+    Args:
+        key: la clef du jeton dans le cache
+    """
+    version = uuid.uuid4().hex
+    cache.set(key, version, timeout=None)
+    _remember(key, version)
+
+
+def clear_versions() -> None:
+    """
+    Oublie les jetons lus par ce processus :
+    les prochaines lectures interrogent le cache partagé.
+    """
+    _local.clear()
@@ -0,0 +1,33 @@
+from django.shortcuts import get_object_or_404
+from ninja_extra.controllers import ControllerBase, api_controller, route
+
+from buckutt.types import PrimaryKey
+from selling_points.devices import SellerSessionAuth, issue_token
+from selling_points.models import Device
+from selling_points.schemas import DeviceTokenSchema
+
+
+@api_controller("/device")
+class DeviceController(ControllerBase):
+    """
+    Contrôleur pour les appareils de vente.
+    """
+
+    @route.post(
+        "/{device_id}/token", response=DeviceTokenSchema, auth=SellerSessionAuth()
+    )
+    def create_token(self, device_id: PrimaryKey):
+        """
+        Crée le jeton d'un appareil pour le vendeur connecté.
+
+        Les requêtes de vente envoyées par l'appareil avec ce jeton
+        sont authentifiées sans lire la session ni le point de vente
+        dans la base de données (voir [selling_points.devices][]).
+
+        Args:
+            device_id: l'id de l'appareil
+        """
+        device = get_object_or_404(
+            Device, pk=device_id, is_removed=False, selling_point__is_removed=False
+        )
+        return {"token": issue_token(device, self.context.request.user.pk)}
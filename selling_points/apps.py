@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class SellingPointsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "selling_points"
+
+    def ready(self):
+        from selling_points import signals  # noqa: F401
@@ -0,0 +1,205 @@
+"""
+Authentification des appareils de vente par jeton signé.
+
+Un appareil ([Device][selling_points.models.Device]) reçoit, lorsqu'un vendeur
+s'y connecte, un jeton signé (`django.core.signing`) contenant l'id de l'appareil,
+celui de son point de vente et celui du vendeur.
+Les requêtes de l'appareil portent ce jeton dans l'en-tête
+`Authorization: Bearer <jeton>` : le vendeur et le point de vente sont lus
+dans le jeton, sans lire la session ni le point de vente dans la base de données.
+
+Un jeton expire après `DEVICE_TOKEN_MAX_AGE` secondes.
+Il est en outre refusé dès que son appareil est supprimé
+ou change de point de vente, ou que son vendeur est désactivé ou supprimé :
+chaque processus conserve la liste des appareils actifs et l'état des vendeurs
+dont il a vu un jeton ([DeviceRegistry][selling_points.devices.DeviceRegistry]),
+versionnés de la même manière que la matrice des prix
+([PriceMatrix][article.pricing.PriceMatrix]) et rechargés
+à chaque modification d'un appareil ou d'un point de vente,
+à chaque désactivation ou suppression d'un utilisateur
+(voir `selling_points.signals`), dans tous les processus
+au plus tard après `VERSION_CHECK_INTERVAL` secondes.
+
+Examples:
+    ```python
+    @route.post("", auth=[DeviceAuth(), SellerSessionAuth()])
+    def create(self, body: PurchaseRequest):
+        auth = self.context.request.auth
+        if isinstance(auth, DeviceSession):
+            ...  # auth.seller_id, auth.point_id
+    ```
+"""
+import threading
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core import signing
+from django.http import HttpRequest
+from ninja.security import HttpBearer
+from ninja.security.base import AuthBase
+from ninja.utils import check_csrf
+
+from buckutt.types import PrimaryKey
+from buckutt.versions import bump_version, get_version
+from selling_points.models import Device
+from users.models import User
+
+DEVICES_VERSION_KEY = "selling_points:devices:version"
+
+_SALT = "selling_points.device"
+
+
+def invalidate_devices() -> None:
+    """
+    Invalide la liste des appareils actifs de tous les processus.
+    """
+    bump_version(DEVICES_VERSION_KEY)
+
+
+class DeviceSession(NamedTuple):
+    """
+    Contenu d'un jeton d'appareil.
+
+    Attributes:
+        device_id (PrimaryKey): id de l'appareil
+        point_id (PrimaryKey): id du point de vente de l'appareil
+        seller_id (PrimaryKey): id du vendeur connecté sur l'appareil
+    """
+
+    device_id: PrimaryKey
+    point_id: PrimaryKey
+    seller_id: PrimaryKey
+
+
+class DeviceRegistry:
+    """
+    Point de vente de chaque appareil actif, indexé par id d'appareil,
+    et état des vendeurs des jetons déjà vus, indexé par id d'utilisateur.
+
+    L'état d'un vendeur n'est lu qu'à la première utilisation de l'un
+    de ses jetons depuis la dernière invalidation :
+    seuls les vendeurs utilisant un appareil sont conservés.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version: str | None = None
+        self._points: dict[int, int] = {}
+        self._sellers: dict[int, bool] = {}
+
+    def _check_version(self) -> None:
+        version = get_version(DEVICES_VERSION_KEY)
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    devices = Device.objects.filter(
+                        is_removed=False, selling_point__is_removed=False
+                    )
+                    self._points = dict(devices.values_list("id", "selling_point_id"))
+                    self._sellers = {}
+                    self._version = version
+
+    def _is_enabled(self, seller_id: PrimaryKey) -> bool:
+        enabled = self._sellers.get(seller_id)
+        if enabled is None:
+            version = self._version
+            # un vendeur supprimé de la base de données est refusé
+            enabled = User.objects.filter(
+                pk=seller_id, is_active=True, is_removed=False
+            ).exists()
+            with self._lock:
+                # l'état lu peut être antérieur à une invalidation plus récente
+                if version == self._version:
+                    self._sellers[seller_id] = enabled
+        return enabled
+
+    def point_of(self, device_id: PrimaryKey) -> int | None:
+        """
+        Retourne l'id du point de vente de l'appareil,
+        ou `None` si l'appareil n'est pas actif.
+        """
+        self._check_version()
+        return self._points.get(device_id)
+
+    def is_valid(self, session: DeviceSession) -> bool:
+        """
+        Indique si l'appareil du jeton est actif dans le point de vente du jeton
+        et si le vendeur du jeton n'est ni désactivé ni supprimé.
+        """
+        self._check_version()
+        if self._points.get(session.device_id) != session.point_id:
+            return False
+        return self._is_enabled(session.seller_id)
+
+    def clear(self) -> None:
+        """
+        Vide la liste des appareils de ce processus.
+        """
+        with self._lock:
+            self._version = None
+            self._points = {}
+            self._sellers = {}
+
+
+device_registry = DeviceRegistry()
+"""Appareils actifs partagés par tous les threads du processus."""
+
+
+def issue_token(device: Device, seller_id: PrimaryKey) -> str:
+    """
+    Crée le jeton d'un appareil pour le vendeur donné.
+    """
+    return signing.dumps([device.pk, device.selling_point_id, seller_id], salt=_SALT)
+
+
+def read_token(token: str) -> DeviceSession | None:
+    """
+    Vérifie un jeton d'appareil et retourne son contenu,
+    ou `None` s'il est invalide, expiré, si son appareil n'est plus actif
+    dans le même point de vente ou si son vendeur est désactivé ou supprimé.
+    """
+    try:
+        session = DeviceSession(
+            *signing.loads(token, salt=_SALT, max_age=settings.DEVICE_TOKEN_MAX_AGE)
+        )
+    except (signing.BadSignature, TypeError, ValueError):
+        return None
+    if not device_registry.is_valid(session):
+        return None
+    return session
+
+
+class SellerSessionAuth(AuthBase):
+    """
+    Authentification des requêtes par la session Django du vendeur,
+    pour les clients sans jeton d'appareil.
+
+    Contrairement à `ninja.security.django_auth`, elle peut être utilisée
+    sans activer la vérification CSRF pour toute l'API (ce qui la rendrait
+    obligatoire pour les requêtes authentifiées par jeton) :
+    le jeton CSRF n'est vérifié que pour les requêtes authentifiées par session.
+    """
+
+    openapi_type = "apiKey"
+    openapi_in = "cookie"
+    openapi_name = settings.SESSION_COOKIE_NAME
+
+    def __call__(self, request: HttpRequest) -> User | None:
+        # un utilisateur désactivé n'a pas de session (voir ModelBackend)
+        if not request.user.is_authenticated or request.user.is_removed:
+            return None
+        if check_csrf(request, self.__call__) is not None:
+            return None
+        return request.user
+
+
+class DeviceAuth(HttpBearer):
+    """
+    Authentification des requêtes par jeton d'appareil.
+
+    En cas de succès, `request.auth` est la
+    [DeviceSession][selling_points.devices.DeviceSession] du jeton.
+    """
+
+    def authenticate(self, request: HttpRequest, token: str) -> DeviceSession | None:
+        return read_token(token)
@@ -1,4 +1,4 @@
-from ninja import ModelSchema
+from ninja import ModelSchema, Schema
 
 from selling_points.models import SellingPoint
 
@@ -16,3 +16,15 @@ class SimplePointSchema(ModelSchema):
             "id",
             "name",
         ]
+
+
+class DeviceTokenSchema(Schema):
+    """
+    Schéma de sérialisation du jeton d'un appareil
+    (voir [selling_points.devices][]).
+
+    Attributes:
+        token (str): jeton à envoyer dans l'en-tête `Authorization: Bearer <jeton>`
+    """
+
+    token: str
@@ -0,0 +1,52 @@
+"""
+Signaux de l'application `selling_points`.
+
+Toute modification d'un appareil ou d'un point de vente,
+et toute désactivation, réactivation ou suppression d'un utilisateur
+invalident la liste des appareils actifs et l'état des vendeurs
+([DeviceRegistry][selling_points.devices.DeviceRegistry]) ;
+les autres modifications des utilisateurs ne l'invalident pas.
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from selling_points.devices import invalidate_devices
+from selling_points.models import Device, SellingPoint
+from users.models import User
+
+
+@receiver(post_save, sender=Device)
+@receiver(post_delete, sender=Device)
+@receiver(post_save, sender=SellingPoint)
+@receiver(post_delete, sender=SellingPoint)
+def on_device_change(**kwargs):
+    # voir article.signals
+    invalidate_devices()
+    transaction.on_commit(invalidate_devices)
+
+
+_ACCESS_FIELDS = ("is_active", "is_removed")
+
+
+@receiver(pre_save, sender=User)
+def on_seller_save(instance: User, update_fields=None, **kwargs):
+    instance._access_changed = False
+    # un nouvel utilisateur n'a pas encore de jeton
+    if instance._state.adding or (
+        update_fields is not None and not set(_ACCESS_FIELDS) & set(update_fields)
+    ):
+        return
+    saved = User.objects.filter(pk=instance.pk).values_list(*_ACCESS_FIELDS).first()
+    instance._access_changed = saved != (instance.is_active, instance.is_removed)
+
+
+@receiver(post_save, sender=User)
+def on_seller_saved(instance: User, **kwargs):
+    if getattr(instance, "_access_changed", False):
+        on_device_change()
+
+
+@receiver(post_delete, sender=User)
+def on_seller_delete(**kwargs):
+    on_device_change()
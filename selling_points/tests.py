@@ -1 +1,124 @@
-# Create your tests here.
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from selling_points.devices import device_registry, read_token
+from selling_points.models import Device, SellingPoint
+from transaction.models import Purchase
+from transaction.tests.test_cart import SaleTestCase
+from users.models import User
+
+
+class DeviceTokenTestCase(SaleTestCase):
+    amount = "2.00"
+    credit = 10
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.device = Device.objects.create(name="Caisse 1", selling_point=cls.point)
+
+    def setUp(self):
+        super().setUp()
+        device_registry.clear()
+
+    def token(self, seller: User | None = None) -> str:
+        self.client.force_login(seller or self.seller)
+        res = self.client.post(f"/api/device/{self.device.pk}/token")
+        self.assertEqual(res.status_code, 200)
+        self.client.logout()
+        return res.json()["token"]
+
+    def purchase(self, token: str, point: SellingPoint | None = None):
+        return self.client.post(
+            "/api/purchase",
+            {
+                "buyer_id": self.customer.pk,
+                "selling_point_id": (point or self.point).pk,
+                "articles": [self.price.article_id],
+            },
+            content_type="application/json",
+            HTTP_AUTHORIZATION=f"Bearer {token}",
+        )
+
+    def test_purchase_with_token(self):
+        """
+        Test qu'un achat authentifié par jeton ne lit
+        ni la session ni le point de vente.
+        """
+        token = self.token()
+        self.assertEqual(self.purchase(token).status_code, 200)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.purchase(token).status_code, 200)
+        tables = " ".join(query["sql"] for query in queries)
+        self.assertNotIn("django_session", tables)
+        self.assertNotIn("selling_points_sellingpoint", tables)
+        purchase = Purchase.objects.filter(buyer=self.customer).last()
+        self.assertEqual((purchase.seller, purchase.point), (self.seller, self.point))
+
+    def test_rejected_tokens(self):
+        """
+        Test qu'un jeton modifié, utilisé pour un autre point de vente
+        ou dont l'appareil est supprimé est refusé.
+        """
+        token = self.token()
+        self.assertEqual(self.purchase(token + "x").status_code, 401)
+        other = SellingPoint.objects.create(name="Autre")
+        self.assertEqual(self.purchase(token, point=other).status_code, 403)
+        self.device.is_removed = True
+        self.device.save()
+        self.assertEqual(self.purchase(token).status_code, 401)
+        self.assertFalse(Purchase.objects.filter(buyer=self.customer).exists())
+
+    def test_batch_with_token(self):
+        """
+        Test que les achats d'un lot pour un autre point de vente que celui
+        de l'appareil sont refusés comme un achat seul.
+        """
+        token = self.token()
+        other = SellingPoint.objects.create(name="Autre")
+        purchase = {"buyer_id": self.customer.pk, "articles": [self.price.article_id]}
+        res = self.client.post(
+            "/api/purchase/batch",
+            [
+                {**purchase, "selling_point_id": self.point.pk},
+                {**purchase, "selling_point_id": other.pk},
+            ],
+            content_type="application/json",
+            HTTP_AUTHORIZATION=f"Bearer {token}",
+        )
+        self.assertEqual([r["status"] for r in res.json()], [200, 403])
+        self.assertEqual(Purchase.objects.filter(buyer=self.customer).count(), 1)
+
+    def test_disabled_seller(self):
+        """
+        Test que le jeton d'un vendeur désactivé ou supprimé est refusé.
+        """
+        token = self.token()
+        self.assertEqual(self.purchase(token).status_code, 200)
+        self.seller.is_active = False
+        self.seller.save()
+        self.assertEqual(self.purchase(token).status_code, 401)
+        self.seller.is_active = True
+        self.seller.save()
+        self.assertEqual(self.purchase(token).status_code, 200)
+        self.seller.is_removed = True
+        self.seller.save()
+        self.assertEqual(self.purchase(token).status_code, 401)
+
+    def test_deleted_seller(self):
+        """
+        Test que le jeton d'un vendeur supprimé de la base de données est refusé
+        et que seules les modifications de l'accès d'un vendeur
+        invalident les appareils.
+        """
+        seller = User.objects.create(username="remplaçant", pin="0")
+        token = self.token(seller)
+        self.assertEqual(self.purchase(token).status_code, 200)
+        Purchase.objects.filter(seller=seller).delete()
+        seller.first_name = "Remplaçant"
+        seller.save()
+        with CaptureQueriesContext(connection) as queries:
+            device_registry.is_valid(read_token(token))
+        self.assertEqual(len(queries), 0)
+        seller.delete()
+        self.assertEqual(self.purchase(token).status_code, 401)
@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import Purchase, Reload
+from .models import IdempotencyKey, LedgerCheckpoint, LedgerEntry, Purchase, Reload
 
 
 @admin.register(Purchase)
@@ -15,3 +15,29 @@ class ReloadAdmin(admin.ModelAdmin):
     list_display = ("buyer", "amount", "date")
     list_filter = ("date",)
     search_fields = ("buyer__username", "buyer__nickname")
+
+
+@admin.register(IdempotencyKey)
+class IdempotencyKeyAdmin(admin.ModelAdmin):
+    list_display = ("scope", "key", "date")
+    list_filter = ("scope", "date")
+    search_fields = ("key",)
+
+
+@admin.register(LedgerEntry)
+class LedgerEntryAdmin(admin.ModelAdmin):
+    list_display = ("user", "kind", "amount", "balance", "date")
+    list_filter = ("kind", "date")
+    search_fields = ("user__username", "user__nickname")
+
+    # le registre est en ajout seul
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(LedgerCheckpoint)
+class LedgerCheckpointAdmin(admin.ModelAdmin):
+    list_display = ("date", "last_entry", "last_purchase", "last_reload", "errors")
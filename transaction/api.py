@@ -1,28 +1,95 @@
-from django.db import transaction
-from django.db.models import Count, F, Sum
-from django.http import Http404
+from django.db import IntegrityError, transaction
+from django.http import Http404, HttpRequest
 from django.shortcuts import get_object_or_404
+from ninja import File
+from ninja.files import UploadedFile
 from ninja.params import Query
 from ninja_extra.controllers import ControllerBase, api_controller, route
+from ninja_extra.exceptions import PermissionDenied
 
 from article.models import Article
+from buckutt.pagination import (
+    CursorParams,
+    StreamFormat,
+    akeyset_page,
+    stream_content,
+    stream_rows,
+)
+from buckutt.profiling import query_budget, set_selling_point
+from buckutt.types import PrimaryKey
+from selling_points.devices import DeviceAuth, DeviceSession, SellerSessionAuth
 from selling_points.models import SellingPoint
-from transaction.exceptions import NotEnoughCredit
-from transaction.models import Cart, Purchase, Reload
+from transaction.exceptions import DuplicateTrace
+from transaction.idempotency import idempotent
+from transaction.models import Cart, LedgerEntry, Purchase, Reload
+from transaction.reload_import import import_reloads
+from transaction.rollups import apurchase_summary, areload_summary
 from transaction.schemas import (
+    PurchaseBatchResultSchema,
     PurchaseFilterSchema,
+    PurchasePageSchema,
     PurchaseRequest,
-    PurchaseSchema,
     PurchaseSummarySchema,
     ReloadFilterSchema,
+    ReloadImportSchema,
+    ReloadPageSchema,
     ReloadRequest,
-    ReloadSchema,
     ReloadSummarySchema,
     TotalAmountSchema,
 )
+from transaction.settlement import Interval, settlement, settlement_csv
+from users.memberships import user_groups
 from users.models import User
 from users.schemas import SimpleUserSchema
 
+# les ventes sont authentifiées par jeton d'appareil ou par session
+SALE_AUTH = [DeviceAuth(), SellerSessionAuth()]
+
+# champs des exports, identiques à ceux de PurchaseSchema et ReloadSchema
+PURCHASE_EXPORT_FIELDS = {
+    "id": "id",
+    "article": "article_id",
+    "buyer": "buyer_id",
+    "seller": "seller_id",
+    "point": "point_id",
+    "date": "date",
+    "foundation": "foundation_id",
+    "price": "price",
+}
+RELOAD_EXPORT_FIELDS = {
+    "id": "id",
+    "buyer": "buyer_id",
+    "seller": "seller_id",
+    "point": "point_id",
+    "date": "date",
+    "amount": "amount",
+}
+
+
+def _seller_and_point(request: HttpRequest, point_id: int) -> tuple[User, SellingPoint]:
+    """
+    Retourne le vendeur et le point de vente d'une requête de vente.
+
+    Pour une requête authentifiée par jeton d'appareil, ils sont lus dans le jeton,
+    sans requête, et le point de vente demandé doit être celui de l'appareil ;
+    sinon, le vendeur est l'utilisateur de la session
+    et le point de vente est lu dans la base de données.
+
+    Raises:
+        PermissionDenied: si le point de vente n'est pas celui de l'appareil
+        Http404: si le point de vente n'existe pas
+    """
+    auth = request.auth
+    if isinstance(auth, DeviceSession):
+        if auth.point_id != point_id:
+            raise PermissionDenied("Selling point of another device")
+        set_selling_point(auth.point_id)
+        # seuls les ids sont utilisés pour enregistrer les transactions
+        return User(pk=auth.seller_id), SellingPoint(pk=auth.point_id)
+    point = get_object_or_404(SellingPoint, pk=point_id)
+    set_selling_point(point.pk)
+    return request.user, point
+
 
 @api_controller("/purchase")
 class PurchaseController(ControllerBase):
@@ -30,57 +97,169 @@ class PurchaseController(ControllerBase):
     Contrôleur pour les achats.
     """
 
-    @route.post("")
+    @route.post("", auth=SALE_AUTH)
+    @query_budget(11)
     @transaction.atomic
+    @idempotent("purchase")
     def create(self, body: PurchaseRequest):
         """
         Crée une transaction.
 
+        Si la requête porte un en-tête `Idempotency-Key` déjà utilisé
+        pour un achat réussi, l'achat n'est pas effectué une seconde fois
+        (voir [transaction.idempotency][]).
+
+        Le vendeur est l'utilisateur connecté ou, si la requête porte
+        un jeton d'appareil, celui du jeton (voir [selling_points.devices][]).
+
         Args:
             body: Les informations de la transaction.
         """
         customer = get_object_or_404(User, pk=body.buyer_id)
-        point = get_object_or_404(SellingPoint, pk=body.selling_point_id)
-        seller = self.context.request.user
+        seller, point = _seller_and_point(self.context.request, body.selling_point_id)
         cart = Cart(customer, seller, point)
-        article_ids = sorted(body.articles)
         try:
-            cart.add_articles(article_ids)
+            cart.add_quantities(body.quantities())
         except Article.DoesNotExist as e:
             raise Http404 from e
-        if cart.total_price > customer.credit:
-            raise NotEnoughCredit
         cart.save()
 
-    @route.get("", response=list[PurchaseSchema])
-    def fetch(self, filters: PurchaseFilterSchema = Query(...)):
+    @route.post("/batch", response=list[PurchaseBatchResultSchema], auth=SALE_AUTH)
+    @query_budget(11)
+    @transaction.atomic
+    def create_batch(self, body: list[PurchaseRequest]):
         """
-        Récupère les achats correspondant aux filtres donnés.
+        Crée plusieurs transactions en une seule requête.
+
+        Cette route est destinée aux terminaux qui envoient d'un coup
+        les ventes effectuées pendant une coupure réseau.
+        Les acheteurs, les points de vente et les groupes des acheteurs
+        sont récupérés en un nombre constant de requêtes,
+        quel que soit le nombre de transactions
+        (voir [Cart.save_many][transaction.models.Cart.save_many]).
+
+        Chaque transaction réussit ou échoue indépendamment des autres ;
+        avec un jeton d'appareil, les transactions d'un autre point de vente
+        que celui de l'appareil sont refusées (403),
+        comme par [create][transaction.api.PurchaseController.create].
+        Retourne, dans l'ordre des transactions, une liste de
+        [PurchaseBatchResultSchema][transaction.schemas.PurchaseBatchResultSchema].
+
+        Args:
+            body: Les informations des transactions.
+        """
+        auth = self.context.request.auth
+        buyers = User.objects.in_bulk({purchase.buyer_id for purchase in body})
+        if isinstance(auth, DeviceSession):
+            seller = User(pk=auth.seller_id)
+            points = {auth.point_id: SellingPoint(pk=auth.point_id)}
+            set_selling_point(auth.point_id)
+        else:
+            seller = self.context.request.user
+            points = SellingPoint.objects.in_bulk(
+                {purchase.selling_point_id for purchase in body}
+            )
+        groups = user_groups.get_many(buyers)
+        results: list[PurchaseBatchResultSchema | None] = [None] * len(body)
+        carts, indices = [], []
+        for i, purchase in enumerate(body):
+            if (
+                isinstance(auth, DeviceSession)
+                and purchase.selling_point_id != auth.point_id
+            ):
+                results[i] = PurchaseBatchResultSchema(
+                    status=403, detail="Selling point of another device"
+                )
+                continue
+            customer = buyers.get(purchase.buyer_id)
+            point = points.get(purchase.selling_point_id)
+            if customer is None or point is None:
+                results[i] = PurchaseBatchResultSchema(
+                    status=404, detail="Utilisateur ou point de vente inexistant"
+                )
+                continue
+            cart = Cart(customer, seller, point, groups[customer.pk])
+            try:
+                cart.add_quantities(purchase.quantities())
+            except Article.DoesNotExist as e:
+                results[i] = PurchaseBatchResultSchema(status=404, detail=str(e))
+                continue
+            carts.append(cart)
+            indices.append(i)
+        for i, error in zip(indices, Cart.save_many(carts), strict=True):
+            results[i] = (
+                PurchaseBatchResultSchema(status=200)
+                if error is None
+                else PurchaseBatchResultSchema(
+                    status=error.status_code, detail=str(error.detail)
+                )
+            )
+        return results
+
+    @route.get("", response=PurchasePageSchema)
+    @query_budget(1)
+    async def fetch(
+        self,
+        filters: PurchaseFilterSchema = Query(...),
+        page: CursorParams = Query(...),
+    ):
+        """
+        Récupère une page des achats correspondant aux filtres donnés,
+        triés par date.
+
+        Retourne une [PurchasePageSchema][transaction.schemas.PurchasePageSchema] ;
+        la page suivante est obtenue en passant son curseur (`next_cursor`)
+        dans le paramètre `cursor` (voir [buckutt.pagination][]).
 
         Args:
             filters: Les filtres à appliquer.
+            page: Les paramètres de pagination.
+        """
+        return await akeyset_page(filters.filter(Purchase.objects.all()), page)
+
+    @route.get("/export")
+    def export(
+        self,
+        filters: PurchaseFilterSchema = Query(...),
+        format: StreamFormat = "ndjson",
+    ):
         """
-        return filters.filter(Purchase.objects.all())
+        Envoie en flux tous les achats correspondant aux filtres donnés,
+        triés par date, avec les champs de
+        [PurchaseSchema][transaction.schemas.PurchaseSchema].
+
+        Contrairement à [fetch][transaction.api.PurchaseController.fetch],
+        la réponse n'est pas paginée, mais la mémoire utilisée
+        ne dépend pas du nombre d'achats.
+
+        Args:
+            filters: Les filtres à appliquer.
+            format: `ndjson` (un achat par ligne) ou `json` (une liste).
+        """
+        return stream_rows(
+            self.context.request,
+            filters.filter(Purchase.objects.all()),
+            PURCHASE_EXPORT_FIELDS,
+            format,
+        )
 
     @route.get("/summary", response=list[PurchaseSummarySchema])
-    def fetch_summary(self, filters: PurchaseFilterSchema = Query(...)):
+    @query_budget(3)
+    async def fetch_summary(self, filters: PurchaseFilterSchema = Query(...)):
         """
         Récupère un résumé des achats correspondant aux filtres donnés.
 
+        Le résumé est calculé à partir des agrégats horaires,
+        complétés par les achats non encore agrégés
+        (voir [transaction.rollups][]).
+
         Le résultat est sérialisé sous la forme d'une liste de
         [PurchaseSummarySchema][transaction.schemas.PurchaseSummarySchema].
 
         Args:
             filters: Les filtres à appliquer.
         """
-        purchases = filters.filter(Purchase.objects.all())
-        return (
-            purchases.annotate(
-                article_name=F("article__name"), point_name=F("point__name")
-            )
-            .values("article_name", "point_name", "price")
-            .annotate(count=Count("pk"), total=Sum("price"))
-        )
+        return await apurchase_summary(filters)
 
 
 @api_controller("/reload")
@@ -92,12 +271,23 @@ class ReloadController(ControllerBase):
     d'ajouter du crédit à son compte.
     """
 
-    @route.post("", response=SimpleUserSchema)
+    @route.post("", response=SimpleUserSchema, auth=SALE_AUTH)
+    @query_budget(9)
     @transaction.atomic
+    @idempotent("reload", SimpleUserSchema)
     def create(self, body: ReloadRequest):
         """
         Crée un rechargement.
 
+        Si la requête porte un en-tête `Idempotency-Key` déjà utilisé
+        pour un rechargement réussi, le rechargement n'est pas effectué
+        une seconde fois et la réponse du premier est retournée
+        (voir [transaction.idempotency][]).
+
+        Un paiement par carte ne peut créditer qu'un seul rechargement :
+        si la référence du paiement (`trace`) a déjà été utilisée,
+        le rechargement est refusé (409).
+
         Retourne l'utilisateur ayant effectué le rechargement
         sérialisé sous la forme d'un [SimpleUserSchema][users.schemas.SimpleUserSchema].
 
@@ -105,46 +295,111 @@ class ReloadController(ControllerBase):
             body: Les informations du rechargement.
         """
         customer = get_object_or_404(User, pk=body.buyer_id)
-        Reload.objects.create(
-            buyer=customer,
-            point=get_object_or_404(SellingPoint, pk=body.selling_point_id),
-            seller=self.context.request.user,
+        seller, point = _seller_and_point(self.context.request, body.selling_point_id)
+        customer.credit = User.objects.refill(customer.pk, body.amount)
+        entry = LedgerEntry.objects.create(
+            user=customer,
+            kind=LedgerEntry.Kind.RELOAD,
             amount=body.amount,
-            trace="such",
+            balance=customer.credit,
         )
-        customer.credit += body.amount
-        customer.save()
+        try:
+            Reload.objects.create(
+                buyer=customer,
+                point=point,
+                seller=seller,
+                amount=body.amount,
+                trace=body.trace,
+                entry=entry,
+            )
+        except IntegrityError as e:
+            if not Reload.is_duplicate_trace(e):
+                raise
+            raise DuplicateTrace from e
         return customer
 
-    @route.get("", response=list[ReloadSchema])
-    def fetch(self, filters: ReloadFilterSchema = Query(...)):
+    @route.post("/import", response=ReloadImportSchema, auth=SALE_AUTH)
+    def import_file(self, selling_point_id: PrimaryKey, file: UploadedFile = File(...)):
+        """
+        Importe les paiements par carte d'un export CSV de terminal de paiement
+        (voir [transaction.reload_import][]).
+
+        Comme pour [create][transaction.api.ReloadController.create],
+        la requête doit être authentifiée par un jeton d'appareil
+        ou par la session d'un vendeur, qui devient le vendeur des rechargements.
+
+        Retourne le nombre et le montant total des rechargements importés
+        ainsi que les lignes rejetées, sous la forme d'un
+        [ReloadImportSchema][transaction.schemas.ReloadImportSchema].
+
+        Args:
+            selling_point_id: L'id du point de vente du terminal.
+            file: Le fichier exporté par le terminal.
+        """
+        seller, point = _seller_and_point(self.context.request, selling_point_id)
+        text = file.read().decode("utf-8-sig")
+        return import_reloads(text, seller, point)
+
+    @route.get("", response=ReloadPageSchema)
+    @query_budget(1)
+    async def fetch(
+        self,
+        filters: ReloadFilterSchema = Query(...),
+        page: CursorParams = Query(...),
+    ):
+        """
+        Récupère une page des rechargements correspondant aux filtres donnés,
+        triés par date.
+
+        Retourne une [ReloadPageSchema][transaction.schemas.ReloadPageSchema] ;
+        la page suivante est obtenue en passant son curseur (`next_cursor`)
+        dans le paramètre `cursor` (voir [buckutt.pagination][]).
+
+        Args:
+            filters: Les filtres à appliquer.
+            page: Les paramètres de pagination.
         """
-        Récupère les rechargements correspondant aux filtres donnés.
+        return await akeyset_page(filters.filter(Reload.objects.all()), page)
 
-        Retourne une liste de [ReloadSchema][transaction.schemas.ReloadSchema].
+    @route.get("/export")
+    def export(
+        self,
+        filters: ReloadFilterSchema = Query(...),
+        format: StreamFormat = "ndjson",
+    ):
+        """
+        Envoie en flux tous les rechargements correspondant aux filtres donnés,
+        triés par date, avec les champs de
+        [ReloadSchema][transaction.schemas.ReloadSchema].
 
         Args:
             filters: Les filtres à appliquer.
+            format: `ndjson` (un rechargement par ligne) ou `json` (une liste).
         """
-        return filters.filter(Reload.objects.all())
+        return stream_rows(
+            self.context.request,
+            filters.filter(Reload.objects.all()),
+            RELOAD_EXPORT_FIELDS,
+            format,
+        )
 
     @route.get("/summary", response=list[ReloadSummarySchema])
-    def fetch_summary(self, filters: ReloadFilterSchema = Query(...)):
+    @query_budget(3)
+    async def fetch_summary(self, filters: ReloadFilterSchema = Query(...)):
         """
         Récupère un résumé des rechargements correspondant aux filtres donnés.
 
+        Le résumé est calculé à partir des agrégats horaires,
+        complétés par les rechargements non encore agrégés
+        (voir [transaction.rollups][]).
+
         Le résultat est sérialisé sous la forme d'une liste de
         [ReloadSummarySchema][transaction.schemas.ReloadSummarySchema].
 
         Args:
             filters: Les filtres à appliquer.
         """
-        reloads = filters.filter(Reload.objects.all())
-        return (
-            reloads.annotate(point_name=F("point__name"))
-            .values("point_name")
-            .annotate(count=Count("pk"), total=Sum("amount"))
-        )
+        return await areload_summary(filters)
 
 
 @api_controller("/treasury")
@@ -154,11 +409,39 @@ class TreasuryController(ControllerBase):
     """
 
     @route.get("/global-credit", response=TotalAmountSchema)
-    def get_total_credit(self):
+    @query_budget(1)
+    async def get_total_credit(self):
         """
         Récupère le montant total du crédit de tous les utilisateurs.
 
+        Le montant est lu dans le compteur du crédit total
+        ([CreditCounter][users.models.CreditCounter]),
+        sans parcourir les utilisateurs.
+
         Le résultat est sérialisé sous la forme d'un
         [TotalAmountSchema][transaction.schemas.TotalAmountSchema].
         """
-        return User.objects.all().aggregate(total=Sum("credit"))
+        return {"total": await User.objects.atotal_credit()}
+
+    @route.get("/settlement")
+    def export_settlement(
+        self,
+        filters: PurchaseFilterSchema = Query(...),
+        interval: Interval = "day",
+    ):
+        """
+        Envoie au format CSV le décompte des montants dus à chaque fondation
+        pour les achats correspondant aux filtres donnés,
+        par article et par intervalle (voir [transaction.settlement][]).
+
+        Args:
+            filters: Les filtres à appliquer.
+            interval: `hour`, `day`, `week` ou `month`.
+        """
+        response = stream_content(
+            self.context.request,
+            settlement_csv(settlement(filters, interval)),
+            "text/csv",
+        )
+        response["Content-Disposition"] = 'attachment; filename="settlement.csv"'
+        return response
@@ -4,3 +4,34 @@ from ninja_extra.exceptions import APIException
 class NotEnoughCredit(APIException):
     status_code = 402
     detail = "Not enough credit"
+
+
+class ConcurrentUpdate(APIException):
+    status_code = 409
+    detail = "Concurrent update, please retry"
+
+
+class OutOfStock(APIException):
+    status_code = 409
+    detail = "Out of stock"
+
+    def __init__(self, article_ids=None):
+        detail = None
+        if article_ids:
+            detail = f"Out of stock: {sorted(article_ids)}"
+        super().__init__(detail)
+
+
+class InvalidIdempotencyKey(APIException):
+    status_code = 400
+    detail = "Invalid idempotency key"
+
+
+class DuplicateTrace(APIException):
+    status_code = 409
+    detail = "Trace already used"
+
+
+class InvalidImportFile(APIException):
+    status_code = 400
+    detail = "Invalid import file"
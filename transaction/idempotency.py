@@ -0,0 +1,72 @@
+"""
+Gestion des clefs d'idempotence des routes de création.
+
+Les terminaux renvoient leurs requêtes `POST` lorsqu'elles n'aboutissent pas
+dans les temps. Si une requête est accompagnée de l'en-tête `Idempotency-Key`,
+sa réponse est enregistrée dans la même transaction que ses effets
+([IdempotencyKey][transaction.models.IdempotencyKey]) :
+une nouvelle requête portant la même clef reçoit alors directement
+la réponse enregistrée, sans recalculer le panier ni débiter à nouveau le compte.
+
+Seules les requêtes réussies sont enregistrées : une requête ayant échoué
+est annulée avec sa transaction et peut donc être réessayée.
+"""
+from collections.abc import Callable
+from functools import wraps
+
+from django.db import IntegrityError, transaction
+from ninja import Schema
+
+from transaction.exceptions import InvalidIdempotencyKey
+from transaction.models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+
+
+def idempotent(scope: str, schema: type[Schema] | None = None) -> Callable:
+    """
+    Rend idempotente la méthode de contrôleur décorée.
+
+    La méthode doit être exécutée dans une transaction
+    (par exemple en étant aussi décorée par `transaction.atomic`).
+
+    Args:
+        scope: nom de la route, pour que deux routes différentes
+            puissent recevoir la même clef
+        schema: schéma de sérialisation de la réponse de la route,
+            ou `None` si la route ne retourne rien
+
+    Examples:
+        ```python
+        @route.post("", response=SimpleUserSchema)
+        @transaction.atomic
+        @idempotent("reload", SimpleUserSchema)
+        def create(self, body: ReloadRequest):
+            ...
+        ```
+    """
+
+    def decorator(func: Callable) -> Callable:
+        @wraps(func)
+        def wrapper(self, *args, **kwargs):
+            key = self.context.request.headers.get(IDEMPOTENCY_HEADER)
+            if not key:
+                return func(self, *args, **kwargs)
+            if len(key) > IdempotencyKey._meta.get_field("key").max_length:
+                raise InvalidIdempotencyKey
+            try:
+                with transaction.atomic():
+                    record = IdempotencyKey.objects.create(scope=scope, key=key)
+            except IntegrityError:
+                # si la première requête est toujours en cours,
+                # l'insertion attend la fin de sa transaction
+                return IdempotencyKey.objects.get(scope=scope, key=key).response
+            result = func(self, *args, **kwargs)
+            if schema is not None:
+                record.response = schema.from_orm(result).dict()
+                record.save(update_fields=["response"])
+            return result
+
+        return wrapper
+
+    return decorator
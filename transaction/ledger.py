@@ -0,0 +1,203 @@
+"""
+Vérification incrémentale du registre des soldes.
+
+Le registre des soldes ([LedgerEntry][transaction.models.LedgerEntry])
+permet de vérifier le crédit des utilisateurs sans agréger tout l'historique
+des achats et des rechargements : chaque vérification ne porte que sur
+les écritures, achats et rechargements ajoutés depuis le dernier point
+de reprise ([LedgerCheckpoint][transaction.models.LedgerCheckpoint]).
+
+Pour chaque nouvelle écriture, on vérifie que :
+
+- son solde est égal au solde de l'écriture précédente
+  du même utilisateur augmenté de son montant ;
+- son montant est égal à l'opposé du prix total des achats
+  qui y font référence, ou au montant du rechargement qui y fait référence.
+
+On vérifie en outre que chaque nouvel achat et chaque nouveau rechargement
+fait référence à une écriture, et que le crédit des utilisateurs concernés
+est égal au solde de leur dernière écriture.
+
+Les transactions encore en cours lors de la vérification ne sont pas visibles :
+chaque vérification s'arrête à la plus grande clé primaire des lignes
+plus anciennes qu'un délai de garde, pour qu'une transaction validée
+après la vérification ne soit pas ignorée par la suivante.
+La date d'une ligne est fixée avant son insertion, et donc avant
+l'attribution de sa clé primaire : deux transactions concurrentes
+peuvent insérer leurs lignes dans un ordre différent de celui de leurs dates.
+Les lignes sont donc sélectionnées par clé primaire, et non par date,
+ce qui suppose que le délai de garde dépasse deux fois
+la durée d'une transaction.
+
+Examples:
+    ```bash
+    python manage.py verify_ledger          # depuis le dernier point de reprise
+    python manage.py verify_ledger --full   # depuis l'ouverture du registre
+    ```
+"""
+from datetime import datetime
+from decimal import Decimal
+
+from django.db.models import (
+    Case,
+    DecimalField,
+    F,
+    Max,
+    OuterRef,
+    Q,
+    QuerySet,
+    Subquery,
+    Sum,
+    Value,
+    When,
+)
+from django.db.models.functions import Coalesce
+
+from transaction.models import LedgerCheckpoint, LedgerEntry, Purchase, Reload
+from users.models import User
+
+_ZERO = Value(Decimal(0), output_field=DecimalField(max_digits=8, decimal_places=2))
+
+
+def _total(queryset: QuerySet, field: str) -> Coalesce:
+    """
+    Somme de la colonne donnée des lignes faisant référence à l'écriture courante.
+    """
+    totals = (
+        queryset.filter(entry=OuterRef("pk"))
+        .values("entry")
+        .annotate(total=Sum(field))
+        .values("total")
+    )
+    return Coalesce(Subquery(totals), _ZERO)
+
+
+def _previous_balance() -> Coalesce:
+    """
+    Solde de l'écriture précédant l'écriture courante
+    pour le même utilisateur (0 s'il n'y en a pas).
+    """
+    entries = LedgerEntry.objects.filter(user=OuterRef("user"), pk__lt=OuterRef("pk"))
+    return Coalesce(Subquery(entries.order_by("-pk").values("balance")[:1]), _ZERO)
+
+
+def _latest_balance() -> Coalesce:
+    """
+    Solde de la dernière écriture de l'utilisateur courant (0 s'il n'en a pas).
+    """
+    entries = LedgerEntry.objects.filter(user=OuterRef("pk"))
+    return Coalesce(Subquery(entries.order_by("-pk").values("balance")[:1]), _ZERO)
+
+
+def _broken_entries(entries: QuerySet) -> list[str]:
+    entries = entries.annotate(
+        previous=_previous_balance(),
+        movement=Case(
+            When(
+                kind=LedgerEntry.Kind.PURCHASE, then=-_total(Purchase.objects, "price")
+            ),
+            When(kind=LedgerEntry.Kind.RELOAD, then=_total(Reload.objects, "amount")),
+            default=F("amount"),
+        ),
+    ).filter(~Q(balance=F("previous") + F("amount")) | ~Q(amount=F("movement")))
+    errors = []
+    for entry in entries.order_by("pk"):
+        if entry.balance != entry.previous + entry.amount:
+            errors.append(
+                f"Écriture {entry.pk} : solde {entry.balance}€ "
+                f"au lieu de {entry.previous + entry.amount}€"
+            )
+        if entry.amount != entry.movement:
+            errors.append(
+                f"Écriture {entry.pk} : montant {entry.amount}€ "
+                f"au lieu de {entry.movement}€ d'après les transactions"
+            )
+    return errors
+
+
+def _cutoff(queryset: QuerySet, since: int, until: datetime) -> int:
+    """
+    Plus grande clé primaire des lignes postérieures au point de reprise
+    et antérieures à `until` (celle du point de reprise s'il n'y en a pas).
+    """
+    rows = queryset.filter(pk__gt=since, date__lt=until)
+    return rows.aggregate(m=Max("pk"))["m"] or since
+
+
+def verify_ledger(
+    since: LedgerCheckpoint, until: datetime, all_users: bool = False
+) -> tuple[LedgerCheckpoint, list[str]]:
+    """
+    Vérifie le registre des soldes depuis le point de reprise donné.
+
+    Args:
+        since: le point de reprise à partir duquel vérifier
+        until: les lignes insérées après la plus récente des lignes
+            antérieures à cet instant ne sont pas vérifiées
+        all_users: vérifier le crédit de tous les utilisateurs,
+            et non seulement de ceux ayant une nouvelle écriture
+
+    Returns:
+        Le nouveau point de reprise (non enregistré)
+        et la liste des erreurs relevées.
+    """
+    checkpoint = LedgerCheckpoint(
+        last_entry=_cutoff(LedgerEntry.objects, since.last_entry, until),
+        last_purchase=_cutoff(Purchase.objects, since.last_purchase, until),
+        last_reload=_cutoff(Reload.objects, since.last_reload, until),
+    )
+    entries = LedgerEntry.objects.filter(
+        pk__gt=since.last_entry, pk__lte=checkpoint.last_entry
+    )
+    purchases = Purchase.objects.filter(
+        pk__gt=since.last_purchase, pk__lte=checkpoint.last_purchase
+    )
+    reloads = Reload.objects.filter(
+        pk__gt=since.last_reload, pk__lte=checkpoint.last_reload
+    )
+    errors = _broken_entries(entries)
+    errors += [
+        f"Achat {pk} sans écriture"
+        for pk in purchases.filter(entry=None).values_list("pk", flat=True)
+    ]
+    errors += [
+        f"Rechargement {pk} sans écriture"
+        for pk in reloads.filter(entry=None).values_list("pk", flat=True)
+    ]
+    users = User.objects.all()
+    if not all_users:
+        users = users.filter(pk__in=entries.values("user"))
+    users = users.annotate(balance=_latest_balance()).exclude(credit=F("balance"))
+    errors += [
+        f"Utilisateur {user.pk} : crédit {user.credit}€ au lieu de {user.balance}€"
+        for user in users.order_by("pk")
+    ]
+    checkpoint.errors = len(errors)
+    return checkpoint, errors
+
+
+def open_ledger() -> LedgerCheckpoint:
+    """
+    Ouvre le registre des soldes, qui doit être vide.
+
+    Le crédit actuel de chaque utilisateur est inscrit comme solde d'ouverture
+    et le premier point de reprise de la vérification est créé :
+    les achats et rechargements antérieurs ne sont pas vérifiés.
+
+    Returns:
+        Le premier point de reprise.
+    """
+    LedgerEntry.objects.bulk_create(
+        LedgerEntry(
+            user_id=pk,
+            kind=LedgerEntry.Kind.ADJUSTMENT,
+            amount=credit,
+            balance=credit,
+        )
+        for pk, credit in User.objects.exclude(credit=0).values_list("pk", "credit")
+    )
+    return LedgerCheckpoint.objects.create(
+        last_entry=LedgerEntry.objects.aggregate(m=Max("pk"))["m"] or 0,
+        last_purchase=Purchase.objects.aggregate(m=Max("pk"))["m"] or 0,
+        last_reload=Reload.objects.aggregate(m=Max("pk"))["m"] or 0,
+    )
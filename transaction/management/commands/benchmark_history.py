@@ -0,0 +1,157 @@
+import re
+from datetime import timedelta
+
+from django.core.management import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from django.utils.timezone import now
+
+from article.models import Article, Category, Foundation
+from buckutt.pagination import CursorParams
+from selling_points.models import SellingPoint
+from transaction.models import Purchase, Reload
+from transaction.schemas import PurchaseFilterSchema, ReloadFilterSchema
+from users.models import User
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Génère un historique d'achats et de rechargements, puis affiche "
+        "le plan et la durée des requêtes de chaque combinaison de filtres. "
+        "Les données générées sont supprimées à la fin (transaction annulée)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--purchases", type=int, default=2_000_000)
+        parser.add_argument("--reloads", type=int, default=200_000)
+        parser.add_argument("--buyers", type=int, default=5000)
+        parser.add_argument("--foundations", type=int, default=20)
+        parser.add_argument("--days", type=int, default=365)
+        parser.add_argument(
+            "--plans", action="store_true", help="affiche les plans complets"
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.seed(options)
+                self.run(options)
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def seed(self, options):
+        self.stdout.write("Génération des données...")
+        category = Category.objects.create(name="Benchmark")
+        article = Article.objects.create(name="Benchmark", category=category)
+        point = SellingPoint.objects.create(name="Benchmark")
+        self.foundations = Foundation.objects.bulk_create(
+            Foundation(
+                name=f"Benchmark {i}",
+                website="https://example.com",
+                mail=f"benchmark{i}@example.com",
+            )
+            for i in range(options["foundations"])
+        )
+        self.buyers = User.objects.bulk_create(
+            User(username=f"benchmark_{i}", pin="0") for i in range(options["buyers"])
+        )
+        start = now() - timedelta(days=options["days"])
+        first_buyer = self.buyers[0].pk
+        first_foundation = self.foundations[0].pk
+        with connection.cursor() as cursor:
+            # les lignes sont insérées dans l'ordre des dates,
+            # comme elles le sont en production
+            cursor.execute(
+                f'INSERT INTO "{Purchase._meta.db_table}" '
+                '("date", "price", "buyer_id", "seller_id", "article_id", '
+                '"point_id", "foundation_id") '
+                "SELECT %s + i * %s, 1.50, "
+                "%s + (random() * %s)::int, %s, %s, %s, %s + (random() * %s)::int "
+                "FROM generate_series(1, %s) AS i",
+                [
+                    start,
+                    timedelta(days=options["days"]) / options["purchases"],
+                    first_buyer,
+                    options["buyers"] - 1,
+                    first_buyer,
+                    article.pk,
+                    point.pk,
+                    first_foundation,
+                    options["foundations"] - 1,
+                    options["purchases"],
+                ],
+            )
+            cursor.execute(
+                f'INSERT INTO "{Reload._meta.db_table}" '
+                '("date", "amount", "trace", "buyer_id", "seller_id", "point_id") '
+                "SELECT %s + i * %s, 10, '', "
+                "%s + (random() * %s)::int, %s, %s "
+                "FROM generate_series(1, %s) AS i",
+                [
+                    start,
+                    timedelta(days=options["days"]) / options["reloads"],
+                    first_buyer,
+                    options["buyers"] - 1,
+                    first_buyer,
+                    point.pk,
+                    options["reloads"],
+                ],
+            )
+            for model in (Purchase, Reload):
+                cursor.execute(f'ANALYZE "{model._meta.db_table}"')
+
+    def cases(self) -> list[tuple[str, type, dict]]:
+        buyer = self.buyers[len(self.buyers) // 2].pk
+        foundation = self.foundations[0].pk
+        week = {"after_date": now() - timedelta(days=14), "before_date": now()}
+        return [
+            ("achats", PurchaseFilterSchema, {}),
+            ("achats, dates", PurchaseFilterSchema, week),
+            ("achats, acheteur", PurchaseFilterSchema, {"buyer_id": buyer}),
+            (
+                "achats, acheteur, dates",
+                PurchaseFilterSchema,
+                {"buyer_id": buyer, **week},
+            ),
+            ("achats, fondation", PurchaseFilterSchema, {"foundation_id": foundation}),
+            (
+                "achats, fondation, dates",
+                PurchaseFilterSchema,
+                {"foundation_id": foundation, **week},
+            ),
+            ("rechargements", ReloadFilterSchema, {}),
+            ("rechargements, dates", ReloadFilterSchema, week),
+            ("rechargements, acheteur", ReloadFilterSchema, {"buyer_id": buyer}),
+            (
+                "rechargements, acheteur, dates",
+                ReloadFilterSchema,
+                {"buyer_id": buyer, **week},
+            ),
+        ]
+
+    def run(self, options):
+        for name, schema, filters in self.cases():
+            model = Purchase if schema is PurchaseFilterSchema else Reload
+            queryset = schema(**filters).filter(model.objects.all())
+            amount = "price" if model is Purchase else "amount"
+            queries = {
+                # première page de la pagination par curseur
+                "page": queryset.order_by("date", "pk")[: CursorParams().limit + 1],
+                "résumé": queryset.values("point").annotate(
+                    count=Count("pk"), total=Sum(amount)
+                ),
+            }
+            for kind, query in queries.items():
+                plan = query.explain(analyze=True)
+                duration = re.search(r"Execution Time: ([\d.]+) ms", plan)
+                scans = re.findall(r"(\w[\w ]* Scan[^(]*)", plan)
+                self.stdout.write(
+                    f"{name:<32} {kind:<7} {float(duration[1]):>10.2f} ms  {', '.join(scans)}"
+                )
+                if options["plans"]:
+                    self.stdout.write(plan + "\n")
@@ -0,0 +1,44 @@
+from pathlib import Path
+
+from django.core.management import BaseCommand, CommandError
+from ninja_extra.exceptions import APIException
+
+from selling_points.models import SellingPoint
+from transaction.reload_import import import_reloads
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = "Importe les paiements par carte d'un export CSV de terminal de paiement"
+
+    def add_arguments(self, parser):
+        parser.add_argument("file", type=Path, help="fichier exporté par le terminal")
+        parser.add_argument(
+            "--point", type=int, required=True, help="id du point de vente"
+        )
+        parser.add_argument(
+            "--seller",
+            required=True,
+            help="nom de l'utilisateur effectuant l'import",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            point = SellingPoint.objects.get(pk=options["point"])
+            seller = User.objects.get(username=options["seller"])
+        except (SellingPoint.DoesNotExist, User.DoesNotExist) as e:
+            raise CommandError(e) from e
+        text = options["file"].read_text(encoding="utf-8-sig")
+        try:
+            report = import_reloads(text, seller, point)
+        except APIException as e:
+            raise CommandError(e.detail) from e
+        for reject in report["rejects"]:
+            self.stderr.write(
+                f"Ligne {reject['line']} ({reject['trace']}) : {reject['reason']}"
+            )
+        self.stdout.write(
+            f"{report['imported']} rechargement(s) importé(s) "
+            f"pour un total de {report['total']}€, "
+            f"{len(report['rejects'])} ligne(s) rejetée(s)"
+        )
@@ -0,0 +1,20 @@
+from datetime import timedelta
+
+from django.core.management import BaseCommand
+from django.utils.timezone import now
+
+from transaction.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = (
+        "Supprime les clefs d'idempotence plus anciennes que le nombre de jours donné"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=7)
+
+    def handle(self, *args, **options):
+        limit = now() - timedelta(days=options["days"])
+        deleted, _ = IdempotencyKey.objects.filter(date__lt=limit).delete()
+        self.stdout.write(f"{deleted} clef(s) supprimée(s)")
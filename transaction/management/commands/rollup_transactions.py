@@ -0,0 +1,30 @@
+from datetime import timedelta
+
+from django.core.management import BaseCommand
+from django.utils.timezone import now
+
+from transaction.rollups import PURCHASES, RELOADS, ROLLUP_LAG, catch_up, rebuild
+
+
+class Command(BaseCommand):
+    help = "Agrège les achats et les rechargements des heures terminées"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--lag",
+            type=int,
+            default=int(ROLLUP_LAG.total_seconds()),
+            help="délai en secondes après la fin d'une heure avant de l'agréger",
+        )
+        parser.add_argument(
+            "--rebuild",
+            action="store_true",
+            help="supprime les agrégats et les recalcule depuis le début",
+        )
+
+    def handle(self, *args, **options):
+        until = now() - timedelta(seconds=options["lag"])
+        update = rebuild if options["rebuild"] else catch_up
+        for rollup in (PURCHASES, RELOADS):
+            watermark = update(rollup, until)
+            self.stdout.write(f"Agrégats {rollup.name} à jour jusqu'à {watermark}")
@@ -0,0 +1,44 @@
+from datetime import datetime
+from typing import get_args
+
+from django.core.management import BaseCommand
+from django.utils.timezone import is_naive, make_aware
+
+from transaction.schemas import PurchaseFilterSchema
+from transaction.settlement import Interval, settlement, settlement_csv
+
+
+def _date(value: str) -> datetime:
+    date = datetime.fromisoformat(value)
+    return make_aware(date) if is_naive(date) else date
+
+
+class Command(BaseCommand):
+    help = (
+        "Affiche au format CSV le décompte des montants dus à chaque fondation, "
+        "par article et par intervalle"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--after", type=_date, help="achats à partir de cette date (ISO 8601)"
+        )
+        parser.add_argument(
+            "--before", type=_date, help="achats jusqu'à cette date (ISO 8601)"
+        )
+        parser.add_argument("--foundation", type=int, help="id de la fondation")
+        parser.add_argument(
+            "--by",
+            choices=get_args(Interval),
+            default="day",
+            help="durée des intervalles",
+        )
+
+    def handle(self, *args, **options):
+        filters = PurchaseFilterSchema(
+            after_date=options["after"],
+            before_date=options["before"],
+            foundation_id=options["foundation"],
+        )
+        for line in settlement_csv(settlement(filters, options["by"])):
+            self.stdout.write(line, ending="")
@@ -0,0 +1,45 @@
+from datetime import timedelta
+
+from django.core.management import BaseCommand, CommandError
+from django.utils.timezone import now
+
+from transaction.ledger import verify_ledger
+from transaction.models import LedgerCheckpoint
+
+
+class Command(BaseCommand):
+    help = (
+        "Vérifie le registre des soldes, les achats, les rechargements "
+        "et le crédit des utilisateurs depuis le dernier point de reprise"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="reprend depuis l'ouverture du registre "
+            "et vérifie le crédit de tous les utilisateurs",
+        )
+        parser.add_argument(
+            "--lag",
+            type=int,
+            default=300,
+            help="délai de garde en secondes : la vérification s'arrête "
+            "à la dernière ligne plus ancienne que ce délai",
+        )
+
+    def handle(self, *args, **options):
+        checkpoints = LedgerCheckpoint.objects.order_by(
+            "pk" if options["full"] else "-pk"
+        )
+        since = checkpoints.first()
+        if since is None:
+            raise CommandError("Le registre des soldes n'a pas été ouvert")
+        until = now() - timedelta(seconds=options["lag"])
+        checkpoint, errors = verify_ledger(since, until, all_users=options["full"])
+        checkpoint.save()
+        for error in errors:
+            self.stderr.write(error)
+        if errors:
+            raise CommandError(f"{len(errors)} erreur(s) dans le registre des soldes")
+        self.stdout.write("Registre des soldes vérifié")
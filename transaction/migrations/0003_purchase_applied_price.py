@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-17 14:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("article", "0002_remove_article_type"),
+        ("transaction", "0002_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="purchase",
+            name="applied_price",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="purchases",
+                to="article.price",
+            ),
+        ),
+    ]
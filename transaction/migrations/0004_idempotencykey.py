@@ -0,0 +1,36 @@
+# Generated by Django 4.2.30 on 2026-10-17 14:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("transaction", "0003_purchase_applied_price"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="IdempotencyKey",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("scope", models.CharField(max_length=20)),
+                ("key", models.CharField(max_length=100)),
+                ("response", models.JSONField(null=True)),
+                ("date", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="idempotencykey",
+            constraint=models.UniqueConstraint(
+                fields=("scope", "key"), name="unique_idempotency_key"
+            ),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.30 on 2026-10-17 14:28
+
+from django.db import migrations
+from django.db.models import Max
+
+
+def open_ledger(apps, schema_editor):
+    """
+    Inscrit le crédit actuel de chaque utilisateur comme solde d'ouverture
+    et crée le premier point de reprise de la vérification du registre.
+    """
+    User = apps.get_model("users", "User")
+    LedgerEntry = apps.get_model("transaction", "LedgerEntry")
+    LedgerCheckpoint = apps.get_model("transaction", "LedgerCheckpoint")
+    Purchase = apps.get_model("transaction", "Purchase")
+    Reload = apps.get_model("transaction", "Reload")
+    LedgerEntry.objects.bulk_create(
+        LedgerEntry(user_id=pk, kind="adjustment", amount=credit, balance=credit)
+        for pk, credit in User.objects.exclude(credit=0).values_list("pk", "credit")
+    )
+    LedgerCheckpoint.objects.create(
+        last_entry=LedgerEntry.objects.aggregate(m=Max("pk"))["m"] or 0,
+        last_purchase=Purchase.objects.aggregate(m=Max("pk"))["m"] or 0,
+        last_reload=Reload.objects.aggregate(m=Max("pk"))["m"] or 0,
+    )
+
+
+def close_ledger(apps, schema_editor):
+    apps.get_model("transaction", "LedgerCheckpoint").objects.all().delete()
+    apps.get_model("transaction", "LedgerEntry").objects.all().delete()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("transaction", "0005_ledger"),
+        ("users", "0002_alter_user_managers"),
+    ]
+
+    operations = [
+        migrations.RunPython(open_ledger, close_ledger),
+    ]
@@ -0,0 +1,89 @@
+# Generated by Django 4.2.30 on 2026-10-17 14:31
+
+import django.contrib.postgres.indexes
+import django.db.models.deletion
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # les index sont créés sans bloquer les écritures dans les tables
+    atomic = False
+
+    dependencies = [
+        ("article", "0002_remove_article_type"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("transaction", "0006_ledger_opening_balances"),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="purchase",
+            index=models.Index(
+                fields=["buyer", "date", "id"], name="purchase_buyer_date_idx"
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="purchase",
+            index=models.Index(
+                fields=["foundation", "date", "id"], name="purchase_foundation_date_idx"
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="purchase",
+            index=models.Index(fields=["date", "id"], name="purchase_date_idx"),
+        ),
+        AddIndexConcurrently(
+            model_name="purchase",
+            index=django.contrib.postgres.indexes.BrinIndex(
+                autosummarize=True, fields=["date"], name="purchase_date_brin"
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="reload",
+            index=models.Index(
+                fields=["buyer", "date", "id"], name="reload_buyer_date_idx"
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="reload",
+            index=models.Index(fields=["date", "id"], name="reload_date_idx"),
+        ),
+        AddIndexConcurrently(
+            model_name="reload",
+            index=django.contrib.postgres.indexes.BrinIndex(
+                autosummarize=True, fields=["date"], name="reload_date_brin"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="purchase",
+            name="buyer",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="purchases",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="purchase",
+            name="foundation",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="purchases",
+                to="article.foundation",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="reload",
+            name="buyer",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="reloads",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+    ]
@@ -0,0 +1,111 @@
+# Generated by Django 4.2.30 on 2026-10-17 14:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("article", "0002_remove_article_type"),
+        ("selling_points", "0001_initial"),
+        ("transaction", "0007_history_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RollupWatermark",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=20, unique=True)),
+                ("until", models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name="ReloadRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("bucket", models.DateTimeField()),
+                ("count", models.PositiveIntegerField()),
+                ("total", models.DecimalField(decimal_places=2, max_digits=12)),
+                (
+                    "point",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.PROTECT,
+                        related_name="+",
+                        to="selling_points.sellingpoint",
+                    ),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="PurchaseRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("bucket", models.DateTimeField()),
+                ("price", models.DecimalField(decimal_places=2, max_digits=8)),
+                ("count", models.PositiveIntegerField()),
+                ("total", models.DecimalField(decimal_places=2, max_digits=12)),
+                (
+                    "article",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.PROTECT,
+                        related_name="+",
+                        to="article.article",
+                    ),
+                ),
+                (
+                    "foundation",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.PROTECT,
+                        related_name="+",
+                        to="article.foundation",
+                    ),
+                ),
+                (
+                    "point",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.PROTECT,
+                        related_name="+",
+                        to="selling_points.sellingpoint",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="reloadrollup",
+            constraint=models.UniqueConstraint(
+                fields=("bucket", "point"), name="unique_reload_rollup"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="purchaserollup",
+            constraint=models.UniqueConstraint(
+                fields=("bucket", "article", "point", "price", "foundation"),
+                name="unique_purchase_rollup",
+            ),
+        ),
+    ]
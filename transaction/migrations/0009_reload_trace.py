@@ -0,0 +1,47 @@
+# Generated by Django 4.2.30 on 2026-10-17 14:44
+
+from django.db import migrations, models
+
+# les rechargements créés par l'API avaient tous la même trace,
+# les autres doublons éventuels sont suffixés par leur id
+CLEAN_TRACES = [
+    'UPDATE "transaction_reload" SET "trace" = \'\' WHERE "trace" = \'such\'',
+    'UPDATE "transaction_reload" AS r '
+    'SET "trace" = left(r."trace", 49 - length(r."id"::text)) || \'#\' || r."id" '
+    'FROM (SELECT "id", row_number() OVER (PARTITION BY "trace" ORDER BY "id") AS n '
+    'FROM "transaction_reload" WHERE "trace" <> \'\') AS d '
+    'WHERE r."id" = d."id" AND d.n > 1',
+]
+
+
+class Migration(migrations.Migration):
+    # l'index est créé sans bloquer les écritures dans la table
+    atomic = False
+
+    dependencies = [
+        ("transaction", "0008_rollups"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="reload",
+            name="trace",
+            field=models.CharField(blank=True, max_length=50),
+        ),
+        migrations.RunSQL(CLEAN_TRACES, migrations.RunSQL.noop),
+        migrations.RunSQL(
+            'CREATE UNIQUE INDEX CONCURRENTLY "unique_reload_trace" '
+            'ON "transaction_reload" ("trace") WHERE NOT ("trace" = \'\')',
+            'DROP INDEX CONCURRENTLY "unique_reload_trace"',
+            state_operations=[
+                migrations.AddConstraint(
+                    model_name="reload",
+                    constraint=models.UniqueConstraint(
+                        condition=models.Q(("trace", ""), _negated=True),
+                        fields=("trace",),
+                        name="unique_reload_trace",
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-17 16:02
+
+from django.contrib.postgres.operations import RemoveIndexConcurrently
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # les index sont supprimés sans bloquer les écritures dans les tables
+    atomic = False
+
+    dependencies = [
+        ("transaction", "0009_reload_trace"),
+    ]
+
+    operations = [
+        # redondants avec les index (date, id), qui servent toutes les plages de dates
+        RemoveIndexConcurrently(
+            model_name="purchase",
+            name="purchase_date_brin",
+        ),
+        RemoveIndexConcurrently(
+            model_name="reload",
+            name="reload_date_brin",
+        ),
+    ]
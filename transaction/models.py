@@ -1,12 +1,19 @@
+from collections import Counter, defaultdict
+from collections.abc import Iterable, Mapping
 from decimal import Decimal
 
-from django.contrib.postgres.aggregates import ArrayAgg
-from django.db import IntegrityError, models
-from django.db.models import OuterRef
+from django.db import IntegrityError, models, transaction
+from django.db.models import Q
+from ninja_extra.exceptions import APIException
 
 from article.models import Article, Foundation, Price
+from article.pricing import resolve_prices
+from article.stock import decrement_stock, lock_stock
+from buckutt.metrics import cart_size, sales_amount
 from buckutt.types import PrimaryKey
 from selling_points.models import SellingPoint
+from transaction.exceptions import ConcurrentUpdate, NotEnoughCredit, OutOfStock
+from users.memberships import user_groups
 from users.models import User
 
 
@@ -22,18 +29,35 @@ class Purchase(models.Model):
         article (ForeignKey[Article]): article acheté
         point (ForeignKey[SellingPoint]): point de vente ou l'achat a été effectué
         foundation (ForeignKey[Foundation]): fondation à laquelle l'achat est associé
+        applied_price (ForeignKey[Price]): prix appliqué lors de l'achat
+            (vide pour les achats antérieurs à son introduction)
+        entry (ForeignKey[LedgerEntry]): écriture du registre des soldes
+            correspondant au débit (vide pour les achats antérieurs au registre)
 
     Redondance du prix:
         La colonne `price` peut sembler redondante, sachant qu'il y a la colonne `article`,
         à partir de laquelle on peut remonter au prix de l'article.
         Cependant, il est possible que ledit prix vienne à être modifié, et il est important
         de garder une trace du prix au moment de l'achat.
+        La colonne `applied_price` permet en outre de savoir
+        quel prix (groupe, période, fondation) a été retenu.
+
+    Index:
+        Les historiques sont filtrés par acheteur ou par fondation
+        puis triés par date : les index composites (acheteur, date, id)
+        et (fondation, date, id) servent à la fois le filtre, le tri
+        et la pagination par curseur ([buckutt.pagination][]),
+        et remplacent les index simples des clefs étrangères correspondantes.
+        Sans filtre, les pages, les exports et les agrégations
+        sur une plage de dates (résumés) sont lus dans l'index (date, id).
+        La commande `benchmark_history` affiche le plan et la durée
+        des requêtes de chaque combinaison de filtres.
     """
 
     date = models.DateTimeField(auto_now_add=True)
     price = models.DecimalField(max_digits=8, decimal_places=2)
     buyer = models.ForeignKey(
-        to=User, related_name="purchases", on_delete=models.PROTECT
+        to=User, related_name="purchases", on_delete=models.PROTECT, db_index=False
     )
     seller = models.ForeignKey(to=User, related_name="sales", on_delete=models.PROTECT)
     article = models.ForeignKey(
@@ -43,9 +67,38 @@ class Purchase(models.Model):
         to=SellingPoint, related_name="purchases", on_delete=models.PROTECT
     )
     foundation = models.ForeignKey(
-        to=Foundation, related_name="purchases", on_delete=models.PROTECT
+        to=Foundation,
+        related_name="purchases",
+        on_delete=models.PROTECT,
+        db_index=False,
+    )
+    applied_price = models.ForeignKey(
+        to=Price,
+        related_name="purchases",
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+    )
+    entry = models.ForeignKey(
+        to="LedgerEntry",
+        related_name="purchases",
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
     )
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["buyer", "date", "id"], name="purchase_buyer_date_idx"
+            ),
+            models.Index(
+                fields=["foundation", "date", "id"],
+                name="purchase_foundation_date_idx",
+            ),
+            models.Index(fields=["date", "id"], name="purchase_date_idx"),
+        ]
+
     def __str__(self):
         return f"{self.buyer} - {self.article} ({self.price}€)"
 
@@ -81,88 +134,152 @@ class Cart:
         cart.add_articles([4, 5, 6])
         cart.save()  # enregistre les achats correspondant aux articles dans la db
         ```
+
+        Les articles achetés en plusieurs exemplaires peuvent être ajoutés
+        avec leur quantité par la méthode
+        [add_quantities][transaction.models.Cart.add_quantities] :
+
+        ```python
+        cart.add_quantities({1: 10, 2: 1})  # dix articles 1 et un article 2
+        ```
     """
 
-    def __init__(self, customer: User, seller: User, point: SellingPoint):
+    def __init__(
+        self,
+        customer: User,
+        seller: User,
+        point: SellingPoint,
+        group_ids: Iterable[int] | None = None,
+    ):
         """
         Args:
             customer: L'utilisateur qui achète les articles
             seller: L'utilisateur qui vend les articles
             point: Le point de vente où l'achat est effectué
+            group_ids: Les ids des groupes de l'acheteur,
+                s'ils sont déjà connus (sinon, ils sont récupérés
+                dans le cache des groupes lors de l'ajout d'articles)
         """
         self.customer = customer
         self.seller = seller
         self.point = point
+        self.group_ids = group_ids
         self.purchases: list[Purchase] = []
 
-    def add_articles(self, ids: list[PrimaryKey]):
+    def add_articles(self, ids: Iterable[PrimaryKey]):
         """
         Ajoute les articles dont les ids sont donnés
         à la liste des articles du panier.
 
+        Un id présent plusieurs fois correspond à plusieurs unités
+        du même article.
+
         Args:
             ids: liste des ids des articles à ajouter au panier
 
+        Raises:
+            Article.DoesNotExist: si un des ids donnés ne correspond à
+                aucun article disponible à la vente pour l'utilisateur.
+        """
+        self.add_quantities(Counter(ids))
+
+    def add_quantities(self, quantities: Mapping[PrimaryKey, int]):
+        """
+        Ajoute au panier les articles dans les quantités données.
+
+        Le prix de chaque article n'est résolu qu'une fois,
+        quelle que soit sa quantité ; un achat est ensuite créé par unité.
+
+        Args:
+            quantities: les quantités à ajouter, indexées par id d'article
+
         Raises:
             Article.DoesNotExist: si un des ids donnés ne correspond à
                 aucun article disponible à la vente pour l'utilisateur.
 
         Warning:
-            L'appel de cette méthode effectue une requête à la base de données
-            pour récupérer les articles correspondants aux ids donnés.
-            Essayez de ne l'utiliser qu'une seule fois par panier.
+            Si les groupes de l'utilisateur n'ont pas été donnés à la création
+            du panier, ils sont lus dans le cache des groupes
+            ([GroupMemberships][users.memberships.GroupMemberships]),
+            ce qui peut nécessiter une requête à la base de données.
+            Les prix sont ensuite résolus par
+            [resolve_prices][article.pricing.resolve_prices].
         """
-        if len(ids) == 0:
+        if len(quantities) == 0:
             return
-        ids = sorted(ids)
-        prices = Price.objects.filter(
-            article=OuterRef("pk"), group__in=self.customer.groups.all()
-        )
-        articles = (
-            Article.objects.available_now()
-            .filter(pk__in=ids)
-            .annotate(price=ArrayAgg(prices.values("amount")[:1]))
-            .annotate_price_for(self.customer)
-            .annotate_foundation_for(self.customer)
-            .distinct()
-        )
-        if len(articles) != len(ids):
-            bad_ids = set(ids) - {a.pk for a in articles}
+        if self.group_ids is None:
+            self.group_ids = user_groups.get(self.customer.pk)
+        prices = resolve_prices(self.group_ids, article_ids=quantities.keys())
+        if bad_ids := quantities.keys() - prices.keys():
             raise Article.DoesNotExist(
                 f"Les articles suivants n'existent pas : {bad_ids}"
             )
         purchases = [
             Purchase(
-                price=a.price,
+                price=prices[pk].amount,
+                applied_price_id=prices[pk].id,
                 buyer=self.customer,
                 seller=self.seller,
-                article=a,
+                article_id=pk,
                 point=self.point,
-                foundation_id=a.foundation,
+                foundation_id=prices[pk].foundation,
             )
-            for a in articles
+            for pk in sorted(quantities)
+            for _ in range(quantities[pk])
         ]
         self.purchases.extend(purchases)
 
     def save(self) -> None:
         """
-        Enregistre les achats dans la base de données et retire le montant
-        correspondant du compte de l'utilisateur.
+        Enregistre les achats dans la base de données, retire le montant
+        correspondant du compte de l'utilisateur et décrémente le stock
+        des articles achetés.
+
+        Le débit est effectué par une seule requête conditionnelle
+        ([UserManager.debit][users.models.UserManager.debit]),
+        si bien que deux paniers du même utilisateur enregistrés en même temps
+        ne peuvent pas dépenser plus que son crédit.
+        Le débit est inscrit au registre des soldes
+        ([LedgerEntry][transaction.models.LedgerEntry]).
+        Le stock est décrémenté de la même manière
+        ([decrement_stock][article.stock.decrement_stock]),
+        en dernier afin que les articles à stock limité
+        restent verrouillés le moins longtemps possible.
 
         Raises:
-            IntegrityError: si le solde du compte de l'utilisateur est insuffisant
+            NotEnoughCredit: si le solde du compte de l'utilisateur est insuffisant
+            OutOfStock: si le stock d'un des articles est insuffisant
         """
         total = self.total_price
-        if total > self.customer.credit:
-            raise IntegrityError(
-                "Le solde du compte est insuffisant"
-                f" ({self.customer.credit}€) pour effectuer l'achat ({total}€)"
+        with transaction.atomic(savepoint=False):
+            credit = User.objects.debit(self.customer.pk, total)
+            if credit is None:
+                raise NotEnoughCredit
+            entry = LedgerEntry.objects.create(
+                user=self.customer,
+                kind=LedgerEntry.Kind.PURCHASE,
+                amount=-total,
+                balance=credit,
             )
-        Purchase.objects.bulk_create(self.purchases)
-        self.customer.credit -= total
-        self.customer.save()
+            for purchase in self.purchases:
+                purchase.entry = entry
+            Purchase.objects.bulk_create(self.purchases)
+            if sold_out := decrement_stock(self.quantities):
+                raise OutOfStock(sold_out)
+        self.customer.credit = credit
+        self._record_sale()
         self.purchases = []
 
+    def _record_sale(self) -> None:
+        # mesuré à la validation de la transaction englobante, s'il y en a une
+        size, total, point = len(self.purchases), self.total_price, self.point.pk
+
+        def record() -> None:
+            cart_size.observe(size, point=point)
+            sales_amount.inc(float(total), point=point)
+
+        transaction.on_commit(record)
+
     @property
     def total_price(self) -> Decimal:
         """
@@ -170,6 +287,117 @@ class Cart:
         """
         return sum(a.price for a in self.purchases)
 
+    @property
+    def quantities(self) -> Counter[PrimaryKey]:
+        """
+        Quantité de chaque article dans le panier, indexée par id d'article.
+        """
+        return Counter(a.article_id for a in self.purchases)
+
+    @staticmethod
+    def _debit_many(debits: dict[int, Decimal], purchases: list[Purchase]) -> None:
+        """
+        Débite les acheteurs, inscrit les débits au registre des soldes
+        et rattache chaque achat à l'écriture de son acheteur.
+
+        Raises:
+            ConcurrentUpdate: si un compte a changé malgré son verrou
+        """
+        balances = User.objects.debit_many(debits)
+        if len(balances) != len(debits):
+            raise ConcurrentUpdate("Le solde d'un des comptes a changé")
+        entries = LedgerEntry.objects.bulk_create(
+            [
+                LedgerEntry(
+                    user_id=pk,
+                    kind=LedgerEntry.Kind.PURCHASE,
+                    amount=-amount,
+                    balance=balances[pk],
+                )
+                for pk, amount in debits.items()
+            ]
+        )
+        entries = {entry.user_id: entry for entry in entries}
+        for purchase in purchases:
+            purchase.entry = entries[purchase.buyer_id]
+
+    @classmethod
+    def save_many(cls, carts: list["Cart"]) -> list[APIException | None]:
+        """
+        Enregistre plusieurs paniers en un nombre constant de requêtes.
+
+        Les comptes des acheteurs et les articles à stock limité
+        sont verrouillés (`SELECT ... FOR UPDATE`) le temps de décider
+        quels paniers peuvent être payés, dans l'ordre de la liste :
+        un panier dont l'acheteur n'a plus assez de crédit, ou dont un article
+        n'a plus assez de stock, est refusé sans empêcher
+        l'enregistrement des autres.
+        Les acheteurs sont ensuite débités par une seule requête
+        ([UserManager.debit_many][users.models.UserManager.debit_many]),
+        chaque débit est inscrit au registre des soldes,
+        tous les achats sont créés par un seul `INSERT`
+        et les stocks sont décrémentés par une seule requête.
+
+        Args:
+            carts: les paniers à enregistrer
+
+        Returns:
+            Pour chaque panier, `None` s'il a été enregistré,
+            et l'erreur ayant empêché son enregistrement sinon.
+
+        Raises:
+            ConcurrentUpdate: si un compte ou un stock a changé malgré son verrou
+        """
+        buyer_ids = sorted({cart.customer.pk for cart in carts})
+        article_ids = {pk for cart in carts for pk in cart.quantities}
+        with transaction.atomic(savepoint=False):
+            credits = dict(
+                User.objects.select_for_update()
+                .filter(pk__any=buyer_ids)
+                .order_by("pk")
+                .values_list("pk", "credit")
+            )
+            stocks = lock_stock(article_ids)
+            errors = []
+            debits: dict[int, Decimal] = defaultdict(Decimal)
+            sold: Counter[PrimaryKey] = Counter()
+            for cart in carts:
+                total = cart.total_price
+                quantities = cart.quantities
+                if credits[cart.customer.pk] < total:
+                    errors.append(NotEnoughCredit())
+                    continue
+                if sold_out := {
+                    pk
+                    for pk, quantity in quantities.items()
+                    if pk in stocks and stocks[pk] < quantity
+                }:
+                    errors.append(OutOfStock(sold_out))
+                    continue
+                credits[cart.customer.pk] -= total
+                debits[cart.customer.pk] += total
+                for pk, quantity in quantities.items():
+                    if pk in stocks:
+                        stocks[pk] -= quantity
+                        sold[pk] += quantity
+                errors.append(None)
+            purchases = [
+                purchase
+                for cart, error in zip(carts, errors, strict=True)
+                if error is None
+                for purchase in cart.purchases
+            ]
+            cls._debit_many(debits, purchases)
+            Purchase.objects.bulk_create(purchases)
+            if decrement_stock(sold):
+                raise ConcurrentUpdate("Le stock d'un des articles a changé")
+        for cart, error in zip(carts, errors, strict=True):
+            if error is None:
+                cart.customer.credit = credits[cart.customer.pk]
+                cart._record_sale()
+                cart.purchases = []
+        return errors
+
 
 class Reload(models.Model):
     """
@@ -183,23 +411,255 @@ class Reload(models.Model):
     Attributes:
         date (DateTimeField): Date et heure du rechargement
         amount (DecimalField): Montant du rechargement
-        trace (CharField): Trace du rechargement (pour les paiements par carte)
+        trace (CharField): Référence du paiement par carte donnée par le terminal
+            de paiement (vide pour les autres moyens de paiement),
+            unique parmi les rechargements qui en ont une
         buyer (ForeignKey[User]): Utilisateur dont le compte est rechargé
         seller (ForeignKey[User]): Utilisateur qui effectue le rechargement
         point (ForeignKey[SellingPoint]): Point de vente où le rechargement est effectué
+        entry (ForeignKey[LedgerEntry]): Écriture du registre des soldes
+            correspondant au crédit (vide pour les rechargements antérieurs au registre)
+
+    Les index sont construits comme ceux des achats
+    ([Purchase][transaction.models.Purchase]).
     """
 
     date = models.DateTimeField(auto_now_add=True)
     amount = models.DecimalField(max_digits=8, decimal_places=2)
-    trace = models.CharField(max_length=50)
+    trace = models.CharField(max_length=50, blank=True)
 
-    buyer = models.ForeignKey(to=User, related_name="reloads", on_delete=models.PROTECT)
+    buyer = models.ForeignKey(
+        to=User, related_name="reloads", on_delete=models.PROTECT, db_index=False
+    )
     seller = models.ForeignKey(
         to=User, related_name="reloads_as_seller", on_delete=models.PROTECT
     )
     point = models.ForeignKey(
         to=SellingPoint, related_name="reloads", on_delete=models.PROTECT
     )
+    entry = models.ForeignKey(
+        to="LedgerEntry",
+        related_name="reloads",
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["buyer", "date", "id"], name="reload_buyer_date_idx"),
+            models.Index(fields=["date", "id"], name="reload_date_idx"),
+        ]
+        constraints = [
+            # un même paiement ne peut pas créditer deux fois un compte
+            models.UniqueConstraint(
+                fields=["trace"], condition=~Q(trace=""), name="unique_reload_trace"
+            ),
+        ]
 
     def __str__(self):
         return f"{self.buyer} - {self.date} ({self.amount}€)"
+
+    @staticmethod
+    def is_duplicate_trace(error: IntegrityError) -> bool:
+        """
+        Indique si l'erreur est due à une référence de paiement déjà utilisée,
+        et non à une autre contrainte.
+        """
+        diag = getattr(error.__cause__, "diag", None)
+        return getattr(diag, "constraint_name", None) == "unique_reload_trace"
+
+
+class IdempotencyKey(models.Model):
+    """
+    Clef d'idempotence d'une requête de création.
+
+    Un terminal qui renvoie une requête (par exemple après un délai d'attente
+    dépassé) avec la même clef d'idempotence reçoit la réponse enregistrée
+    lors de la première exécution, sans que la requête soit exécutée à nouveau.
+
+    Attributes:
+        scope (CharField): route à laquelle la clef s'applique
+        key (CharField): clef fournie par le client (en-tête `Idempotency-Key`)
+        response (JSONField): réponse retournée lors de la première exécution
+        date (DateTimeField): date et heure de la première exécution
+    """
+
+    scope = models.CharField(max_length=20)
+    key = models.CharField(max_length=100)
+    response = models.JSONField(null=True)
+    date = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["scope", "key"], name="unique_idempotency_key"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.scope} - {self.key}"
+
+
+class LedgerEntry(models.Model):
+    """
+    Écriture du registre des soldes.
+
+    Le registre est un journal en ajout seul : chaque modification
+    du crédit d'un utilisateur y est inscrite, dans la même transaction,
+    avec le solde qui en résulte.
+    Le solde d'une écriture est donc toujours égal à celui de l'écriture
+    précédente du même utilisateur augmenté de son montant,
+    et le solde de la dernière écriture est égal au crédit de l'utilisateur.
+
+    Une écriture d'achat correspond aux achats qui y font référence
+    (un panier, ou tous les paniers d'un même acheteur dans un lot),
+    une écriture de rechargement au rechargement qui y fait référence.
+    Les ajustements (soldes d'ouverture, corrections) ne correspondent
+    à aucune transaction.
+
+    Le registre est vérifié de manière incrémentale
+    par la commande `verify_ledger` (voir [transaction.ledger][]).
+
+    Attributes:
+        user (ForeignKey[User]): utilisateur dont le crédit est modifié
+        kind (CharField): nature de l'écriture
+        amount (DecimalField): montant de la modification (négatif pour un débit)
+        balance (DecimalField): crédit de l'utilisateur après la modification
+        date (DateTimeField): date et heure de l'écriture
+    """
+
+    class Kind(models.TextChoices):
+        PURCHASE = "purchase", "Achat"
+        RELOAD = "reload", "Rechargement"
+        ADJUSTMENT = "adjustment", "Ajustement"
+
+    user = models.ForeignKey(to=User, related_name="ledger", on_delete=models.PROTECT)
+    kind = models.CharField(max_length=10, choices=Kind.choices)
+    amount = models.DecimalField(max_digits=8, decimal_places=2)
+    balance = models.DecimalField(max_digits=8, decimal_places=2)
+    date = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["user", "id"], name="ledger_user_idx")]
+
+    def __str__(self):
+        return f"{self.user} - {self.get_kind_display()} ({self.amount}€)"
+
+
+class LedgerCheckpoint(models.Model):
+    """
+    Point de reprise de la vérification du registre des soldes.
+
+    Chaque vérification ajoute un point de reprise indiquant
+    jusqu'où le registre, les achats et les rechargements ont été vérifiés ;
+    la vérification suivante reprend à partir du dernier.
+    Le premier point de reprise est créé avec le registre
+    et marque le début de celui-ci.
+
+    Attributes:
+        date (DateTimeField): date et heure de la vérification
+        last_entry (PositiveBigIntegerField): id de la dernière écriture vérifiée
+        last_purchase (PositiveBigIntegerField): id du dernier achat vérifié
+        last_reload (PositiveBigIntegerField): id du dernier rechargement vérifié
+        errors (PositiveIntegerField): nombre d'erreurs relevées
+    """
+
+    date = models.DateTimeField(auto_now_add=True)
+    last_entry = models.PositiveBigIntegerField(default=0)
+    last_purchase = models.PositiveBigIntegerField(default=0)
+    last_reload = models.PositiveBigIntegerField(default=0)
+    errors = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.date} ({self.errors} erreur(s))"
+
+
+class PurchaseRollup(models.Model):
+    """
+    Agrégat horaire des achats, par article, point de vente, prix et fondation.
+
+    Les agrégats sont calculés par la commande `rollup_transactions`
+    (voir [transaction.rollups][]) pour chaque heure terminée,
+    et servent à répondre aux résumés sans parcourir les achats.
+
+    Attributes:
+        bucket (DateTimeField): début de l'heure agrégée
+        article (ForeignKey[Article]): article acheté
+        point (ForeignKey[SellingPoint]): point de vente
+        price (DecimalField): prix de l'achat
+        foundation (ForeignKey[Foundation]): fondation associée aux achats
+        count (PositiveIntegerField): nombre d'achats
+        total (DecimalField): montant total des achats
+    """
+
+    bucket = models.DateTimeField()
+    article = models.ForeignKey(to=Article, related_name="+", on_delete=models.PROTECT)
+    point = models.ForeignKey(
+        to=SellingPoint, related_name="+", on_delete=models.PROTECT
+    )
+    price = models.DecimalField(max_digits=8, decimal_places=2)
+    foundation = models.ForeignKey(
+        to=Foundation, related_name="+", on_delete=models.PROTECT
+    )
+    count = models.PositiveIntegerField()
+    total = models.DecimalField(max_digits=12, decimal_places=2)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["bucket", "article", "point", "price", "foundation"],
+                name="unique_purchase_rollup",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.bucket} - {self.article} ({self.count} x {self.price}€)"
+
+
+class ReloadRollup(models.Model):
+    """
+    Agrégat horaire des rechargements, par point de vente.
+
+    Attributes:
+        bucket (DateTimeField): début de l'heure agrégée
+        point (ForeignKey[SellingPoint]): point de vente
+        count (PositiveIntegerField): nombre de rechargements
+        total (DecimalField): montant total des rechargements
+    """
+
+    bucket = models.DateTimeField()
+    point = models.ForeignKey(
+        to=SellingPoint, related_name="+", on_delete=models.PROTECT
+    )
+    count = models.PositiveIntegerField()
+    total = models.DecimalField(max_digits=12, decimal_places=2)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["bucket", "point"], name="unique_reload_rollup"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.bucket} - {self.point} ({self.total}€)"
+
+
+class RollupWatermark(models.Model):
+    """
+    Limite jusqu'à laquelle une table d'agrégats est à jour.
+
+    Toutes les lignes antérieures à `until` sont comptées dans les agrégats,
+    aucune ligne postérieure ne l'est.
+
+    Attributes:
+        name (CharField): nom de la table d'agrégats
+        until (DateTimeField): début de la première heure non agrégée
+    """
+
+    name = models.CharField(max_length=20, unique=True)
+    until = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.name} ({self.until})"
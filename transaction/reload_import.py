@@ -0,0 +1,181 @@
+"""
+Import des rechargements par carte exportés par les terminaux de paiement.
+
+Les paiements par carte encaissés par un terminal de paiement
+sont rapprochés en une seule fois à partir de son export CSV,
+plutôt qu'en envoyant un rechargement par requête.
+Le fichier doit contenir (avec `,` ou `;` comme séparateur)
+au moins les colonnes suivantes :
+
+- `trace` : la référence du paiement donnée par le terminal ;
+- `buyer` : l'id de l'utilisateur à créditer ;
+- `amount` : le montant du paiement.
+
+Les lignes invalides, celles dont la référence apparaît plus tôt dans le fichier
+ou a déjà été importée (la référence d'un rechargement est unique,
+voir [Reload][transaction.models.Reload]), et celles dont l'utilisateur
+n'existe pas sont rejetées ; les autres sont importées dans une seule transaction,
+en un nombre constant de requêtes : les comptes sont crédités
+par [UserManager.refill_many][users.models.UserManager.refill_many]
+et chaque utilisateur crédité reçoit une seule écriture au registre des soldes,
+à laquelle sont rattachés tous ses rechargements.
+
+Examples:
+    ```bash
+    python manage.py import_reloads terminal.csv --point 1 --seller admin
+    ```
+"""
+import csv
+from collections import defaultdict
+from collections.abc import Iterator
+from decimal import Decimal, InvalidOperation
+
+from django.db import IntegrityError, transaction
+
+from selling_points.models import SellingPoint
+from transaction.exceptions import DuplicateTrace, InvalidImportFile
+from transaction.models import LedgerEntry, Reload
+from users.models import User
+
+IMPORT_COLUMNS = {"trace", "buyer", "amount"}
+
+_CENT = Decimal("0.01")
+# montant maximal d'un rechargement (Reload.amount a 8 chiffres dont 2 décimales)
+_MAX_AMOUNT = Decimal("999999.99")
+_MAX_TRACE_LENGTH = Reload._meta.get_field("trace").max_length
+# plus grand id d'utilisateur (les ids sont passés à PostgreSQL en bigint)
+_MAX_ID = 2**63 - 1
+
+
+def _reject(line: int, trace: str, reason: str) -> dict:
+    return {"line": line, "trace": trace, "reason": reason}
+
+
+def _parse_amount(value: str) -> Decimal | None:
+    try:
+        amount = Decimal(value.strip().replace(",", "."))
+    except InvalidOperation:
+        return None
+    if not amount.is_finite() or not _CENT <= amount <= _MAX_AMOUNT:
+        return None
+    return amount if amount == amount.quantize(_CENT) else None
+
+
+def _parse_buyer(value: str) -> int | None:
+    # isdigit() accepte aussi des chiffres non ASCII, refusés par int()
+    if not value.isascii() or not value.isdigit():
+        return None
+    buyer = int(value)
+    return buyer if 0 < buyer <= _MAX_ID else None
+
+
+def _rows(text: str) -> Iterator[tuple[int, dict]]:
+    lines = text.splitlines()
+    if not lines:
+        raise InvalidImportFile("Empty import file")
+    try:
+        dialect = csv.Sniffer().sniff(lines[0], delimiters=",;")
+    except csv.Error as e:
+        raise InvalidImportFile("Unknown delimiter") from e
+    reader = csv.DictReader(lines, dialect=dialect)
+    missing = IMPORT_COLUMNS - set(reader.fieldnames or [])
+    if missing:
+        raise InvalidImportFile(f"Missing columns: {sorted(missing)}")
+    for row in reader:
+        yield reader.line_num, row
+
+
+def _parse(text: str) -> tuple[list[tuple[int, dict]], list[dict]]:
+    """
+    Valide les lignes du fichier et écarte les références en double.
+
+    Returns:
+        Les lignes valides (numéro de ligne, trace, acheteur, montant)
+        et les lignes rejetées.
+    """
+    valid, rejects, seen = [], [], set()
+    for line, row in _rows(text):
+        trace = (row["trace"] or "").strip()
+        buyer = _parse_buyer((row["buyer"] or "").strip())
+        amount = _parse_amount(row["amount"] or "")
+        if not trace or len(trace) > _MAX_TRACE_LENGTH:
+            rejects.append(_reject(line, trace, "Invalid trace"))
+        elif buyer is None:
+            rejects.append(_reject(line, trace, "Invalid buyer"))
+        elif amount is None:
+            rejects.append(_reject(line, trace, "Invalid amount"))
+        elif trace in seen:
+            rejects.append(_reject(line, trace, "Duplicate trace in file"))
+        else:
+            seen.add(trace)
+            valid.append((line, {"trace": trace, "buyer_id": buyer, "amount": amount}))
+    return valid, rejects
+
+
+@transaction.atomic
+def import_reloads(text: str, seller: User, point: SellingPoint) -> dict:
+    """
+    Importe les rechargements d'un export de terminal de paiement.
+
+    Args:
+        text: le contenu du fichier CSV
+        seller: l'utilisateur effectuant l'import
+        point: le point de vente du terminal de paiement
+
+    Returns:
+        Un dictionnaire correspondant à
+        [ReloadImportSchema][transaction.schemas.ReloadImportSchema].
+
+    Raises:
+        InvalidImportFile: si le fichier n'a pas les colonnes attendues
+        DuplicateTrace: si une référence du fichier est importée
+            au même moment par une autre transaction
+    """
+    valid, rejects = _parse(text)
+    imported = set(
+        Reload.objects.filter(trace__in=[row["trace"] for _, row in valid]).values_list(
+            "trace", flat=True
+        )
+    )
+    rows = []
+    for line, row in valid:
+        if row["trace"] in imported:
+            rejects.append(_reject(line, row["trace"], "Trace already imported"))
+        else:
+            rows.append((line, row))
+    totals = defaultdict(Decimal)
+    for _, row in rows:
+        totals[row["buyer_id"]] += row["amount"]
+    # les utilisateurs inexistants ne sont pas crédités
+    balances = User.objects.refill_many(totals)
+    entries = LedgerEntry.objects.bulk_create(
+        LedgerEntry(
+            user_id=pk,
+            kind=LedgerEntry.Kind.RELOAD,
+            amount=totals[pk],
+            balance=balance,
+        )
+        for pk, balance in balances.items()
+    )
+    entries = {entry.user_id: entry for entry in entries}
+    reloads = []
+    for line, row in rows:
+        if row["buyer_id"] in entries:
+            reloads.append(
+                Reload(
+                    **row, seller=seller, point=point, entry=entries[row["buyer_id"]]
+                )
+            )
+        else:
+            rejects.append(_reject(line, row["trace"], "Unknown buyer"))
+    try:
+        Reload.objects.bulk_create(reloads)
+    except IntegrityError as e:
+        if not Reload.is_duplicate_trace(e):
+            raise
+        raise DuplicateTrace from e
+    return {
+        "imported": len(reloads),
+        "total": sum(totals[pk] for pk in balances),
+        "rejects": sorted(rejects, key=lambda reject: reject["line"]),
+    }
@@ -0,0 +1,349 @@
+"""
+Agrégats horaires des achats et des rechargements.
+
+Les résumés des achats et des rechargements sont consultés en continu
+par la trésorerie pendant les événements. Plutôt que de regrouper
+à chaque fois toutes les lignes de la période demandée, ils sont calculés
+à partir d'agrégats horaires ([PurchaseRollup][transaction.models.PurchaseRollup],
+[ReloadRollup][transaction.models.ReloadRollup]),
+complétés par les lignes brutes qui ne sont pas encore agrégées
+(l'heure en cours) ou qui ne couvrent qu'une partie d'une heure
+(les bornes de la période demandée).
+
+Les agrégats sont calculés par la commande `rollup_transactions`,
+à lancer régulièrement (par exemple toutes les minutes) :
+chaque heure terminée depuis la limite
+([RollupWatermark][transaction.models.RollupWatermark]) est agrégée une fois,
+puis la limite est avancée dans la même transaction.
+Les achats et les rechargements n'étant jamais modifiés,
+les agrégats d'une heure n'ont plus à changer ensuite ;
+une heure n'est agrégée qu'une fois passé un délai de garde,
+pour que les transactions encore en cours y soient comptées.
+
+Les achats filtrés par acheteur, qui n'est pas une dimension des agrégats,
+sont toujours résumés à partir des lignes brutes
+(l'index (acheteur, date) rend ce cas peu coûteux).
+"""
+from collections.abc import Iterable
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import NamedTuple
+
+from django.db import connection, models, transaction
+from django.db.models import Count, F, Min, Q, QuerySet, Sum
+
+from transaction.models import (
+    Purchase,
+    PurchaseRollup,
+    Reload,
+    ReloadRollup,
+    RollupWatermark,
+)
+from transaction.schemas import PurchaseFilterSchema, ReloadFilterSchema
+
+HOUR = timedelta(hours=1)
+
+ROLLUP_LAG = timedelta(minutes=5)
+"""Délai après la fin d'une heure avant qu'elle soit agrégée."""
+
+# antérieure à toutes les transactions
+_ORIGIN = datetime(2000, 1, 1, tzinfo=timezone.utc)
+
+
+class _Rollup(NamedTuple):
+    name: str
+    source: type[models.Model]
+    target: type[models.Model]
+    dimensions: list[str]
+    amount: str
+
+
+PURCHASES = _Rollup(
+    "purchase",
+    Purchase,
+    PurchaseRollup,
+    ["article_id", "point_id", "price", "foundation_id"],
+    "price",
+)
+RELOADS = _Rollup("reload", Reload, ReloadRollup, ["point_id"], "amount")
+
+
+def floor_hour(date: datetime) -> datetime:
+    """
+    Retourne le début de l'heure (UTC) contenant l'instant donné.
+    """
+    return date.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def ceil_hour(date: datetime) -> datetime:
+    """
+    Retourne le début de la première heure (UTC) commençant à l'instant donné
+    ou après.
+    """
+    start = floor_hour(date)
+    return start if start == date else start + HOUR
+
+
+def _aggregate(rollup: _Rollup, start: datetime, stop: datetime) -> None:
+    source = rollup.source._meta.db_table
+    target = rollup.target._meta.db_table
+    dimensions = ", ".join(f'"{column}"' for column in rollup.dimensions)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO "{target}" ("bucket", {dimensions}, "count", "total") '
+            f"SELECT date_trunc('hour', \"date\"), {dimensions}, "
+            f'COUNT(*), SUM("{rollup.amount}") '
+            f'FROM "{source}" WHERE "date" >= %s AND "date" < %s '
+            f"GROUP BY 1, {dimensions}",
+            [start, stop],
+        )
+
+
+def catch_up(
+    rollup: _Rollup, until: datetime, batch: timedelta = timedelta(days=1)
+) -> datetime:
+    """
+    Agrège toutes les heures terminées avant l'instant donné
+    qui ne l'ont pas encore été.
+
+    Les heures sont agrégées par tranches, chacune dans sa propre transaction,
+    pour qu'un premier rattrapage sur un long historique
+    ne verrouille pas la limite trop longtemps.
+
+    Args:
+        rollup: les agrégats à mettre à jour (`PURCHASES` ou `RELOADS`)
+        until: les heures se terminant après cet instant ne sont pas agrégées
+        batch: la durée agrégée dans chaque transaction
+
+    Returns:
+        La nouvelle limite des agrégats.
+    """
+    end = floor_hour(until)
+    while True:
+        with transaction.atomic():
+            watermark = (
+                RollupWatermark.objects.select_for_update()
+                .filter(name=rollup.name)
+                .first()
+            ) or RollupWatermark(name=rollup.name, until=_ORIGIN)
+            if watermark.until >= end:
+                return watermark.until
+            # les heures sans ligne sont sautées
+            first = rollup.source.objects.filter(
+                date__gte=watermark.until, date__lt=end
+            ).aggregate(first=Min("date"))["first"]
+            start = floor_hour(first) if first is not None else end
+            stop = min(start + batch, end)
+            if start < end:
+                _aggregate(rollup, start, stop)
+            watermark.until = stop
+            watermark.save()
+
+
+def rebuild(rollup: _Rollup, until: datetime) -> datetime:
+    """
+    Supprime les agrégats et les recalcule depuis le début de l'historique.
+
+    À utiliser si des lignes déjà agrégées ont été modifiées ou supprimées.
+    """
+    with transaction.atomic():
+        rollup.target.objects.all().delete()
+        RollupWatermark.objects.filter(name=rollup.name).delete()
+    return catch_up(rollup, until)
+
+
+def _watermark(rollup: _Rollup) -> QuerySet:
+    return RollupWatermark.objects.filter(name=rollup.name).values_list(
+        "until", flat=True
+    )
+
+
+def _rolled_up_range(
+    end: datetime | None, after: datetime | None, before: datetime | None
+) -> tuple[datetime | None, datetime] | None:
+    """
+    Retourne la plage d'heures entières `[start, end)` comprise
+    dans la période `[after, before]` et couverte par les agrégats
+    (jusqu'à la limite `end`), ou `None` si aucune heure ne l'est.
+    """
+    if end is None:
+        return None
+    if before is not None:
+        # une heure se terminant exactement à `before` n'est pas entière :
+        # ses lignes à `before` appartiennent à l'heure suivante
+        end = min(end, floor_hour(before + timedelta(microseconds=1)))
+    start = ceil_hour(after) if after is not None else None
+    if start is not None and start >= end:
+        return None
+    return start, end
+
+
+def _split(
+    raw: QuerySet,
+    rollups: QuerySet,
+    end: datetime | None,
+    after: datetime | None,
+    before: datetime | None,
+) -> tuple[QuerySet, QuerySet]:
+    """
+    Répartit la période entre les agrégats et les lignes brutes.
+    """
+    covered = _rolled_up_range(end, after, before)
+    if covered is None:
+        return raw, rollups.none()
+    start, end = covered
+    in_range = Q(date__lt=end)
+    rollups = rollups.filter(bucket__lt=end)
+    if start is not None:
+        in_range &= Q(date__gte=start)
+        rollups = rollups.filter(bucket__gte=start)
+    return raw.exclude(in_range), rollups
+
+
+def _merge(keys: list[str], *summaries: Iterable[dict]) -> list[dict]:
+    merged: dict[tuple, dict] = {}
+    for summary in summaries:
+        for row in summary:
+            key = tuple(row[k] for k in keys)
+            if key not in merged:
+                merged[key] = {**{k: row[k] for k in keys}, "count": 0, "total": 0}
+            merged[key]["count"] += row["n"]
+            merged[key]["total"] += row["amount"] or Decimal(0)
+    return [merged[key] for key in sorted(merged)]
+
+
+def _purchase_groups(
+    filters: PurchaseFilterSchema,
+    keys: list[str],
+    end: datetime | None,
+    annotations: dict,
+) -> tuple[QuerySet, QuerySet]:
+    raw = filters.filter(Purchase.objects.all())
+    rollups = PurchaseRollup.objects.none()
+    if filters.buyer_id is None:
+        rollups = PurchaseRollup.objects.all()
+        if filters.foundation_id is not None:
+            rollups = rollups.filter(foundation_id=filters.foundation_id)
+        raw, rollups = _split(
+            raw, rollups, end, filters.after_date, filters.before_date
+        )
+    return (
+        raw.annotate(**annotations)
+        .values(*keys)
+        .annotate(n=Count("pk"), amount=Sum("price")),
+        rollups.annotate(date=F("bucket"))
+        .annotate(**annotations)
+        .values(*keys)
+        .annotate(n=Sum("count"), amount=Sum("total")),
+    )
+
+
+def group_purchases(
+    filters: PurchaseFilterSchema, keys: list[str], **annotations
+) -> list[dict]:
+    """
+    Regroupe les achats correspondant aux filtres donnés selon les clés données,
+    à partir des agrégats et des lignes brutes non agrégées.
+
+    Les clés sont des colonnes communes aux achats et aux agrégats
+    (`article_id`, `point_id`, `price`, `foundation_id`)
+    ou des annotations calculées sur celles-ci ou sur la date
+    (`date`, qui correspond au début de l'heure pour les agrégats).
+
+    Args:
+        filters: les filtres à appliquer
+        keys: les colonnes selon lesquelles regrouper les achats
+        annotations: les annotations utilisées comme clés
+
+    Returns:
+        Une liste de dictionnaires contenant les clés,
+        le nombre d'achats (`count`) et leur montant total (`total`),
+        triée par clés.
+    """
+    end = _watermark(PURCHASES).first() if filters.buyer_id is None else None
+    return _merge(keys, *_purchase_groups(filters, keys, end, annotations))
+
+
+async def agroup_purchases(
+    filters: PurchaseFilterSchema, keys: list[str], **annotations
+) -> list[dict]:
+    """
+    Version asynchrone de [group_purchases][transaction.rollups.group_purchases].
+    """
+    end = await _watermark(PURCHASES).afirst() if filters.buyer_id is None else None
+    raw, rollups = _purchase_groups(filters, keys, end, annotations)
+    return _merge(keys, [row async for row in raw], [row async for row in rollups])
+
+
+PURCHASE_SUMMARY_KEYS = ["article_name", "point_name", "price"]
+_PURCHASE_SUMMARY_NAMES = {
+    "article_name": F("article__name"),
+    "point_name": F("point__name"),
+}
+
+
+def purchase_summary(filters: PurchaseFilterSchema) -> list[dict]:
+    """
+    Résume les achats correspondant aux filtres donnés
+    par article, point de vente et prix.
+
+    Returns:
+        Une liste de dictionnaires correspondant à
+        [PurchaseSummarySchema][transaction.schemas.PurchaseSummarySchema].
+    """
+    return group_purchases(filters, PURCHASE_SUMMARY_KEYS, **_PURCHASE_SUMMARY_NAMES)
+
+
+async def apurchase_summary(filters: PurchaseFilterSchema) -> list[dict]:
+    """
+    Version asynchrone de [purchase_summary][transaction.rollups.purchase_summary].
+    """
+    return await agroup_purchases(
+        filters, PURCHASE_SUMMARY_KEYS, **_PURCHASE_SUMMARY_NAMES
+    )
+
+
+def _reload_groups(
+    filters: ReloadFilterSchema, end: datetime | None
+) -> tuple[QuerySet, QuerySet]:
+    raw = filters.filter(Reload.objects.all())
+    rollups = ReloadRollup.objects.none()
+    if filters.buyer_id is None:
+        raw, rollups = _split(
+            raw,
+            ReloadRollup.objects.all(),
+            end,
+            filters.after_date,
+            filters.before_date,
+        )
+    return (
+        raw.annotate(point_name=F("point__name"))
+        .values("point_name")
+        .annotate(n=Count("pk"), amount=Sum("amount")),
+        rollups.annotate(point_name=F("point__name"))
+        .values("point_name")
+        .annotate(n=Sum("count"), amount=Sum("total")),
+    )
+
+
+def reload_summary(filters: ReloadFilterSchema) -> list[dict]:
+    """
+    Résume les rechargements correspondant aux filtres donnés par point de vente.
+
+    Returns:
+        Une liste de dictionnaires correspondant à
+        [ReloadSummarySchema][transaction.schemas.ReloadSummarySchema].
+    """
+    end = _watermark(RELOADS).first() if filters.buyer_id is None else None
+    return _merge(["point_name"], *_reload_groups(filters, end))
+
+
+async def areload_summary(filters: ReloadFilterSchema) -> list[dict]:
+    """
+    Version asynchrone de [reload_summary][transaction.rollups.reload_summary].
+    """
+    end = await _watermark(RELOADS).afirst() if filters.buyer_id is None else None
+    raw, rollups = _reload_groups(filters, end)
+    return _merge(
+        ["point_name"], [row async for row in raw], [row async for row in rollups]
+    )
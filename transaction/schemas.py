@@ -1,3 +1,4 @@
+from collections import Counter
 from datetime import datetime
 from decimal import Decimal
 
@@ -5,22 +6,66 @@ from ninja import FilterSchema, ModelSchema, Schema
 from pydantic import Field, PositiveInt
 
 from buckutt.types import PrimaryKey
-from transaction.models import Purchase
+from transaction.models import Purchase, Reload
+
+
+class ArticleQuantity(Schema):
+    """
+    Valide un article acheté en plusieurs exemplaires.
+
+    Attributes:
+        id (PrimaryKey): id de l'article
+        quantity (int): nombre d'exemplaires achetés (entre 1 et 1000)
+    """
+
+    id: PrimaryKey
+    quantity: int = Field(1, ge=1, le=1000)
 
 
 class PurchaseRequest(Schema):
     """
     Valide les données nécessaires pour créer un achat.
 
+    Chaque élément de `articles` est soit l'id d'un article
+    (un exemplaire), soit un objet `{"id": ..., "quantity": ...}`
+    ([ArticleQuantity][transaction.schemas.ArticleQuantity]).
+    Les deux formes peuvent être mélangées,
+    et un même article peut apparaître plusieurs fois.
+
     Attributes:
         buyer_id (PrimaryKey): id de l'acheteur
         selling_point_id (PrimaryKey): id du point de vente
-        articles (list[PrimaryKey]): liste des ids des articles
+        articles (list[PrimaryKey | ArticleQuantity]): articles achetés
     """
 
     buyer_id: PrimaryKey
     selling_point_id: PrimaryKey
-    articles: list[PrimaryKey]
+    articles: list[PrimaryKey | ArticleQuantity]
+
+    def quantities(self) -> Counter[PrimaryKey]:
+        """
+        Retourne la quantité achetée de chaque article, indexée par id.
+        """
+        quantities = Counter()
+        for article in self.articles:
+            if isinstance(article, ArticleQuantity):
+                quantities[article.id] += article.quantity
+            else:
+                quantities[article] += 1
+        return quantities
+
+
+class PurchaseBatchResultSchema(Schema):
+    """
+    Schéma de sérialisation du résultat d'un achat d'un lot.
+
+    Attributes:
+        status (int): code HTTP qu'aurait retourné la création de l'achat seul
+        detail (str | None): raison de l'échec de l'achat
+    """
+
+    status: int
+    detail: str | None = None
 
 
 class ReloadRequest(Schema):
@@ -31,11 +76,44 @@ class ReloadRequest(Schema):
         buyer_id (PrimaryKey): id de l'acheteur
         selling_point_id (PrimaryKey): id du point de vente
         amount (Decimal): montant du rechargement
+        trace (str): référence du paiement par carte
+            (vide pour les autres moyens de paiement)
     """
 
     buyer_id: PrimaryKey
     selling_point_id: PrimaryKey
     amount: Decimal = Field(ge=0.01, decimal_places=2)
+    trace: str = Field("", max_length=50)
+
+
+class ReloadRejectSchema(Schema):
+    """
+    Schéma de sérialisation d'une ligne rejetée d'un import de rechargements.
+
+    Attributes:
+        line (int): numéro de la ligne dans le fichier
+        trace (str): référence du paiement
+        reason (str): raison du rejet
+    """
+
+    line: int
+    trace: str
+    reason: str
+
+
+class ReloadImportSchema(Schema):
+    """
+    Schéma de sérialisation du résultat d'un import de rechargements.
+
+    Attributes:
+        imported (int): nombre de rechargements importés
+        total (float): montant total des rechargements importés
+        rejects (list[ReloadRejectSchema]): lignes rejetées
+    """
+
+    imported: int
+    total: float
+    rejects: list[ReloadRejectSchema]
 
 
 class PurchaseSchema(ModelSchema):
@@ -59,6 +137,20 @@ class PurchaseSchema(ModelSchema):
     price: float
 
 
+class PurchasePageSchema(Schema):
+    """
+    Schéma de sérialisation pour une page d'achats.
+
+    Attributes:
+        items (list[PurchaseSchema]): achats de la page
+        next_cursor (str | None): curseur de la page suivante
+            (`None` s'il s'agit de la dernière)
+    """
+
+    items: list[PurchaseSchema]
+    next_cursor: str | None
+
+
 class ReloadSchema(ModelSchema):
     """
     Schéma de sérialisation pour un rechargement
@@ -66,7 +158,7 @@ class ReloadSchema(ModelSchema):
     """
 
     class Config:
-        model = Purchase
+        model = Reload
         model_fields = [
             "id",
             "buyer",
@@ -78,6 +170,20 @@ class ReloadSchema(ModelSchema):
     amount: float
 
 
+class ReloadPageSchema(Schema):
+    """
+    Schéma de sérialisation pour une page de rechargements.
+
+    Attributes:
+        items (list[ReloadSchema]): rechargements de la page
+        next_cursor (str | None): curseur de la page suivante
+            (`None` s'il s'agit de la dernière)
+    """
+
+    items: list[ReloadSchema]
+    next_cursor: str | None
+
+
 class PurchaseFilterSchema(FilterSchema):
     """
     Schéma de filtrage pour les recherches d'achats.
@@ -0,0 +1,106 @@
+"""
+Reversement des achats aux fondations.
+
+Chaque achat est associé à la fondation à laquelle revient son montant
+([Purchase.foundation][transaction.models.Purchase]).
+Le décompte de ce qui est dû à chaque fondation sur une période
+est calculé en un seul regroupement par fondation, article et intervalle
+(heure, jour, semaine ou mois), à partir des agrégats horaires
+complétés par les achats non encore agrégés (voir [transaction.rollups][]) :
+sa durée dépend du nombre d'agrégats et non du nombre d'achats de la période.
+
+Le décompte est envoyé au format CSV, trié par fondation, article et intervalle,
+avec après les lignes de chaque fondation une ligne dont l'article est `Total`
+(sans intervalle), contenant le montant qui lui est dû.
+
+Examples:
+    ```bash
+    python manage.py settlement --after 2024-09-01 --by day > reversement.csv
+    ```
+"""
+import csv
+from collections.abc import Iterator
+from decimal import Decimal
+from itertools import groupby
+from typing import Literal
+
+from django.db.models import DateTimeField
+from django.db.models.functions import Trunc
+
+from article.models import Article, Foundation
+from transaction.rollups import group_purchases
+from transaction.schemas import PurchaseFilterSchema
+
+Interval = Literal["hour", "day", "week", "month"]
+
+SETTLEMENT_HEADER = ["foundation", "article", "period", "count", "total"]
+
+
+def settlement(filters: PurchaseFilterSchema, interval: Interval = "day") -> list[dict]:
+    """
+    Calcule le nombre et le montant total des achats correspondant aux filtres
+    donnés, par fondation, article et intervalle.
+
+    Args:
+        filters: les filtres à appliquer
+        interval: la durée des intervalles (dans le fuseau horaire courant)
+
+    Returns:
+        Une liste de dictionnaires contenant le nom de la fondation (`foundation`),
+        le nom de l'article (`article`), le début de l'intervalle (`period`),
+        le nombre d'achats (`count`) et leur montant total (`total`),
+        triée par fondation, article et intervalle.
+    """
+    keys = ["foundation_id", "article_id", "period"]
+    groups = group_purchases(
+        filters, keys, period=Trunc("date", interval, output_field=DateTimeField())
+    )
+    # les noms sont récupérés à part pour ne pas regrouper les achats par nom
+    foundations = Foundation.objects.in_bulk({g["foundation_id"] for g in groups})
+    articles = Article.objects.in_bulk({g["article_id"] for g in groups})
+    rows = [
+        {
+            "foundation": foundations[group["foundation_id"]].name,
+            "article": articles[group["article_id"]].name,
+            "period": group["period"],
+            "count": group["count"],
+            "total": group["total"],
+        }
+        for group in groups
+    ]
+    rows.sort(key=lambda row: (row["foundation"], row["article"], row["period"]))
+    return rows
+
+
+class _Echo:
+    """
+    Pseudo-fichier retournant ce qui y est écrit,
+    pour produire le CSV ligne par ligne.
+    """
+
+    def write(self, value: str) -> str:
+        return value
+
+
+def settlement_csv(rows: list[dict]) -> Iterator[str]:
+    """
+    Produit le décompte calculé par [settlement][transaction.settlement.settlement]
+    au format CSV, ligne par ligne, avec le total de chaque fondation.
+    """
+    writer = csv.writer(_Echo())
+    yield writer.writerow(SETTLEMENT_HEADER)
+    for foundation, group in groupby(rows, key=lambda row: row["foundation"]):
+        count, total = 0, Decimal(0)
+        for row in group:
+            count += row["count"]
+            total += row["total"]
+            yield writer.writerow(
+                [
+                    foundation,
+                    row["article"],
+                    row["period"].isoformat(),
+                    row["count"],
+                    row["total"],
+                ]
+            )
+        yield writer.writerow([foundation, "Total", "", count, total])
@@ -0,0 +1,219 @@
+import orjson
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from article.pricing import price_matrix
+from transaction.models import Cart, Purchase
+from transaction.tests.test_cart import SaleTestCase, create_priced_article
+from users.models import User
+
+
+class PurchaseBatchTestCase(SaleTestCase):
+    amount = "2.00"
+    credit = 3
+    customer_count = 4
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.seller)
+
+    def post_batch(self, purchases: list[dict]) -> list[dict]:
+        res = self.client.post(
+            "/api/purchase/batch", purchases, content_type="application/json"
+        )
+        self.assertEqual(res.status_code, 200)
+        return res.json()
+
+    def purchase(self, buyer: User, n: int = 1) -> dict:
+        return {
+            "buyer_id": buyer.pk,
+            "selling_point_id": self.point.pk,
+            "articles": [self.price.article_id] * n,
+        }
+
+    def test_batch(self):
+        """
+        Test que chaque achat d'un lot réussit ou échoue indépendamment des autres.
+        """
+        first, second = self.customers[:2]
+        results = self.post_batch(
+            [
+                self.purchase(first),
+                self.purchase(first),  # plus assez de crédit
+                {**self.purchase(second), "selling_point_id": 9999},
+                self.purchase(second),
+            ]
+        )
+        self.assertEqual([r["status"] for r in results], [200, 402, 404, 200])
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.credit, second.credit), (1, 1))
+        self.assertEqual(Purchase.objects.filter(seller=self.seller).count(), 2)
+
+    def test_constant_number_of_queries(self):
+        """
+        Test que le nombre de requêtes ne dépend pas de la taille du lot.
+        """
+        price_matrix.resolve([])  # chargement de la matrice des prix
+        with CaptureQueriesContext(connection) as small:
+            self.post_batch([self.purchase(self.customers[0])])
+        with CaptureQueriesContext(connection) as large:
+            self.post_batch([self.purchase(c) for c in self.customers[1:]])
+        self.assertEqual(len(small), len(large))
+
+
+class IdempotencyTestCase(SaleTestCase):
+    credit = 5
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.seller)
+
+    def test_purchase_replay(self):
+        """
+        Test qu'un achat renvoyé avec la même clef n'est effectué qu'une fois.
+        """
+        body = {
+            "buyer_id": self.customer.pk,
+            "selling_point_id": self.point.pk,
+            "articles": [self.price.article_id],
+        }
+        for _ in range(2):
+            res = self.client.post(
+                "/api/purchase",
+                body,
+                content_type="application/json",
+                HTTP_IDEMPOTENCY_KEY="achat-1",
+            )
+            self.assertEqual(res.status_code, 200)
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.credit, 4)
+        self.assertEqual(Purchase.objects.filter(buyer=self.customer).count(), 1)
+
+    def test_reload_replay(self):
+        """
+        Test qu'un rechargement renvoyé avec la même clef n'est effectué qu'une fois
+        et que la réponse du premier est retournée.
+        """
+        body = {
+            "buyer_id": self.customer.pk,
+            "selling_point_id": self.point.pk,
+            "amount": "10.00",
+        }
+        responses = [
+            self.client.post(
+                "/api/reload",
+                body,
+                content_type="application/json",
+                HTTP_IDEMPOTENCY_KEY="recharge-1",
+            ).json()
+            for _ in range(2)
+        ]
+        self.assertEqual(responses[0], responses[1])
+        self.assertEqual(responses[0]["credit"], 15)
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.credit, 15)
+
+
+class PurchaseQuantityTestCase(SaleTestCase):
+    credit = 20
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.beer = cls.price
+        cls.crisps = create_priced_article(cls.group, "0.50")
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.seller)
+
+    def test_quantities(self):
+        """
+        Test qu'un article peut être acheté en plusieurs exemplaires,
+        en donnant sa quantité ou en répétant son id.
+        """
+        res = self.client.post(
+            "/api/purchase",
+            {
+                "buyer_id": self.customer.pk,
+                "selling_point_id": self.point.pk,
+                "articles": [
+                    {"id": self.beer.article_id, "quantity": 10},
+                    self.crisps.article_id,
+                    self.crisps.article_id,
+                ],
+            },
+            content_type="application/json",
+        )
+        self.assertEqual(res.status_code, 200)
+        purchases = Purchase.objects.filter(buyer=self.customer)
+        self.assertEqual(purchases.filter(article=self.beer.article).count(), 10)
+        self.assertEqual(purchases.filter(article=self.crisps.article).count(), 2)
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.credit, 9)
+
+
+class PurchaseListTestCase(SaleTestCase):
+    credit = 10
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        price_matrix.clear()
+        cart = Cart(cls.customer, cls.seller, cls.point)
+        cart.add_articles([cls.price.article_id] * 5)
+        cart.save()
+        cls.ids = list(
+            Purchase.objects.filter(buyer=cls.customer)
+            .order_by("date", "pk")
+            .values_list("pk", flat=True)
+        )
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.seller)
+        self.async_client.force_login(self.seller)
+
+    def test_keyset_pagination(self):
+        """
+        Test que le parcours des pages par curseur retourne chaque achat une fois.
+        """
+        ids, params = [], {"buyer_id": self.customer.pk, "limit": 2}
+        while True:
+            page = self.client.get("/api/purchase", params).json()
+            ids += [p["id"] for p in page["items"]]
+            if page["next_cursor"] is None:
+                break
+            params["cursor"] = page["next_cursor"]
+        self.assertEqual(ids, self.ids)
+
+    def test_invalid_cursor(self):
+        res = self.client.get("/api/purchase", {"cursor": "pas un curseur"})
+        self.assertEqual(res.status_code, 422)
+
+    def test_export(self):
+        """
+        Test que l'export en flux contient les mêmes achats
+        au format NDJSON et au format JSON.
+        """
+        params = {"buyer_id": self.customer.pk}
+        res = self.client.get("/api/purchase/export", params)
+        self.assertEqual(res["Content-Type"], "application/x-ndjson")
+        lines = b"".join(res.streaming_content).splitlines()
+        rows = [orjson.loads(line) for line in lines]
+        self.assertEqual([r["id"] for r in rows], self.ids)
+        self.assertEqual(rows[0]["price"], 1.0)
+        res = self.client.get("/api/purchase/export", {**params, "format": "json"})
+        self.assertEqual(orjson.loads(b"".join(res.streaming_content)), rows)
+
+    async def test_export_asgi(self):
+        """
+        Test que sous ASGI l'export est envoyé par un générateur asynchrone,
+        que Django n'a pas à lire entièrement avant de l'envoyer.
+        """
+        params = {"buyer_id": self.customer.pk, "format": "json"}
+        res = await self.async_client.get("/api/purchase/export", params)
+        self.assertTrue(res.is_async)
+        content = b"".join([part async for part in res.streaming_content])
+        self.assertEqual([r["id"] for r in orjson.loads(content)], self.ids)
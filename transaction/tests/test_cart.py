@@ -0,0 +1,230 @@
+import threading
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import Group
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase
+from django.utils.timezone import now
+
+from article.catalogue import catalogue_snapshots
+from article.models import Article, Category, Foundation, Period, Price
+from article.pricing import price_matrix
+from buckutt.metrics import cart_size, sales_amount
+from buckutt.tests import sample
+from selling_points.models import SellingPoint
+from transaction.exceptions import NotEnoughCredit, OutOfStock
+from transaction.models import Cart, Purchase
+from users.memberships import user_groups
+from users.models import User
+
+
+def create_priced_article(group: Group, amount: Decimal | str) -> Price:
+    """
+    Crée un article vendu au montant donné aux membres du groupe donné.
+    """
+    category, _ = Category.objects.get_or_create(name="Test")
+    foundation, _ = Foundation.objects.get_or_create(
+        name="Test", defaults={"website": "https://example.com", "mail": "t@t.fr"}
+    )
+    period, _ = Period.objects.get_or_create(
+        name="Période test",
+        defaults={
+            "start": now() - timedelta(hours=1),
+            "end": now() + timedelta(hours=1),
+        },
+    )
+    article = Article.objects.create(name=f"Article {amount}", category=category)
+    return Price.objects.create(
+        article=article,
+        group=group,
+        foundation=foundation,
+        period=period,
+        amount=amount,
+    )
+
+
+class SaleTestCase(TestCase):
+    """
+    Base des tests de vente.
+
+    Crée un article vendu au prix `amount` aux membres d'un groupe (`price`),
+    `customer_count` clients de ce groupe disposant chacun de `credit` euros
+    (`customers`, dont le premier est aussi `customer`),
+    un vendeur (`seller`) et un point de vente (`point`).
+    """
+
+    amount = "1.00"
+    credit = 0
+    customer_count = 1
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.group = Group.objects.first()
+        cls.price = create_priced_article(cls.group, cls.amount)
+        cls.customers = [
+            User.objects.create(username=f"client_{i}", pin="0", credit=cls.credit)
+            for i in range(cls.customer_count)
+        ]
+        for customer in cls.customers:
+            customer.groups.add(cls.group)
+        cls.customer = cls.customers[0]
+        cls.seller = User.objects.create(username="vendeur", pin="0")
+        cls.point = SellingPoint.objects.create(name="Bar")
+
+    def setUp(self):
+        price_matrix.clear()
+        user_groups.clear()
+
+
+class CartTestCase(SaleTestCase):
+    amount = "1.50"
+    credit = 5
+
+    def test_save(self):
+        """
+        Test que l'enregistrement d'un panier crée les achats
+        et débite le compte de l'acheteur.
+        """
+        cart = Cart(self.customer, self.seller, self.point)
+        cart.add_articles([self.price.article_id, self.price.article_id])
+        cart.save()
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.credit, 2)
+        purchases = Purchase.objects.filter(buyer=self.customer)
+        self.assertEqual(len(purchases), 2)
+        self.assertTrue(all(p.applied_price_id == self.price.pk for p in purchases))
+
+    def test_sale_metrics(self):
+        """
+        Test que la taille et le montant d'un panier sont mesurés
+        par point de vente, une fois la transaction validée.
+        """
+        point = str(self.point.pk)
+        cart = Cart(self.customer, self.seller, self.point)
+        cart.add_articles([self.price.article_id, self.price.article_id])
+        with self.captureOnCommitCallbacks(execute=True):
+            cart.save()
+            self.assertEqual(sample(sales_amount, sales_amount.name, point=point), 0)
+        self.assertEqual(sample(sales_amount, sales_amount.name, point=point), 3)
+        self.assertEqual(sample(cart_size, "buckutt_cart_size_sum", point=point), 2)
+
+    def test_not_enough_credit(self):
+        """
+        Test qu'un panier trop cher n'est pas enregistré.
+        """
+        cart = Cart(self.customer, self.seller, self.point)
+        cart.add_articles([self.price.article_id] * 4)
+        with self.assertRaises(NotEnoughCredit), transaction.atomic():
+            cart.save()
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.credit, 5)
+        self.assertFalse(Purchase.objects.filter(buyer=self.customer).exists())
+
+
+class ConcurrentDebitTestCase(TransactionTestCase):
+    def setUp(self):
+        group = Group.objects.create(name="Concurrence")
+        self.price = create_priced_article(group, "1.00")
+        self.customer = User.objects.create(username="client", pin="0", credit=50)
+        self.customer.groups.add(group)
+        self.seller = User.objects.create(username="vendeur", pin="0")
+        self.point = SellingPoint.objects.create(name="Bar")
+
+    def test_concurrent_carts(self):
+        """
+        Test que de nombreux terminaux débitant le même compte en même temps
+        ne dépensent jamais plus que son crédit,
+        et que le solde final correspond aux achats enregistrés.
+        """
+        n_threads, n_carts = 8, 10
+        successes = []
+        barrier = threading.Barrier(n_threads)
+
+        def sell():
+            customer = User.objects.get(pk=self.customer.pk)
+            barrier.wait()
+            try:
+                for _ in range(n_carts):
+                    cart = Cart(customer, self.seller, self.point)
+                    cart.add_articles([self.price.article_id])
+                    try:
+                        with transaction.atomic():
+                            cart.save()
+                        successes.append(1)
+                    except NotEnoughCredit:
+                        pass
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=sell) for _ in range(n_threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.customer.refresh_from_db()
+        self.assertEqual(len(successes), 50)
+        self.assertEqual(self.customer.credit, 0)
+        self.assertEqual(Purchase.objects.filter(buyer=self.customer).count(), 50)
+
+
+class StockTestCase(SaleTestCase):
+    credit = 10
+    customer_count = 2
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        Article.objects.filter(pk=cls.price.article_id).update(stock=3)
+
+    def cart(self, customer: User, n: int) -> Cart:
+        cart = Cart(customer, self.seller, self.point)
+        cart.add_quantities({self.price.article_id: n})
+        return cart
+
+    def stock(self) -> int:
+        return Article.objects.get(pk=self.price.article_id).stock
+
+    def test_decrement(self):
+        """
+        Test qu'une vente décrémente le stock
+        et qu'une vente dépassant le stock est annulée.
+        """
+        self.cart(self.customers[0], 2).save()
+        self.assertEqual(self.stock(), 1)
+        with self.assertRaises(OutOfStock), transaction.atomic():
+            self.cart(self.customers[1], 2).save()
+        self.assertEqual(self.stock(), 1)
+        self.customers[1].refresh_from_db()
+        self.assertEqual(self.customers[1].credit, 10)
+        self.assertFalse(Purchase.objects.filter(buyer=self.customers[1]).exists())
+
+    def test_catalogue_invalidated_when_sold_out(self):
+        """
+        Test qu'une vente n'invalide les instantanés du catalogue
+        que si elle épuise le stock d'un article.
+        """
+        catalogue_snapshots.clear()
+        group_ids = frozenset([self.group.pk])
+        catalogue_snapshots.build(self.point.pk, group_ids)
+        self.cart(self.customers[0], 2).save()
+        self.assertIsNotNone(catalogue_snapshots.get(self.point.pk, group_ids))
+        self.cart(self.customers[0], 1).save()
+        self.assertIsNone(catalogue_snapshots.get(self.point.pk, group_ids))
+
+    def test_save_many(self):
+        """
+        Test que les paniers d'un lot sont servis dans l'ordre
+        tant que le stock le permet.
+        """
+        first, second = self.customers
+        errors = Cart.save_many(
+            [self.cart(first, 2), self.cart(second, 2), self.cart(second, 1)]
+        )
+        self.assertIsNone(errors[0])
+        self.assertIsInstance(errors[1], OutOfStock)
+        self.assertIsNone(errors[2])
+        self.assertEqual(self.stock(), 0)
+        second.refresh_from_db()
+        self.assertEqual(second.credit, 9)
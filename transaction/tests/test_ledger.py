@@ -0,0 +1,147 @@
+from datetime import timedelta
+
+from django.db.models import Max
+from django.utils.timezone import now
+
+from transaction.ledger import open_ledger, verify_ledger
+from transaction.models import Cart, LedgerCheckpoint, LedgerEntry, Purchase, Reload
+from transaction.tests.test_cart import SaleTestCase
+from users.models import User
+
+
+class LedgerTestCase(SaleTestCase):
+    amount = "1.50"
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # les données des fixtures sont antérieures au registre
+        cls.checkpoint = LedgerCheckpoint.objects.create(
+            last_entry=LedgerEntry.objects.aggregate(m=Max("pk"))["m"] or 0,
+            last_purchase=Purchase.objects.aggregate(m=Max("pk"))["m"] or 0,
+            last_reload=Reload.objects.aggregate(m=Max("pk"))["m"] or 0,
+        )
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.seller)
+
+    def reload(self, amount: str):
+        res = self.client.post(
+            "/api/reload",
+            {
+                "buyer_id": self.customer.pk,
+                "selling_point_id": self.point.pk,
+                "amount": amount,
+            },
+            content_type="application/json",
+        )
+        self.assertEqual(res.status_code, 200)
+
+    def cart_of(self, n: int) -> Cart:
+        cart = Cart(self.customer, self.seller, self.point)
+        cart.add_articles([self.price.article_id] * n)
+        return cart
+
+    def sell(self, n: int):
+        self.cart_of(n).save()
+
+    def verify(self, since: LedgerCheckpoint | None = None):
+        return verify_ledger(since or self.checkpoint, now() + timedelta(seconds=1))
+
+    def test_entries(self):
+        """
+        Test que chaque modification du crédit est inscrite au registre
+        avec le solde qui en résulte.
+        """
+        self.reload("10.00")
+        self.sell(2)
+        Cart.save_many([self.cart_of(1), self.cart_of(1)])
+        entries = LedgerEntry.objects.filter(user=self.customer).order_by("pk")
+        self.assertEqual(
+            [(e.kind, e.amount, e.balance) for e in entries],
+            [
+                (LedgerEntry.Kind.RELOAD, 10, 10),
+                (LedgerEntry.Kind.PURCHASE, -3, 7),
+                (LedgerEntry.Kind.PURCHASE, -3, 4),
+            ],
+        )
+        checkpoint, errors = self.verify()
+        self.assertEqual(errors, [])
+        self.assertEqual(checkpoint.last_entry, entries.last().pk)
+
+    def test_open_ledger(self):
+        """
+        Test que l'ouverture du registre inscrit le crédit des utilisateurs
+        (comme après le chargement des fixtures par reset_db).
+        """
+        LedgerCheckpoint.objects.all().delete()
+        User.objects.filter(pk=self.customer.pk).update(credit=4)
+        _, errors = verify_ledger(self.checkpoint, now(), all_users=True)
+        self.assertTrue(errors)
+        checkpoint = open_ledger()
+        _, errors = verify_ledger(checkpoint, now() + timedelta(seconds=1), True)
+        self.assertEqual(errors, [])
+        self.sell(2)
+        self.assertEqual(self.verify(checkpoint)[1], [])
+
+    def test_incremental(self):
+        """
+        Test que la vérification reprend au point de reprise
+        et détecte les modifications du crédit hors registre.
+        """
+        self.reload("10.00")
+        checkpoint, errors = self.verify()
+        self.assertEqual(errors, [])
+        checkpoint.save()
+        self.sell(1)
+        User.objects.filter(pk=self.customer.pk).update(credit=100)
+        _, errors = self.verify(checkpoint)
+        self.assertEqual(
+            errors,
+            [f"Utilisateur {self.customer.pk} : crédit 100.00€ au lieu de 8.50€"],
+        )
+
+    def test_out_of_order_dates(self):
+        """
+        Test qu'une ligne dont la date est postérieure à celle d'une ligne
+        insérée après elle est vérifiée avant le point de reprise suivant.
+        """
+        self.reload("10.00")
+        self.sell(1)
+        reload, purchase = LedgerEntry.objects.filter(user=self.customer).order_by("pk")
+        until = now()
+        # la première écriture, erronée, a été datée après la seconde
+        LedgerEntry.objects.filter(pk=reload.pk).update(date=until, balance=9)
+        LedgerEntry.objects.filter(pk=purchase.pk).update(
+            date=until - timedelta(seconds=1)
+        )
+        checkpoint, errors = verify_ledger(self.checkpoint, until)
+        self.assertEqual(checkpoint.last_entry, purchase.pk)
+        self.assertEqual(
+            errors[0], f"Écriture {reload.pk} : solde 9.00€ au lieu de 10.00€"
+        )
+
+    def test_broken_entries(self):
+        """
+        Test que les écritures incohérentes et les achats sans écriture
+        sont détectés.
+        """
+        self.reload("10.00")
+        entry = LedgerEntry.objects.create(
+            user=self.customer, kind=LedgerEntry.Kind.PURCHASE, amount=-1, balance=8
+        )
+        Purchase.objects.create(
+            price=1,
+            buyer=self.customer,
+            seller=self.seller,
+            article_id=self.price.article_id,
+            point=self.point,
+            foundation_id=self.price.foundation_id,
+        )
+        User.objects.filter(pk=self.customer.pk).update(credit=8)
+        _, errors = self.verify()
+        self.assertEqual(len(errors), 3)
+        self.assertTrue(errors[0].startswith(f"Écriture {entry.pk} : solde"))
+        self.assertTrue(errors[1].startswith(f"Écriture {entry.pk} : montant"))
+        self.assertTrue(errors[2].endswith("sans écriture"))
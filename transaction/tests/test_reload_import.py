@@ -0,0 +1,144 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError, transaction
+from django.db.models import Max, Sum
+from django.utils.timezone import now
+
+from transaction.ledger import verify_ledger
+from transaction.models import LedgerCheckpoint, Purchase, Reload
+from transaction.tests.test_cart import SaleTestCase
+from users.models import User
+
+
+class ReloadImportTestCase(SaleTestCase):
+    customer_count = 2
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # les données des fixtures sont antérieures au registre
+        cls.checkpoint = LedgerCheckpoint.objects.create(
+            last_purchase=Purchase.objects.aggregate(m=Max("pk"))["m"] or 0,
+            last_reload=Reload.objects.aggregate(m=Max("pk"))["m"] or 0,
+        )
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.seller)
+
+    def import_file(self, content: str) -> dict:
+        res = self.client.post(
+            f"/api/reload/import?selling_point_id={self.point.pk}",
+            {"file": SimpleUploadedFile("terminal.csv", content.encode())},
+        )
+        self.assertEqual(res.status_code, 200, res.content)
+        return res.json()
+
+    def test_requires_seller(self):
+        """
+        Test qu'un import non authentifié est refusé.
+        """
+        self.client.logout()
+        res = self.client.post(
+            f"/api/reload/import?selling_point_id={self.point.pk}",
+            {"file": SimpleUploadedFile("terminal.csv", b"date;trace;buyer;amount\n")},
+        )
+        self.assertEqual(res.status_code, 401)
+        self.assertFalse(Reload.objects.filter(point=self.point).exists())
+
+    def test_import(self):
+        """
+        Test que les paiements valides sont importés une seule fois
+        et que les autres lignes sont rejetées.
+        """
+        first, second = self.customers
+        report = self.import_file(
+            "date;trace;buyer;amount\n"
+            f"2024-09-01;T1;{first.pk};10,00\n"
+            f"2024-09-01;T2;{first.pk};5.50\n"
+            f"2024-09-01;T3;{second.pk};20\n"
+            f"2024-09-01;T1;{second.pk};20\n"
+            "2024-09-01;T4;999999;20\n"
+            f"2024-09-01;T5;{second.pk};1.001\n"
+            f"2024-09-01;;{second.pk};1\n"
+        )
+        self.assertEqual(report["imported"], 3)
+        self.assertEqual(report["total"], 35.5)
+        self.assertEqual(
+            [(r["line"], r["reason"]) for r in report["rejects"]],
+            [
+                (5, "Duplicate trace in file"),
+                (6, "Unknown buyer"),
+                (7, "Invalid amount"),
+                (8, "Invalid trace"),
+            ],
+        )
+        first.refresh_from_db()
+        self.assertEqual(first.credit, Decimal("15.50"))
+        report = self.import_file(f"trace,buyer,amount\nT3,{second.pk},20\n")
+        self.assertEqual(report["imported"], 0)
+        self.assertEqual(report["rejects"][0]["reason"], "Trace already imported")
+        second.refresh_from_db()
+        self.assertEqual(second.credit, 20)
+        total = User.objects.aggregate(total=Sum("credit"))["total"]
+        self.assertEqual(User.objects.total_credit(), total)
+        _, errors = verify_ledger(self.checkpoint, now() + timedelta(seconds=1))
+        self.assertEqual(errors, [])
+
+    def test_invalid_buyer(self):
+        """
+        Test que les acheteurs qui ne sont pas des ids valides sont rejetés.
+        """
+        buyers = ["abc", "²", "١٢", "0", "9" * 30]
+        report = self.import_file(
+            "trace,buyer,amount\n"
+            + "".join(f"T{i},{buyer},10\n" for i, buyer in enumerate(buyers))
+        )
+        self.assertEqual(report["imported"], 0)
+        self.assertEqual(
+            [r["reason"] for r in report["rejects"]], ["Invalid buyer"] * len(buyers)
+        )
+
+    def test_invalid_file(self):
+        """
+        Test qu'un fichier sans les colonnes attendues est refusé.
+        """
+        res = self.client.post(
+            f"/api/reload/import?selling_point_id={self.point.pk}",
+            {"file": SimpleUploadedFile("terminal.csv", b"trace,amount\nT1,10\n")},
+        )
+        self.assertEqual(res.status_code, 400)
+        self.assertFalse(Reload.objects.filter(trace="T1").exists())
+
+    def test_duplicate_trace(self):
+        """
+        Test qu'un paiement ne peut pas créditer deux rechargements.
+        """
+        body = {
+            "buyer_id": self.customers[0].pk,
+            "selling_point_id": self.point.pk,
+            "amount": "10.00",
+            "trace": "T1",
+        }
+        for status in (200, 409):
+            res = self.client.post("/api/reload", body, content_type="application/json")
+            self.assertEqual(res.status_code, status)
+        self.customers[0].refresh_from_db()
+        self.assertEqual(self.customers[0].credit, 10)
+
+    def test_other_integrity_errors(self):
+        """
+        Test que seule la violation de l'unicité des références de paiement
+        est prise pour une référence déjà utilisée.
+        """
+        fields = {"buyer": self.customer, "seller": self.seller, "point": self.point}
+        reload = Reload.objects.create(**fields, amount=1, trace="T1")
+        for conflict, duplicate in (
+            ({"trace": "T1"}, True),
+            ({"pk": reload.pk}, False),
+        ):
+            with self.assertRaises(IntegrityError) as error, transaction.atomic():
+                Reload.objects.create(**fields, amount=1, **conflict)
+            self.assertEqual(Reload.is_duplicate_trace(error.exception), duplicate)
@@ -0,0 +1,87 @@
+from datetime import timedelta
+
+from django.utils.timezone import now
+
+from transaction.models import Purchase, PurchaseRollup, Reload
+from transaction.rollups import PURCHASES, RELOADS, catch_up, floor_hour
+from transaction.tests.test_cart import SaleTestCase
+
+
+class RollupTestCase(SaleTestCase):
+    amount = "1.50"
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # un achat et un rechargement toutes les 20 minutes pendant 10 heures
+        cls.start = floor_hour(now()) - timedelta(hours=10)
+        dates = [cls.start + i * timedelta(minutes=20) for i in range(30)]
+        purchases = Purchase.objects.bulk_create(
+            Purchase(
+                price=cls.price.amount,
+                buyer=cls.customer,
+                seller=cls.seller,
+                article_id=cls.price.article_id,
+                point=cls.point,
+                foundation_id=cls.price.foundation_id,
+            )
+            for _ in dates
+        )
+        reloads = Reload.objects.bulk_create(
+            Reload(amount=10, buyer=cls.customer, seller=cls.seller, point=cls.point)
+            for _ in dates
+        )
+        for rows in (purchases, reloads):
+            for row, date in zip(rows, dates, strict=True):
+                row.date = date
+            type(rows[0]).objects.bulk_update(rows, ["date"])
+
+    def summaries(self, params: dict) -> tuple[list, list]:
+        params = {"buyer_id": self.customer.pk, **params}
+        return tuple(
+            self.client.get(f"/api/{name}/summary", params).json()
+            for name in ("purchase", "reload")
+        )
+
+    def test_catch_up(self):
+        """
+        Test que seules les heures terminées sont agrégées, une seule fois.
+        """
+        until = self.start + timedelta(hours=6, minutes=30)
+        self.assertEqual(catch_up(PURCHASES, until), self.start + timedelta(hours=6))
+        self.assertEqual(catch_up(PURCHASES, until), self.start + timedelta(hours=6))
+        rollups = PurchaseRollup.objects.filter(point=self.point)
+        self.assertEqual(rollups.count(), 6)
+        self.assertEqual(sum(r.count for r in rollups), 18)
+
+    def test_summary_matches_raw_rows(self):
+        """
+        Test que les résumés calculés à partir des agrégats
+        sont identiques à ceux calculés à partir des lignes brutes,
+        quelles que soient les bornes de la période.
+        """
+        periods = [
+            {},
+            {"after_date": self.start + timedelta(minutes=50)},
+            {"before_date": self.start + timedelta(hours=3)},
+            {
+                "after_date": self.start + timedelta(hours=1),
+                "before_date": self.start + timedelta(hours=7, minutes=40),
+            },
+            {
+                "after_date": self.start + timedelta(hours=2, minutes=10),
+                "before_date": self.start + timedelta(hours=2, minutes=30),
+            },
+        ]
+        periods = [{k: v.isoformat() for k, v in p.items()} for p in periods]
+        # avec un acheteur, les résumés sont calculés à partir des lignes brutes
+        expected = [self.summaries(p) for p in periods]
+        for rollup in (PURCHASES, RELOADS):
+            catch_up(rollup, self.start + timedelta(hours=8, minutes=5))
+        for period, (purchases, reloads) in zip(periods, expected, strict=True):
+            res = self.client.get("/api/purchase/summary", period).json()
+            self.assertEqual(
+                [r for r in res if r["point_name"] == "Bar"], purchases, period
+            )
+            res = self.client.get("/api/reload/summary", period).json()
+            self.assertEqual([r for r in res if r["point_name"] == "Bar"], reloads)
@@ -0,0 +1,104 @@
+import csv
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth.models import Group
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils.timezone import now
+
+from article.models import Foundation
+from selling_points.models import SellingPoint
+from transaction.models import Purchase
+from transaction.rollups import PURCHASES, catch_up, floor_hour
+from transaction.tests.test_cart import create_priced_article
+from users.models import User
+
+
+class SettlementTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        group = Group.objects.first()
+        cls.beer = create_priced_article(group, "2.00")
+        cls.soda = create_priced_article(group, "1.00")
+        cls.soda.foundation = Foundation.objects.create(
+            name="Autre", website="https://example.com", mail="autre@example.com"
+        )
+        cls.soda.save()
+        buyer = User.objects.create(username="client", pin="0")
+        point = SellingPoint.objects.create(name="Bar")
+        # un achat de chaque article toutes les 30 minutes pendant 6 heures
+        cls.start = floor_hour(now()) - timedelta(hours=6)
+        dates = [cls.start + i * timedelta(minutes=30) for i in range(12)]
+        purchases = Purchase.objects.bulk_create(
+            Purchase(
+                price=price.amount,
+                buyer=buyer,
+                seller=buyer,
+                article_id=price.article_id,
+                point=point,
+                foundation_id=price.foundation_id,
+            )
+            for _ in dates
+            for price in (cls.beer, cls.soda)
+        )
+        for i, purchase in enumerate(purchases):
+            purchase.date = dates[i // 2]
+        Purchase.objects.bulk_update(purchases, ["date"])
+
+    def settlement(self, params: dict) -> list[list[str]]:
+        params = {"after_date": self.start.isoformat(), **params}
+        response = self.client.get("/api/treasury/settlement", params)
+        self.assertEqual(response["Content-Type"], "text/csv")
+        return list(csv.reader(StringIO(b"".join(response.streaming_content).decode())))
+
+    def test_settlement(self):
+        """
+        Test le décompte par fondation, article et intervalle,
+        et le total de chaque fondation.
+        """
+        rows = self.settlement({"interval": "hour"})
+        self.assertEqual(rows[0], ["foundation", "article", "period", "count", "total"])
+        autre, test = rows[1:8], rows[8:]
+        self.assertEqual(len(test), 7)
+        self.assertEqual(autre[0][:2], ["Autre", "Article 1.00"])
+        self.assertEqual(autre[0][3:], ["2", "2.00"])
+        self.assertEqual(autre[-1], ["Autre", "Total", "", "12", "12.00"])
+        self.assertEqual(test[-1], ["Test", "Total", "", "12", "24.00"])
+        rows = self.settlement({"foundation_id": self.soda.foundation_id})
+        self.assertEqual([row[0] for row in rows[1:]], ["Autre"] * len(rows[1:]))
+
+    async def test_settlement_asgi(self):
+        """
+        Test que sous ASGI le décompte est envoyé par un générateur asynchrone.
+        """
+        params = {"after_date": self.start.isoformat()}
+        response = await self.async_client.get("/api/treasury/settlement", params)
+        self.assertTrue(response.is_async)
+        content = b"".join([part async for part in response.streaming_content])
+        self.assertEqual(content.decode().splitlines()[-1], "Test,Total,,12,24.00")
+
+    def test_settlement_matches_raw_rows(self):
+        """
+        Test que le décompte calculé à partir des agrégats est identique
+        à celui calculé à partir des lignes brutes.
+        """
+        params = {
+            "after_date": (self.start + timedelta(minutes=40)).isoformat(),
+            "before_date": (self.start + timedelta(hours=5, minutes=10)).isoformat(),
+            "interval": "hour",
+        }
+        expected = self.settlement(params)
+        catch_up(PURCHASES, self.start + timedelta(hours=5, minutes=5))
+        with self.assertNumQueries(5):
+            self.assertEqual(self.settlement(params), expected)
+
+    def test_command(self):
+        """
+        Test que la commande affiche le même décompte que l'API.
+        """
+        out = StringIO()
+        call_command("settlement", "--after", self.start.isoformat(), stdout=out)
+        self.assertEqual(
+            list(csv.reader(StringIO(out.getvalue()))), self.settlement({})
+        )
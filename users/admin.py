@@ -7,3 +7,6 @@ from .models import User
 class UserAdmin(admin.ModelAdmin):
     list_display = ("username", "nickname", "credit")
     search_fields = ("username", "nickname")
+    # le crédit n'est modifié que par des achats et des rechargements,
+    # qui tiennent à jour le compteur du crédit total et le registre des soldes
+    readonly_fields = ("credit",)
@@ -0,0 +1,90 @@
+import orjson
+from django.http import Http404, HttpResponse
+from django.shortcuts import get_object_or_404
+from ninja_extra.controllers import ControllerBase, api_controller, route
+
+from article.catalogue import catalogue_snapshots
+from buckutt.profiling import query_budget, set_selling_point
+from buckutt.types import PrimaryKey
+from selling_points.models import SellingPoint
+from users.cards import card_cache
+from users.memberships import user_groups
+from users.schemas import CardUserSchema, TapSchema
+
+
+def _card_user(card_id: str) -> dict:
+    """
+    Retourne le titulaire de la carte, son crédit et ses groupes.
+
+    Raises:
+        Http404: si aucun utilisateur n'a cette carte
+    """
+    resolved = card_cache.resolve(card_id)
+    if resolved is None:
+        raise Http404
+    holder, credit = resolved
+    return {
+        **holder._asdict(),
+        "group_ids": sorted(user_groups.get(holder.id)),
+        "credit": credit,
+    }
+
+
+@api_controller("/user")
+class UserController(ControllerBase):
+    """
+    Contrôleur pour les utilisateurs.
+    """
+
+    @route.get("/card/{card_id}", response=CardUserSchema)
+    @query_budget(2)
+    def fetch_by_card(self, card_id: str):
+        """
+        Retrouve l'utilisateur à qui appartient une carte.
+
+        Le titulaire de la carte est résolu depuis le cache des cartes
+        ([CardCache][users.cards.CardCache]) et ses groupes depuis celui
+        des groupes ([GroupMemberships][users.memberships.GroupMemberships]) :
+        pour une carte déjà vue, seul le crédit de l'utilisateur
+        est lu dans la base de données.
+
+        Retourne l'utilisateur, son crédit et ses groupes sérialisés
+        sous la forme d'un [CardUserSchema][users.schemas.CardUserSchema].
+
+        Args:
+            card_id: l'identifiant de la carte
+        """
+        return _card_user(card_id)
+
+    @route.get("/tap/{card_id}", response=TapSchema)
+    @query_budget(5)
+    def tap(self, card_id: str, selling_point_id: PrimaryKey):
+        """
+        Retourne tout ce dont un terminal a besoin quand un client passe sa carte :
+        l'utilisateur, son crédit et le catalogue du point de vente
+        avec ses prix, en une seule requête.
+
+        L'utilisateur est résolu comme dans
+        [fetch_by_card][users.api.UserController.fetch_by_card],
+        et le catalogue est servi depuis son instantané déjà sérialisé
+        ([CatalogueSnapshots][article.catalogue.CatalogueSnapshots]),
+        inséré tel quel dans la réponse : pour une carte déjà vue
+        et un catalogue déjà calculé, seul le crédit de l'utilisateur
+        est lu dans la base de données.
+
+        Le résultat est sérialisé sous la forme d'un
+        [TapSchema][users.schemas.TapSchema].
+
+        Args:
+            card_id: l'identifiant de la carte
+            selling_point_id: l'id du point de vente du terminal
+        """
+        user = CardUserSchema(**_card_user(card_id))
+        group_ids = frozenset(user.group_ids)
+        catalogue = catalogue_snapshots.get(selling_point_id, group_ids)
+        if catalogue is None:
+            selling_point = get_object_or_404(SellingPoint, pk=selling_point_id)
+            catalogue = catalogue_snapshots.build(selling_point.pk, group_ids)
+        set_selling_point(selling_point_id)
+        data = b'{"user":%b,"catalogue":%b}' % (orjson.dumps(user.dict()), catalogue)
+        return HttpResponse(data, content_type="application/json")
@@ -0,0 +1,153 @@
+"""
+Résolution des cartes des utilisateurs.
+
+Quand un client passe sa carte (ou son badge) sur un terminal,
+le terminal doit retrouver l'utilisateur et son crédit
+avant de pouvoir afficher le catalogue.
+Les clients passant plusieurs fois leur carte pendant un événement,
+chaque processus conserve les derniers utilisateurs résolus
+dans un cache LRU ([CardCache][users.cards.CardCache]),
+indexé par identifiant de carte :
+une carte déjà vue est résolue sans requête, seul le crédit,
+qui change à chaque achat, est relu (par clef primaire).
+
+Les groupes du titulaire, qui déterminent ses prix, sont conservés
+à part ([GroupMemberships][users.memberships.GroupMemberships]).
+
+Le cache est versionné de la même manière que la matrice des prix
+([PriceMatrix][article.pricing.PriceMatrix]) : toute modification
+d'un utilisateur invalide le cache de tous les processus
+(voir `users.signals`).
+"""
+import threading
+from collections import OrderedDict
+from decimal import Decimal
+from typing import NamedTuple
+
+from django.conf import settings
+
+from buckutt.metrics import cache_requests
+from buckutt.types import PrimaryKey
+from buckutt.versions import bump_version, get_version
+from users.models import User
+
+CARDS_VERSION_KEY = "users:cards:version"
+
+
+def invalidate_cards() -> None:
+    """
+    Invalide le cache des cartes de tous les processus.
+    """
+    bump_version(CARDS_VERSION_KEY)
+
+
+class CardHolder(NamedTuple):
+    """
+    Titulaire d'une carte, tel que conservé dans le cache.
+
+    Attributes:
+        id (PrimaryKey): id de l'utilisateur
+        username (str): nom d'utilisateur
+        first_name (str): prénom
+        last_name (str): nom
+        email (str): adresse mail
+    """
+
+    id: PrimaryKey
+    username: str
+    first_name: str
+    last_name: str
+    email: str
+
+
+class CardCache:
+    """
+    Cache LRU des titulaires des dernières cartes résolues.
+
+    Examples:
+        ```python
+        from users.cards import card_cache
+
+        holder, credit = card_cache.resolve("04A2B9C1")
+        group_ids = user_groups.get(holder.id)
+        ```
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._lock = threading.Lock()
+        self._version: str | None = None
+        self._holders: OrderedDict[str, CardHolder] = OrderedDict()
+
+    def _check_version(self) -> str:
+        version = get_version(CARDS_VERSION_KEY)
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._holders = OrderedDict()
+                    self._version = version
+        return version
+
+    def get(self, card_id: str) -> CardHolder | None:
+        """
+        Retourne le titulaire de la carte s'il est dans le cache.
+        """
+        self._check_version()
+        with self._lock:
+            holder = self._holders.get(card_id)
+            if holder is not None:
+                self._holders.move_to_end(card_id)
+        cache_requests.inc(cache="cards", result="miss" if holder is None else "hit")
+        return holder
+
+    def load(self, card_id: str) -> tuple[CardHolder, Decimal] | None:
+        """
+        Charge le titulaire de la carte et son crédit depuis la base de données
+        et ajoute le titulaire au cache.
+
+        Returns:
+            Le titulaire de la carte et son crédit,
+            ou `None` si aucun utilisateur non supprimé n'a cette carte.
+        """
+        version = self._check_version()
+        user = (
+            User.objects.filter(card_id=card_id, is_removed=False)
+            .values("id", "username", "first_name", "last_name", "email", "credit")
+            .first()
+        )
+        if user is None:
+            return None
+        credit = user.pop("credit")
+        holder = CardHolder(**user)
+        with self._lock:
+            # une invalidation pendant le chargement rend le titulaire obsolète
+            if version == self._version:
+                self._holders[card_id] = holder
+                if len(self._holders) > self.size:
+                    self._holders.popitem(last=False)
+        return holder, credit
+
+    def resolve(self, card_id: str) -> tuple[CardHolder, Decimal] | None:
+        """
+        Retourne le titulaire de la carte, depuis le cache si possible,
+        et son crédit, toujours lu dans la base de données.
+        """
+        holder = self.get(card_id)
+        if holder is None:
+            return self.load(card_id)
+        credit = (
+            User.objects.filter(pk=holder.id).values_list("credit", flat=True).first()
+        )
+        return None if credit is None else (holder, credit)
+
+    def clear(self) -> None:
+        """
+        Vide le cache de ce processus.
+        """
+        with self._lock:
+            self._version = None
+            self._holders = OrderedDict()
+
+
+card_cache = CardCache(settings.CARD_CACHE_SIZE)
+"""Cache des cartes partagé par tous les threads du processus."""
@@ -0,0 +1,37 @@
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Sum
+
+from users.models import CREDIT_COUNTER_SHARDS, CreditCounter, User
+
+
+class Command(BaseCommand):
+    help = "Compare le compteur du crédit total au crédit total des utilisateurs"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--fix", action="store_true", help="corrige le compteur s'il est faux"
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            # les tranches sont verrouillées avant de calculer le crédit total :
+            # les modifications de crédit en cours attendent la fin de la vérification
+            # et ne sont comptées qu'une fois, après la correction
+            shards = list(CreditCounter.objects.select_for_update().order_by("shard"))
+            counter = sum(shard.total for shard in shards)
+            total = User.objects.aggregate(total=Sum("credit"))["total"] or 0
+            if counter == total and len(shards) == CREDIT_COUNTER_SHARDS:
+                self.stdout.write(f"Compteur exact ({total}€)")
+                return
+            if not options["fix"]:
+                raise CommandError(
+                    f"Compteur faux : {counter}€ au lieu de {total}€ "
+                    f"({len(shards)} tranche(s) sur {CREDIT_COUNTER_SHARDS})"
+                )
+            CreditCounter.objects.all().delete()
+            CreditCounter.objects.bulk_create(
+                CreditCounter(shard=shard, total=total if shard == 0 else 0)
+                for shard in range(CREDIT_COUNTER_SHARDS)
+            )
+            self.stdout.write(f"Compteur corrigé : {counter}€ -> {total}€")
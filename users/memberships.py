@@ -0,0 +1,154 @@
+"""
+Groupes des utilisateurs conservés en mémoire.
+
+Les groupes d'un utilisateur déterminent ses prix : ils sont nécessaires
+à chaque vente et à chaque affichage du catalogue.
+Plutôt que de les relire (ou de les joindre en sous-requête) à chaque fois,
+chaque processus conserve l'ensemble des ids des groupes des utilisateurs
+déjà rencontrés ([GroupMemberships][users.memberships.GroupMemberships]).
+Ces ensembles (`frozenset`) sont passés tels quels à la résolution des prix
+et servent de clef aux instantanés du catalogue
+([CatalogueSnapshots][article.catalogue.CatalogueSnapshots]).
+
+Le cache est versionné de la même manière que la matrice des prix
+([PriceMatrix][article.pricing.PriceMatrix]) : toute modification
+des groupes d'un utilisateur ou suppression d'un groupe
+invalide le cache de tous les processus (voir `users.signals`).
+"""
+import threading
+from collections.abc import Iterable
+
+from django.db.models import QuerySet
+
+from buckutt.metrics import cache_requests
+from buckutt.types import PrimaryKey
+from buckutt.versions import aget_version, bump_version, get_version
+from users.models import User
+
+MEMBERSHIPS_VERSION_KEY = "users:memberships:version"
+
+
+def invalidate_memberships() -> None:
+    """
+    Invalide le cache des groupes des utilisateurs de tous les processus.
+    """
+    bump_version(MEMBERSHIPS_VERSION_KEY)
+
+
+class GroupMemberships:
+    """
+    Ids des groupes de chaque utilisateur, indexés par id d'utilisateur.
+
+    Les utilisateurs absents du cache sont chargés en une seule requête
+    sur la table d'association des groupes, sans jointure.
+
+    Examples:
+        ```python
+        from users.memberships import user_groups
+
+        group_ids = user_groups.get(user.pk)
+        prices = resolve_prices(group_ids)
+        ```
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version: str | None = None
+        self._groups: dict[int, frozenset[int]] = {}
+
+    def _check_version(self) -> str:
+        return self._set_version(get_version(MEMBERSHIPS_VERSION_KEY))
+
+    def _set_version(self, version: str) -> str:
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._groups = {}
+                    self._version = version
+        return version
+
+    def get_many(self, user_ids: Iterable[PrimaryKey]) -> dict[int, frozenset[int]]:
+        """
+        Retourne les ids des groupes des utilisateurs donnés.
+
+        Args:
+            user_ids: les ids des utilisateurs
+
+        Returns:
+            Les ids des groupes de chaque utilisateur, indexés par id d'utilisateur
+            (un ensemble vide pour un utilisateur sans groupe ou inexistant).
+        """
+        version = self._check_version()
+        res, missing = self._cached(user_ids)
+        if not missing:
+            return res
+        loaded = {pk: set() for pk in missing}
+        for user_id, group_id in self._memberships(missing):
+            loaded[user_id].add(group_id)
+        return res | self._store(version, loaded)
+
+    async def aget_many(
+        self, user_ids: Iterable[PrimaryKey]
+    ) -> dict[int, frozenset[int]]:
+        """
+        Version asynchrone de [get_many][users.memberships.GroupMemberships.get_many].
+        """
+        version = self._set_version(await aget_version(MEMBERSHIPS_VERSION_KEY))
+        res, missing = self._cached(user_ids)
+        if not missing:
+            return res
+        loaded = {pk: set() for pk in missing}
+        async for user_id, group_id in self._memberships(missing):
+            loaded[user_id].add(group_id)
+        return res | self._store(version, loaded)
+
+    def _cached(
+        self, user_ids: Iterable[PrimaryKey]
+    ) -> tuple[dict[int, frozenset[int]], set[int]]:
+        user_ids = set(user_ids)
+        groups = self._groups
+        res = {pk: groups[pk] for pk in user_ids if pk in groups}
+        missing = user_ids - res.keys()
+        cache_requests.inc(len(res), cache="groups", result="hit")
+        cache_requests.inc(len(missing), cache="groups", result="miss")
+        return res, missing
+
+    @staticmethod
+    def _memberships(user_ids: set[int]) -> QuerySet:
+        return User.groups.through.objects.filter(user_id__any=user_ids).values_list(
+            "user_id", "group_id"
+        )
+
+    def _store(
+        self, version: str, loaded: dict[int, set[int]]
+    ) -> dict[int, frozenset[int]]:
+        loaded = {pk: frozenset(ids) for pk, ids in loaded.items()}
+        with self._lock:
+            # une invalidation pendant le chargement rend les groupes obsolètes
+            if version == self._version:
+                self._groups.update(loaded)
+        return loaded
+
+    def get(self, user_id: PrimaryKey) -> frozenset[int]:
+        """
+        Retourne les ids des groupes de l'utilisateur donné.
+        """
+        return self.get_many([user_id])[user_id]
+
+    async def aget(self, user_id: PrimaryKey) -> frozenset[int]:
+        """
+        Version asynchrone de [get][users.memberships.GroupMemberships.get].
+        """
+        return (await self.aget_many([user_id]))[user_id]
+
+    def clear(self) -> None:
+        """
+        Vide le cache de ce processus.
+        """
+        with self._lock:
+            self._version = None
+            self._groups = {}
+
+
+user_groups = GroupMemberships()
+"""Groupes des utilisateurs partagés par tous les threads du processus."""
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.30 on 2026-10-17 14:37
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def fill_counter(apps, schema_editor):
+    """
+    Crée les tranches du compteur, la première contenant le crédit total actuel.
+    """
+    User = apps.get_model("users", "User")
+    CreditCounter = apps.get_model("users", "CreditCounter")
+    total = User.objects.aggregate(total=Sum("credit"))["total"] or 0
+    CreditCounter.objects.bulk_create(
+        CreditCounter(shard=shard, total=total if shard == 0 else 0)
+        for shard in range(16)
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("users", "0002_alter_user_managers"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CreditCounter",
+            fields=[
+                (
+                    "shard",
+                    models.PositiveSmallIntegerField(primary_key=True, serialize=False),
+                ),
+                (
+                    "total",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=12),
+                ),
+            ],
+        ),
+        migrations.RunPython(fill_counter, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-17 14:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("users", "0003_credit_counter"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="card_id",
+            field=models.CharField(blank=True, max_length=50, null=True, unique=True),
+        ),
+    ]
@@ -1,5 +1,179 @@
+from decimal import Decimal
+
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.contrib.auth.models import UserManager as BaseUserManager
+from django.db import connections, models
+from django.db.models import Sum
+
+CREDIT_COUNTER_SHARDS = 16
+"""Nombre de tranches du compteur du crédit total."""
+
+
+class CreditCounter(models.Model):
+    """
+    Tranche du compteur du crédit total des utilisateurs.
+
+    Le crédit total est la somme des tranches. Chaque modification
+    du crédit d'un utilisateur par le [UserManager][users.models.UserManager]
+    met à jour une tranche dans la même requête ; répartir le compteur
+    en plusieurs tranches évite que tous les débits attendent
+    le verrou d'une même ligne.
+
+    Le compteur ne suit pas les modifications faites directement
+    sur la colonne `credit` (chargement de fixtures, création d'un utilisateur
+    avec un crédit) ; le crédit n'est donc pas modifiable dans l'administration.
+    La commande `reconcile_credit_counter` compare le compteur au crédit total
+    et peut le corriger.
+
+    Attributes:
+        shard (PositiveSmallIntegerField): numéro de la tranche
+        total (DecimalField): part du crédit total comptée dans la tranche
+    """
+
+    shard = models.PositiveSmallIntegerField(primary_key=True)
+    total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"{self.shard} ({self.total}€)"
+
+
+class UserManager(BaseUserManager):
+    """
+    Manager des utilisateurs.
+
+    En plus des méthodes du manager de Django, il permet de modifier
+    le crédit d'un utilisateur de manière atomique, par une seule requête
+    `UPDATE` ne touchant que la colonne `credit`.
+    Deux terminaux débitant le même compte au même moment
+    ne peuvent ainsi pas écraser mutuellement leurs modifications.
+
+    La même requête met à jour le compteur du crédit total
+    ([CreditCounter][users.models.CreditCounter]).
+    """
+
+    def _update_credit(self, sql: str, params: list) -> list[tuple]:
+        table = self.model._meta.db_table
+        counter = CreditCounter._meta.db_table
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(
+                sql.format(table=table, counter=counter, shards=CREDIT_COUNTER_SHARDS),
+                params,
+            )
+            return cursor.fetchall()
+
+    def debit(self, pk: int, amount: Decimal) -> Decimal | None:
+        """
+        Retire le montant donné du crédit de l'utilisateur,
+        si et seulement si son crédit est suffisant.
+
+        Args:
+            pk: l'id de l'utilisateur
+            amount: le montant à retirer
+
+        Returns:
+            Le nouveau crédit de l'utilisateur,
+            ou `None` si son crédit est insuffisant (ou s'il n'existe pas).
+        """
+        rows = self._update_credit(
+            'WITH updated AS (UPDATE "{table}" SET "credit" = "credit" - %s '
+            'WHERE "id" = %s AND "credit" >= %s RETURNING "credit"), '
+            'counted AS (UPDATE "{counter}" SET "total" = "total" - %s '
+            'WHERE "shard" = mod(%s, {shards}) AND EXISTS (SELECT FROM updated)) '
+            'SELECT "credit" FROM updated',
+            [amount, pk, amount, amount, pk],
+        )
+        return rows[0][0] if rows else None
+
+    def refill(self, pk: int, amount: Decimal) -> Decimal | None:
+        """
+        Ajoute le montant donné au crédit de l'utilisateur.
+
+        Args:
+            pk: l'id de l'utilisateur
+            amount: le montant à ajouter
+
+        Returns:
+            Le nouveau crédit de l'utilisateur, ou `None` s'il n'existe pas.
+        """
+        rows = self._update_credit(
+            'WITH updated AS (UPDATE "{table}" SET "credit" = "credit" + %s '
+            'WHERE "id" = %s RETURNING "credit"), '
+            'counted AS (UPDATE "{counter}" SET "total" = "total" + %s '
+            'WHERE "shard" = mod(%s, {shards}) AND EXISTS (SELECT FROM updated)) '
+            'SELECT "credit" FROM updated',
+            [amount, pk, amount, pk],
+        )
+        return rows[0][0] if rows else None
+
+    def debit_many(self, amounts: dict[int, Decimal]) -> dict[int, Decimal]:
+        """
+        Retire à plusieurs utilisateurs les montants donnés, en une seule requête.
+
+        Comme pour [debit][users.models.UserManager.debit], un utilisateur
+        n'est débité que si son crédit est suffisant.
+
+        Args:
+            amounts: les montants à retirer, indexés par id d'utilisateur
+
+        Returns:
+            Le nouveau crédit des utilisateurs effectivement débités,
+            indexé par id d'utilisateur.
+        """
+        if not amounts:
+            return {}
+        # le total est retiré d'une seule tranche du compteur,
+        # pour ne verrouiller qu'une ligne
+        rows = self._update_credit(
+            'WITH updated AS (UPDATE "{table}" AS u SET "credit" = u."credit" - v.amount '
+            "FROM unnest(%s::bigint[], %s::numeric[]) AS v(id, amount) "
+            'WHERE u."id" = v.id AND u."credit" >= v.amount '
+            'RETURNING u."id", u."credit", v.amount), '
+            'counted AS (UPDATE "{counter}" SET "total" = "total" - '
+            "(SELECT SUM(amount) FROM updated) "
+            'WHERE "shard" = mod(%s, {shards}) AND EXISTS (SELECT FROM updated)) '
+            'SELECT "id", "credit" FROM updated',
+            [list(amounts), [Decimal(a) for a in amounts.values()], min(amounts)],
+        )
+        return dict(rows)
+
+    def refill_many(self, amounts: dict[int, Decimal]) -> dict[int, Decimal]:
+        """
+        Ajoute à plusieurs utilisateurs les montants donnés, en une seule requête.
+
+        Args:
+            amounts: les montants à ajouter, indexés par id d'utilisateur
+
+        Returns:
+            Le nouveau crédit des utilisateurs existants, indexé par id d'utilisateur.
+        """
+        if not amounts:
+            return {}
+        rows = self._update_credit(
+            'WITH updated AS (UPDATE "{table}" AS u SET "credit" = u."credit" + v.amount '
+            "FROM unnest(%s::bigint[], %s::numeric[]) AS v(id, amount) "
+            'WHERE u."id" = v.id RETURNING u."id", u."credit", v.amount), '
+            'counted AS (UPDATE "{counter}" SET "total" = "total" + '
+            "(SELECT SUM(amount) FROM updated) "
+            'WHERE "shard" = mod(%s, {shards}) AND EXISTS (SELECT FROM updated)) '
+            'SELECT "id", "credit" FROM updated',
+            [list(amounts), [Decimal(a) for a in amounts.values()], min(amounts)],
+        )
+        return dict(rows)
+
+    def total_credit(self) -> Decimal:
+        """
+        Retourne le crédit total de tous les utilisateurs,
+        lu dans le compteur ([CreditCounter][users.models.CreditCounter]).
+        """
+        return CreditCounter.objects.aggregate(total=Sum("total"))["total"] or 0
+
+    async def atotal_credit(self) -> Decimal:
+        """
+        Version asynchrone de [total_credit][users.models.UserManager.total_credit].
+        """
+        return (await CreditCounter.objects.aaggregate(total=Sum("total")))[
+            "total"
+        ] or 0
 
 
 class User(AbstractUser):
@@ -12,6 +186,8 @@ class User(AbstractUser):
     Attributes:
         pin (CharField): code PIN de l'utilisateur
         nickname (Charfield): surnom de l'utilisateur
+        card_id (CharField): identifiant de la carte ou du badge de l'utilisateur
+            (unique, vide s'il n'en a pas)
         credit (DecimalField): crédit de l'utilisateur (0 par défaut)
         is_temporary (BooleanField): si l'utilisateur est temporaire (False par défaut)
         failed_auth (BooleanField): si l'utilisateur a échoué à s'authentifier (False par défaut)
@@ -20,11 +196,14 @@ class User(AbstractUser):
 
     pin = models.CharField(max_length=50)
     nickname = models.CharField(max_length=50)
+    card_id = models.CharField(max_length=50, unique=True, null=True, blank=True)
     credit = models.DecimalField(max_digits=8, decimal_places=2, default=0)
 
     is_temporary = models.BooleanField(default=False)
     failed_auth = models.BooleanField(default=False)
     is_removed = models.BooleanField(default=False)
 
+    objects = UserManager()
+
     def __str__(self):
         return self.username
@@ -1,5 +1,7 @@
-from ninja import ModelSchema
+from ninja import ModelSchema, Schema
 
+from article.schemas import AvailableArticleSchema
+from buckutt.types import PrimaryKey
 from users.models import User
 
 
@@ -20,3 +22,29 @@ class SimpleUserSchema(ModelSchema):
         ]
 
     credit: float
+
+
+class CardUserSchema(SimpleUserSchema):
+    """
+    Schéma de données d'un utilisateur résolu par sa carte,
+    avec ce dont un terminal a besoin pour lui vendre des articles.
+
+    Attributes:
+        group_ids (list[PrimaryKey]): ids des groupes de l'utilisateur
+    """
+
+    group_ids: list[PrimaryKey]
+
+
+class TapSchema(Schema):
+    """
+    Schéma de données retourné à un terminal quand un client passe sa carte.
+
+    Attributes:
+        user (CardUserSchema): l'utilisateur, son crédit et ses groupes
+        catalogue (list[AvailableArticleSchema]): les articles disponibles
+            pour l'utilisateur dans le point de vente, avec leur prix
+    """
+
+    user: CardUserSchema
+    catalogue: list[AvailableArticleSchema]
@@ -0,0 +1,38 @@
+"""
+Signaux de l'application `users`.
+
+Toute modification d'un utilisateur invalide le cache des cartes
+([CardCache][users.cards.CardCache]) ; les modifications du crédit,
+faites par des requêtes `UPDATE` ([UserManager][users.models.UserManager]),
+et celles de la date de dernière connexion ne l'invalident pas :
+le cache ne les contient pas.
+
+Toute modification des groupes d'un utilisateur et toute suppression
+d'un groupe invalident le cache des groupes des utilisateurs
+([GroupMemberships][users.memberships.GroupMemberships]).
+"""
+from django.contrib.auth.models import Group
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from users.cards import invalidate_cards
+from users.memberships import invalidate_memberships
+from users.models import User
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def on_user_change(update_fields=None, **kwargs):
+    if update_fields is not None and update_fields <= {"last_login", "credit"}:
+        return
+    # voir article.signals
+    invalidate_cards()
+    transaction.on_commit(invalidate_cards)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(post_delete, sender=Group)
+def on_membership_change(**kwargs):
+    invalidate_memberships()
+    transaction.on_commit(invalidate_memberships)
@@ -1 +1,215 @@
-# Create your tests here.
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth.models import Group
+from django.core.management import CommandError, call_command
+from django.db.models import Sum
+from django.test import TestCase
+from django.utils.timezone import now
+
+from article.catalogue import catalogue_snapshots
+from article.models import Article, Category, Foundation, Period, Price
+from article.pricing import price_matrix
+from selling_points.models import SellingPoint
+from users.cards import CardCache, card_cache
+from users.memberships import user_groups
+from users.models import User
+
+
+class CreditCounterTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            User.objects.create(username=f"client_{i}", pin="0") for i in range(3)
+        ]
+
+    def assertCounterExact(self):
+        total = User.objects.aggregate(total=Sum("credit"))["total"]
+        self.assertEqual(User.objects.total_credit(), total)
+
+    def test_counter_exact_after_fixtures(self):
+        """
+        Test que le compteur tient compte du crédit des fixtures.
+        """
+        self.assertGreater(User.objects.total_credit(), 0)
+        self.assertCounterExact()
+
+    def test_counter_follows_credit(self):
+        """
+        Test que le compteur suit les débits et les rechargements.
+        """
+        first, second, third = self.users
+        User.objects.refill(first.pk, Decimal("10.00"))
+        User.objects.refill(second.pk, Decimal("5.00"))
+        User.objects.debit(first.pk, Decimal("2.50"))
+        User.objects.debit(second.pk, Decimal("50.00"))  # crédit insuffisant
+        User.objects.debit_many(
+            {first.pk: Decimal("1.00"), second.pk: Decimal("1.00"), third.pk: 1}
+        )
+        User.objects.refill_many({second.pk: Decimal("3.00"), third.pk: 2})
+        self.assertCounterExact()
+        with self.assertNumQueries(1):
+            res = self.client.get("/api/treasury/global-credit")
+        self.assertEqual(res.json()["total"], float(User.objects.total_credit()))
+
+    def test_reconcile(self):
+        """
+        Test que la réconciliation détecte et corrige un compteur faux.
+        """
+        User.objects.filter(pk=self.users[0].pk).update(credit=42)
+        with self.assertRaises(CommandError):
+            call_command("reconcile_credit_counter")
+        call_command("reconcile_credit_counter", "--fix", stdout=StringIO())
+        self.assertCounterExact()
+
+
+class CardTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.group = Group.objects.first()
+        cls.customer = User.objects.create(
+            username="client", pin="0", card_id="04A2B9C1", credit=5
+        )
+        cls.customer.groups.add(cls.group)
+
+    def setUp(self):
+        card_cache.clear()
+
+    def test_fetch_by_card(self):
+        """
+        Test qu'une carte déjà vue est résolue en ne relisant que le crédit.
+        """
+        with self.assertNumQueries(2):
+            res = self.client.get("/api/user/card/04A2B9C1")
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json()["id"], self.customer.pk)
+        self.assertEqual(res.json()["group_ids"], [self.group.pk])
+        User.objects.refill(self.customer.pk, Decimal("1.50"))
+        with self.assertNumQueries(1):
+            res = self.client.get("/api/user/card/04A2B9C1")
+        self.assertEqual(res.json()["credit"], 6.5)
+        self.assertEqual(self.client.get("/api/user/card/inconnue").status_code, 404)
+
+    def test_invalidation(self):
+        """
+        Test que le cache est invalidé quand les groupes de l'utilisateur changent.
+        """
+        self.client.get("/api/user/card/04A2B9C1")
+        other = Group.objects.create(name="Autre")
+        self.customer.groups.add(other)
+        res = self.client.get("/api/user/card/04A2B9C1")
+        self.assertEqual(res.json()["group_ids"], sorted([self.group.pk, other.pk]))
+        self.customer.is_removed = True
+        self.customer.save()
+        self.assertEqual(self.client.get("/api/user/card/04A2B9C1").status_code, 404)
+
+    def test_lru(self):
+        """
+        Test que les titulaires les moins récemment résolus sont évincés.
+        """
+        cache = CardCache(size=1)
+        User.objects.create(username="autre", pin="0", card_id="B")
+        cache.resolve("04A2B9C1")
+        cache.resolve("B")
+        self.assertIsNone(cache.get("04A2B9C1"))
+        self.assertEqual(cache.get("B").username, "autre")
+
+
+class GroupMembershipsTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.group = Group.objects.create(name="Membres")
+        cls.customer = User.objects.create(username="client", pin="0")
+        cls.customer.groups.add(cls.group)
+
+    def setUp(self):
+        user_groups.clear()
+
+    def test_cached(self):
+        """
+        Test que les groupes d'un utilisateur ne sont lus qu'une fois.
+        """
+        with self.assertNumQueries(1):
+            self.assertEqual(user_groups.get(self.customer.pk), {self.group.pk})
+            self.assertEqual(user_groups.get(self.customer.pk), {self.group.pk})
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                user_groups.get_many([self.customer.pk]),
+                {self.customer.pk: {self.group.pk}},
+            )
+
+    def test_invalidation(self):
+        """
+        Test que le cache est invalidé quand les groupes d'un utilisateur changent
+        ou qu'un groupe est supprimé.
+        """
+        other = Group.objects.create(name="Autre")
+        user_groups.get(self.customer.pk)
+        self.customer.groups.add(other)
+        self.assertEqual(user_groups.get(self.customer.pk), {self.group.pk, other.pk})
+        other.user_set.remove(self.customer)
+        self.assertEqual(user_groups.get(self.customer.pk), {self.group.pk})
+        self.group.delete()
+        self.assertEqual(user_groups.get(self.customer.pk), frozenset())
+
+
+class TapTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.group = Group.objects.first()
+        cls.customer = User.objects.create(
+            username="client", pin="0", card_id="04A2B9C1", credit=5
+        )
+        cls.customer.groups.add(cls.group)
+        cls.article = Article.objects.create(
+            name="Bière", category=Category.objects.first()
+        )
+        cls.point = SellingPoint.objects.create(name="Bar")
+        cls.point.articles.add(cls.article)
+        Price.objects.create(
+            article=cls.article,
+            group=cls.group,
+            foundation=Foundation.objects.first(),
+            period=Period.objects.create(
+                name="Période test",
+                start=now() - timedelta(hours=1),
+                end=now() + timedelta(hours=1),
+            ),
+            amount=2,
+        )
+
+    def setUp(self):
+        price_matrix.clear()
+        catalogue_snapshots.clear()
+        card_cache.clear()
+        user_groups.clear()
+
+    def tap(self, card_id: str = "04A2B9C1", point_id: int | None = None):
+        return self.client.get(
+            f"/api/user/tap/{card_id}",
+            {"selling_point_id": point_id or self.point.pk},
+        )
+
+    def test_tap(self):
+        """
+        Test que l'utilisateur et son catalogue sont retournés ensemble,
+        en ne relisant que le crédit une fois les caches remplis.
+        """
+        res = self.tap()
+        self.assertEqual(res.status_code, 200)
+        data = res.json()
+        self.assertEqual(data["user"]["id"], self.customer.pk)
+        self.assertEqual(data["user"]["credit"], 5)
+        self.assertEqual(
+            [(a["id"], a["price"]) for a in data["catalogue"]], [(self.article.pk, 2)]
+        )
+        with self.assertNumQueries(1):
+            self.assertEqual(self.tap().json(), data)
+
+    def test_not_found(self):
+        """
+        Test qu'une carte ou un point de vente inconnu renvoie une 404.
+        """
+        self.assertEqual(self.tap(card_id="inconnue").status_code, 404)
+        self.assertEqual(self.tap(point_id=999999).status_code, 404)